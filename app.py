@@ -1,7 +1,12 @@
+import multiprocessing
+import os
 import tkinter as tk
 from gui.main_window import MainWindow
+from processing.ocr_cache import default_cache_path
 
 def main():
+    # La aplicación de escritorio usa la caché de OCR por defecto, salvo que se indique otra ruta
+    os.environ.setdefault("OCR_CACHE_PATH", default_cache_path())
     root = tk.Tk()
     root.title("Extractor de Facturas")  # Puedes definir el título aquí o desde MainWindow
     # Opcional: root.iconbitmap('ruta/a/icono.ico')
@@ -9,4 +14,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necesario para el procesamiento por lotes en paralelo dentro del ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,6 @@
+"""
+Scripts de medición de rendimiento del extractor.
+
+Se ejecutan como módulos desde la raíz del proyecto, por ejemplo:
+    python -m benchmarks.table_backends
+"""
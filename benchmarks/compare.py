@@ -0,0 +1,84 @@
+"""
+Compara dos resultados de benchmarks.run (por ejemplo, antes y después de un cambio).
+
+    python -m benchmarks.compare base.json nuevo.json --threshold 15
+
+Muestra, para cada caso presente en ambos archivos, la mediana de cada medición y la variación
+porcentual. Devuelve 1 si alguna medición empeora más que el umbral indicado.
+"""
+import argparse
+import json
+import sys
+
+# Mediciones comparadas: (etiqueta, ruta dentro del resultado, True si un valor mayor es mejor)
+METRICS = (
+    ("extract ms", ("extract", "median_s"), False),
+    ("páginas/s", ("extract", "pages_per_s"), True),
+    ("campos/s", ("extract", "fields_per_s"), True),
+    ("tablas ms", ("tables", "median_s"), False),
+    ("excel ms", ("excel", "median_s"), False),
+    ("sqlite ms", ("sqlite", "median_s"), False),
+    ("RSS MiB", ("peak_rss_bytes",), False),
+)
+
+
+def _get(result, path):
+    value = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _display(label, value):
+    if label.endswith("ms"):
+        return value * 1000
+    if label.startswith("RSS"):
+        return value / 2 ** 20
+    return value
+
+
+def compare(base, new, threshold):
+    """Devuelve las filas de la comparación y si hubo alguna regresión mayor que 'threshold' (en %)."""
+    base_results = {r["name"]: r for r in base["results"] if "error" not in r}
+    rows = []
+    regression = False
+    for result in new["results"]:
+        old = base_results.get(result["name"])
+        if old is None or "error" in result:
+            continue
+        for label, path, higher_is_better in METRICS:
+            before, after = _get(old, path), _get(result, path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = worse > threshold
+            regression = regression or flag
+            rows.append((result["name"], label, _display(label, before), _display(label, after), change, flag))
+    return rows, regression
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="resultados de referencia (JSON de benchmarks.run)")
+    parser.add_argument("new", help="resultados nuevos")
+    parser.add_argument("--threshold", type=float, default=15.0, help="empeoramiento máximo tolerado, en %%")
+    args = parser.parse_args(argv)
+
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}  nuevo: {new['meta'].get('commit')}")
+    print(f"{'caso':<18} {'medición':<11} {'base':>11} {'nuevo':>11} {'cambio':>9}")
+    rows, regression = compare(base, new, args.threshold)
+    for name, label, before, after, change, flag in rows:
+        print(f"{name:<18} {label:<11} {before:>11.2f} {after:>11.2f} {change:>+8.1f}%{'  <-- regresión' if flag else ''}")
+    return 1 if regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
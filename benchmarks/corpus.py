@@ -0,0 +1,139 @@
+"""
+Generador de un corpus sintético de facturas con sus plantillas.
+
+Cada factura tiene una cabecera con 'fields' campos (etiqueta y valor) en la primera página y
+líneas de detalle en las páginas siguientes, con una tabla por página. Se genera en dos variantes:
+  - "native": PDF con capa de texto, como los que emite un sistema de facturación
+  - "scanned": cada página rasterizada como imagen, sin texto, como un documento escaneado
+La plantilla es la misma para ambas variantes y sirve tanto para processing.pdf_parser como para
+extract_tables de processing.extractor (las columnas tienen nombre y límites horizontales).
+"""
+import json
+import os
+import random
+from collections import namedtuple
+
+import fitz
+
+# Perfiles de tamaño: páginas, campos de cabecera y líneas de detalle por página
+Profile = namedtuple("Profile", ["pages", "fields", "rows"])
+PROFILES = {
+    "pequena": Profile(pages=1, fields=5, rows=10),
+    "mediana": Profile(pages=5, fields=25, rows=40),
+    "grande": Profile(pages=50, fields=100, rows=45),
+    "extrema": Profile(pages=200, fields=100, rows=45),
+}
+VARIANTS = ("native", "scanned")
+# Resolución de la variante escaneada
+SCAN_DPI = 150
+
+Case = namedtuple("Case", ["name", "profile", "variant", "pdf_path", "template_path", "pages", "fields", "rows"])
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+FIELD_COLUMNS = 3
+FIELD_TOP, FIELD_PITCH, FIELD_WIDTH = 60, 14, 180
+TABLE_TOP, ROW_PITCH = 60, 16
+TABLE_COLUMNS = (("Descripcion", 40, 300), ("Cantidad", 300, 380), ("Precio", 380, 470), ("Importe", 470, 560))
+
+
+def _field_box(index):
+    col, row = index % FIELD_COLUMNS, index // FIELD_COLUMNS
+    x = 40 + col * FIELD_WIDTH
+    y = FIELD_TOP + row * FIELD_PITCH
+    return x, y
+
+
+def build_template(profile):
+    """Plantilla que corresponde a las facturas generadas con el perfil indicado."""
+    fields = []
+    for i in range(profile.fields):
+        x, y = _field_box(i)
+        fields.append({
+            "name": f"Campo{i + 1:03d}",
+            "coordinates": [x + 60, y - 10, x + FIELD_WIDTH - 5, y + 3],
+            "page": 0,
+            "type": "monto" if i % 5 == 4 else "",
+        })
+    tables = []
+    for page_num in range(1, profile.pages) if profile.pages > 1 else [0]:
+        top = TABLE_TOP if page_num else FIELD_TOP + (profile.fields // FIELD_COLUMNS + 2) * FIELD_PITCH
+        rows = min(profile.rows, int((PAGE_HEIGHT - 40 - top) // ROW_PITCH))
+        tables.append({
+            "name": f"Detalle{page_num + 1:03d}",
+            "coordinates": [35, top - 12, 565, top + rows * ROW_PITCH],
+            "page": page_num,
+            "columns": [{"name": name, "x0": x0, "x1": x1} for name, x0, x1 in TABLE_COLUMNS],
+        })
+    return {"fields": fields, "tables": tables}
+
+
+def build_invoice(profile, seed=0):
+    """Genera la factura nativa (fitz.Document) a partir del perfil y de su plantilla."""
+    rnd = random.Random(seed)
+    template = build_template(profile)
+    doc = fitz.open()
+    for page_num in range(max(1, profile.pages)):
+        doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    first = doc[0]
+    for i, field in enumerate(template["fields"]):
+        x, y = _field_box(i)
+        value = f"{rnd.randint(1, 99999)},{rnd.randint(0, 99):02d}" if field["type"] == "monto" else f"V{rnd.randint(0, 10 ** 6):06d}"
+        first.insert_text((x, y), f"Dato {i + 1}:", fontsize=8)
+        first.insert_text((x + 62, y), value, fontsize=8)
+    for table in template["tables"]:
+        page = doc[table["page"]]
+        top = table["coordinates"][1] + 12
+        rows = int((table["coordinates"][3] - top) // ROW_PITCH)
+        for r in range(rows):
+            y = top + r * ROW_PITCH
+            qty = rnd.randint(1, 20)
+            price = rnd.randint(100, 99999) / 100
+            values = (f"Artículo {rnd.randint(1000, 9999)} modelo {rnd.choice('ABCDEFG')}", str(qty),
+                      f"{price:.2f}", f"{qty * price:.2f}")
+            for (_, x0, _), value in zip(TABLE_COLUMNS, values):
+                page.insert_text((x0 + 2, y), value, fontsize=8)
+    return doc, template
+
+
+def rasterize(doc, dpi=SCAN_DPI):
+    """Devuelve una copia del documento con cada página convertida en imagen (sin capa de texto)."""
+    scanned = fitz.open()
+    for page in doc:
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        new_page = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        new_page.insert_image(new_page.rect, pixmap=pix)
+    return scanned
+
+
+def generate_corpus(directory, profiles=None, variants=VARIANTS, seed=0):
+    """
+    Genera en 'directory' los PDFs y plantillas de los perfiles y variantes indicados (si ya
+    existen se reutilizan) y devuelve la lista de Case.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cases = []
+    for name in profiles or PROFILES:
+        profile = PROFILES[name]
+        template_path = os.path.join(directory, f"{name}.json")
+        paths = {variant: os.path.join(directory, f"{name}_{variant}.pdf") for variant in variants}
+        if not all(os.path.exists(p) for p in list(paths.values()) + [template_path]):
+            doc, template = build_invoice(profile, seed)
+            with open(template_path, "w", encoding="utf-8") as f:
+                json.dump(template, f, indent=1)
+            for variant, path in paths.items():
+                if variant == "native":
+                    doc.save(path, garbage=3, deflate=True)
+                else:
+                    scanned = rasterize(doc)
+                    scanned.save(path, garbage=3, deflate=True)
+                    scanned.close()
+            doc.close()
+        with open(template_path, "r", encoding="utf-8") as f:
+            template = json.load(f)
+        rows = sum(
+            int((t["coordinates"][3] - t["coordinates"][1] - 12) // ROW_PITCH) for t in template["tables"]
+        )
+        for variant, path in paths.items():
+            cases.append(Case(f"{name}_{variant}", name, variant, path, template_path,
+                              max(1, profile.pages), profile.fields, rows))
+    return cases
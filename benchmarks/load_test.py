@@ -0,0 +1,180 @@
+"""
+Prueba de carga del servicio HTTP de extracción (processing.server) en localhost.
+
+Envía 'requests' peticiones POST /extract con 'concurrency' clientes simultáneos, cada uno con
+su propia conexión persistente, e informa del rendimiento (peticiones/s), de la latencia
+(media, p50, p95, p99 y máxima) y de las respuestas por estado HTTP:
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8765 -c 8 -n 200 factura.pdf
+
+Con --spawn se genera un caso del corpus sintético (ver benchmarks.corpus), se arranca el
+servidor con su plantilla en un puerto libre y se detiene al terminar:
+
+    python -m benchmarks.load_test --spawn --profile mediana -c 8 -n 200 -w 4 -o carga.json
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.corpus import PROFILES, VARIANTS, generate_corpus
+
+# Tiempo máximo de arranque del servidor con --spawn, en segundos
+SPAWN_TIMEOUT = 60.0
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_load(url, pdf_bytes, requests=100, concurrency=4, timeout=120.0):
+    """
+    Envía las peticiones y devuelve el diccionario de resultados. Cada cliente reutiliza su
+    conexión mientras el servidor la mantenga abierta.
+    """
+    parts = urlsplit(url)
+    lock = threading.Lock()
+    remaining = [requests]
+    latencies = []
+    statuses = {}
+
+    def client():
+        conn = None
+        while True:
+            with lock:
+                if not remaining[0]:
+                    break
+                remaining[0] -= 1
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/extract", body=pdf_bytes, headers={"Content-Type": "application/pdf"})
+                response = conn.getresponse()
+                response.read()
+                status = str(response.status)
+                if response.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException) as e:
+                status = type(e).__name__
+                conn.close()
+                conn = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+        if conn is not None:
+            conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "requests_per_s": requests / wall if wall else None,
+        "statuses": statuses,
+        "latency_s": {
+            "mean": statistics.mean(latencies),
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": max(latencies),
+        },
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(template_path, workers=None, extra_args=()):
+    """Arranca processing.server en un puerto libre y espera a que responda. Devuelve (proceso, url)."""
+    port = _free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    args = [sys.executable, "-m", "processing.server", "-t", template_path, "--port", str(port), "-q"]
+    if workers:
+        args += ["-w", str(workers)]
+    process = subprocess.Popen(args + list(extra_args), cwd=root)
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar (código {process.returncode})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF que se envía en cada petición (no se usa con --spawn)")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="URL base del servidor")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="peticiones en total")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="clientes simultáneos")
+    parser.add_argument("--spawn", action="store_true",
+                        help="arrancar el servidor con un caso del corpus sintético y detenerlo al terminar")
+    parser.add_argument("--profile", choices=list(PROFILES), default="pequena", help="perfil del corpus con --spawn")
+    parser.add_argument("--variant", choices=list(VARIANTS), default="native", help="variante del corpus con --spawn")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "extractor_benchmark_corpus"),
+                        help="carpeta del corpus sintético (se genera si no existe)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="procesos del servidor con --spawn")
+    parser.add_argument("-o", "--output", default=None, help="archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    pdf_path = args.pdf
+    if args.spawn:
+        case = generate_corpus(args.corpus, [args.profile], [args.variant])[0]
+        pdf_path = case.pdf_path
+        # El motor 'fake' mide el servicio sin depender de Tesseract
+        process, url = spawn_server(case.template_path, args.workers, ["--ocr-backend", "fake"])
+    elif not pdf_path:
+        parser.error("indique el PDF a enviar o use --spawn")
+    try:
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+        result = run_load(url, pdf_bytes, args.requests, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    result["pdf"] = pdf_path
+    latency = result["latency_s"]
+    print(f"{result['requests']} peticiones, {result['concurrency']} clientes: {result['requests_per_s']:.1f} pet/s  "
+          f"media {latency['mean'] * 1000:.1f} ms  p50 {latency['p50'] * 1000:.1f} ms  "
+          f"p95 {latency['p95'] * 1000:.1f} ms  p99 {latency['p99'] * 1000:.1f} ms  "
+          f"máx {latency['max'] * 1000:.1f} ms  estados {result['statuses']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 0 if set(result["statuses"]) == {"200"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
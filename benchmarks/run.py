@@ -0,0 +1,215 @@
+"""
+Benchmark de rendimiento del extractor sobre el corpus sintético (ver benchmarks.corpus).
+
+Para cada caso (perfil y variante) mide, en un proceso nuevo para que el pico de memoria sea
+el del propio caso:
+  - extract: PDFExtractor.extract_from_pdf de processing.pdf_parser (latencia por documento,
+    campos/s, páginas/s y llamadas al OCR)
+  - tables: extract_tables de processing.extractor
+  - excel: export_to_excel con las filas del documento repetidas 'excel_docs' veces
+  - sqlite: SqliteSink con el documento repetido 'excel_docs' veces
+y guarda los resultados en JSON para compararlos entre commits con benchmarks.compare:
+
+    python -m benchmarks.run -o base.json
+    python -m benchmarks.run -o nuevo.json --profiles pequena mediana --repeat 5
+    python -m benchmarks.compare base.json nuevo.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.corpus import PROFILES, VARIANTS, generate_corpus
+
+DEFAULT_PROFILES = ("pequena", "mediana")
+
+
+def peak_rss():
+    """Pico de memoria residente del proceso, en bytes (None si la plataforma no lo informa)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo informa en KiB y macOS en bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _counting_backend(name):
+    """Envuelve el motor de OCR indicado para contar las llamadas."""
+    from processing.ocr_backends import OCRBackend, create_backend
+
+    class CountingOCRBackend(OCRBackend):
+        def __init__(self, backend):
+            self.backend = backend
+            self.name = backend.name
+            self.calls = {"image_to_string": 0, "image_to_data": 0}
+            self._lock = threading.Lock()
+
+        def _count(self, kind):
+            with self._lock:
+                self.calls[kind] += 1
+
+        def image_to_string(self, img, **kwargs):
+            self._count("image_to_string")
+            return self.backend.image_to_string(img, **kwargs)
+
+        def image_to_data(self, img, **kwargs):
+            self._count("image_to_data")
+            return self.backend.image_to_data(img, **kwargs)
+
+    return CountingOCRBackend(create_backend(name))
+
+
+def _timed(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _summary(times):
+    return {"median_s": statistics.median(times), "min_s": min(times), "max_s": max(times), "runs": len(times)}
+
+
+def run_case(case, repeat=3, ocr_backend="fake", ocr_mode="page", excel_docs=100):
+    """Mide un caso en el proceso actual y devuelve el diccionario de resultados."""
+    from processing import export, pdf_parser
+    from processing.extractor import PDFExtractor as TableExtractor
+    from processing.result_store import file_hash
+
+    result = dict(case._asdict())
+    backend = _counting_backend(ocr_backend)
+
+    extractor = pdf_parser.PDFExtractor(case.template_path, ocr_mode=ocr_mode, ocr_backend=backend)
+    times, data = _timed(lambda: extractor.extract_from_pdf(case.pdf_path), repeat)
+    extract = _summary(times)
+    median = extract["median_s"]
+    extract["fields_per_s"] = len(data["fields"]) / median if median else None
+    extract["pages_per_s"] = case.pages / median if median else None
+    extract["ocr_calls_per_doc"] = {kind: count / repeat for kind, count in backend.calls.items()}
+    result["extract"] = extract
+
+    tables = TableExtractor(case.template_path, ocr_backend=backend)
+    times, table_data = _timed(lambda: tables.extract_tables(case.pdf_path), repeat)
+    result["tables"] = _summary(times)
+    result["tables"]["rows"] = sum(len(rows) for rows in table_data.values())
+
+    field_row, table_rows = export.document_rows(case.pdf_path, data)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "salida.xlsx")
+        times, _ = _timed(
+            lambda: export.export_to_excel([field_row] * excel_docs, table_rows * excel_docs, output), repeat
+        )
+    result["excel"] = _summary(times)
+    result["excel"]["rows"] = excel_docs * (1 + len(table_rows))
+    median = result["excel"]["median_s"]
+    result["excel"]["rows_per_s"] = result["excel"]["rows"] / median if median else None
+
+    digest = file_hash(case.pdf_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "salida.sqlite")
+
+        def load_sqlite():
+            # Base nueva en cada repetición: se mide la carga, no el crecimiento del historial
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(output + suffix):
+                    os.remove(output + suffix)
+            with export.SqliteSink(output) as sink:
+                for i in range(excel_docs):
+                    # Un hash distinto por copia: con el mismo, cada escritura reemplazaría a la anterior
+                    sink.write(case.pdf_path, data, file_hash=f"{digest[:56]}{i:08x}", template=case.profile)
+
+        times, _ = _timed(load_sqlite, repeat)
+    result["sqlite"] = _summary(times)
+    result["sqlite"]["rows"] = excel_docs * (len(data["fields"]) + len(table_rows))
+    median = result["sqlite"]["median_s"]
+    result["sqlite"]["rows_per_s"] = result["sqlite"]["rows"] / median if median else None
+
+    result["peak_rss_bytes"] = peak_rss()
+    return result
+
+
+def _run_isolated(args):
+    case, options = args
+    try:
+        return run_case(case, **options)
+    except Exception as e:
+        return dict(case._asdict(), error=f"{type(e).__name__}: {e}")
+
+
+def git_commit():
+    """Commit actual del repositorio (None si no se puede determinar)."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default="benchmark.json", help="archivo JSON de resultados")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "extractor_benchmark_corpus"),
+                        help="carpeta del corpus sintético (se genera si no existe)")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(DEFAULT_PROFILES))
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por medición (se informa la mediana)")
+    parser.add_argument("--ocr-backend", default="fake",
+                        help="motor de OCR (por defecto 'fake', que no requiere Tesseract)")
+    parser.add_argument("--ocr-mode", choices=("page", "region"), default="page")
+    parser.add_argument("--excel-docs", type=int, default=100, help="documentos por medición de export_to_excel")
+    args = parser.parse_args(argv)
+
+    # La caché de OCR ocultaría el coste real del OCR
+    os.environ.pop("OCR_CACHE_PATH", None)
+    cases = generate_corpus(args.corpus, args.profiles, args.variants)
+    options = {"repeat": args.repeat, "ocr_backend": args.ocr_backend, "ocr_mode": args.ocr_mode,
+               "excel_docs": args.excel_docs}
+
+    results = []
+    # Un proceso nuevo por caso, para que el pico de memoria no arrastre el de los casos anteriores
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(_run_isolated, [(case, options) for case in cases]):
+            results.append(result)
+            if "error" in result:
+                print(f"{result['name']:<18} ERROR {result['error']}", file=sys.stderr)
+                continue
+            extract = result["extract"]
+            rss = result["peak_rss_bytes"]
+            print(f"{result['name']:<18} {extract['median_s'] * 1000:>9.1f} ms/doc "
+                  f"{extract['pages_per_s']:>8.1f} pág/s {extract['fields_per_s']:>9.1f} campos/s "
+                  f"tablas {result['tables']['median_s'] * 1000:>8.1f} ms  excel {result['excel']['median_s'] * 1000:>8.1f} ms "
+                  f"sqlite {result['sqlite']['median_s'] * 1000:>8.1f} ms "
+                  f"OCR {sum(extract['ocr_calls_per_doc'].values()):>5.0f}  "
+                  f"RSS {rss / 2 ** 20 if rss else 0:>6.1f} MiB", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": options,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}", file=sys.stderr)
+    return 1 if any("error" in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Compara los motores de extracción de tablas (ver processing.tables).
+
+Mide, para cada PDF, el tiempo de extract_tables con cada motor y el del enfoque anterior
+(un análisis completo del documento con pdfminer por cada tabla de la plantilla).
+Sin argumentos genera un PDF sintético de 20 páginas con 5 tablas; también puede medirse
+sobre facturas reales:
+
+    python -m benchmarks.table_backends
+    python -m benchmarks.table_backends -t plantilla.json facturas/*.pdf --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import fitz
+
+from processing.extractor import PDFExtractor
+from processing.tables import TABLE_BACKENDS
+from templates.compiled import compile_template
+
+
+def make_synthetic(directory, pages=20, tables=5, rows=40):
+    """Genera un PDF de 'pages' páginas con 'tables' tablas repartidas y su plantilla."""
+    pdf_path = os.path.join(directory, "tablas.pdf")
+    template = {"fields": [], "tables": []}
+    step = max(1, pages // tables)
+    table_pages = [i * step for i in range(tables)]
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 50), f"Página {page_num + 1}", fontsize=12)
+        y = 80
+        for r in range(rows):
+            page.insert_text((50, y), f"Artículo {page_num}-{r}", fontsize=8)
+            page.insert_text((250, y), f"{r + 1}", fontsize=8)
+            page.insert_text((350, y), f"{(r + 1) * 12},50", fontsize=8)
+            y += 16
+    doc.save(pdf_path)
+    doc.close()
+    for i, page_num in enumerate(table_pages):
+        template["tables"].append({
+            "name": f"Tabla{i + 1}",
+            "page": page_num,
+            "coordinates": [40, 70, 500, 80 + rows * 16],
+            "columns": [
+                {"name": "Descripcion", "x0": 40, "x1": 240},
+                {"name": "Cantidad", "x0": 240, "x1": 340},
+                {"name": "Importe", "x0": 340, "x1": 500},
+            ],
+        })
+    template_path = os.path.join(directory, "tablas.json")
+    with open(template_path, "w", encoding="utf-8") as f:
+        json.dump(template, f)
+    return template_path, [pdf_path]
+
+
+def legacy_extract_tables(extractor, pdf_path):
+    """Enfoque anterior: un análisis completo del documento con pdfminer por cada tabla."""
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+    from processing.tables import PageElements, elements_in, table_bbox
+
+    result = {}
+    for table in extractor.compiled.tables:
+        elements = []
+        for page_num, page in enumerate(extract_pages(pdf_path)):
+            if page_num != table.page:
+                continue
+            bbox = table_bbox(table, PageElements(page.bbox[0], page.bbox[3], []))
+            for element in page:
+                if isinstance(element, LTTextContainer):
+                    x0, y0, x1, y1 = element.bbox
+                    elements.append({'text': element.get_text().strip(), 'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1})
+            elements = elements_in(elements, bbox)
+        result[table.name] = extractor.structure_table_data(elements, table.columns)
+    return result
+
+
+def measure(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", help="PDFs a medir (por defecto, uno sintético)")
+    parser.add_argument("-t", "--template", help="plantilla JSON con las tablas")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por medición (se toma la mediana)")
+    parser.add_argument("--no-legacy", action="store_true", help="no medir el enfoque anterior")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.pdfs:
+        if not args.template:
+            parser.error("con PDFs propios hay que indicar la plantilla (-t)")
+        template_path, pdf_paths = args.template, args.pdfs
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        template_path, pdf_paths = make_synthetic(tmp.name)
+
+    extractors = {name: PDFExtractor(template_path, table_backend=name) for name in TABLE_BACKENDS}
+    tables = len(compile_template(extractors[TABLE_BACKENDS[0]].template).tables)
+    methods = [(name, lambda path, e=extractor: e.extract_tables(path)) for name, extractor in extractors.items()]
+    if not args.no_legacy:
+        legacy = extractors["pdfminer"]
+        methods.insert(0, ("anterior", lambda path: legacy_extract_tables(legacy, path)))
+
+    print(f"{len(pdf_paths)} PDF(s), {tables} tablas por plantilla, mediana de {args.repeat} repeticiones")
+    print(f"{'motor':<10} {'total (s)':>10} {'por PDF (ms)':>13} {'filas':>8}")
+    for name, func in methods:
+        total = 0.0
+        rows = 0
+        for pdf_path in pdf_paths:
+            elapsed, result = measure(lambda: func(pdf_path), args.repeat)
+            total += elapsed
+            rows += sum(len(r) for r in result.values())
+        print(f"{name:<10} {total:>10.3f} {total / len(pdf_paths) * 1000:>13.1f} {rows:>8}")
+
+    if tmp is not None:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,21 @@
 import os
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, simpledialog
 from PIL import Image, ImageTk
-import fitz
 import re
 import sys
 
 # Importar el gestor de plantillas y el extractor de PDF
 from templates.manager import TemplateManager
-from processing.pdf_parser import PDFExtractor
+from processing import export, pdf_parser
+from processing.batch import BatchProcessor
+from processing.result_store import ResultStore
+from processing.columns import detect_column_boundaries
+from processing.layout import PageLayout
+from gui.render_cache import RenderCache, ZOOM_LEVELS
 
 class MainWindow:
     def __init__(self, root):
@@ -17,8 +24,12 @@ class MainWindow:
         self._set_icon()  # Configurar el ícono/logo de la aplicación
 
         # Variables para almacenar la definición de la plantilla
-        self.current_pdf = None
+        self.current_pdf_path = None  # El documento abierto lo gestiona render_cache
         self.current_page = 0
+        self.zoom = 1.0            # Zoom del canvas (1.0 = un píxel por punto PDF)
+        self.render_cache = RenderCache()  # Teselas renderizadas y documentos abiertos
+        self.tile_images = {}      # PhotoImage de las teselas dibujadas en el canvas
+        self.prefetch_job = None
         self.selected_fields = []  # Lista de diccionarios para campos fijos
         self.tables = []           # Lista de definiciones de tablas
         self.mode = "field"        # "field" o "table"
@@ -26,6 +37,7 @@ class MainWindow:
         self.tk_img = None         # Referencia a la imagen en el canvas
         self.current_table = {}    # Diccionario temporal para la tabla en definición
         self.column_entries = []   # Para almacenar entradas en definición manual de columnas
+        self.batch_thread = None   # Hilo del procesamiento por lotes en curso
 
         # Instanciar el gestor de plantillas (solo una vez)
         self.template_manager = TemplateManager()
@@ -33,6 +45,8 @@ class MainWindow:
         # Crear la interfaz y el menú
         self.create_widgets()
         self.create_menu()
+        self._ensure_tesseract()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def _set_icon(self):
         """Configura el ícono de la aplicación utilizando iconphoto."""
@@ -53,6 +67,21 @@ class MainWindow:
         except Exception as e:
             print("Error al cargar el logo:", e)
 
+    def _ensure_tesseract(self):
+        """Si Tesseract OCR no se encontró automáticamente, solicita al usuario que seleccione el ejecutable."""
+        if pdf_parser.tesseract_path_configured:
+            return
+        tesseract_path = filedialog.askopenfilename(
+            title="Selecciona tesseract.exe",
+            filetypes=[("Ejecutable", "*.exe")]
+        )
+        if not tesseract_path or not pdf_parser.configure_tesseract(tesseract_path):
+            messagebox.showwarning(
+                "Advertencia",
+                "No se pudo encontrar Tesseract OCR. Los PDFs escaneados no podrán procesarse.\n"
+                "Instálalo o configura la variable TESSERACT_PATH."
+            )
+
     def create_menu(self):
         """Crea la barra de menú, incluyendo la sección de Ayuda."""
         menubar = tk.Menu(self.root)
@@ -129,20 +158,43 @@ class MainWindow:
         self.btn_save_template.pack(side=tk.LEFT, padx=5)
         self.btn_process = ttk.Button(self.top_frame, text="Procesar Documentos", command=self.process_documents)
         self.btn_process.pack(side=tk.LEFT, padx=5)
+        self.btn_process_library = ttk.Button(self.top_frame, text="Procesar con Biblioteca",
+                                              command=self.process_with_library)
+        self.btn_process_library.pack(side=tk.LEFT, padx=5)
+
+        # --- Navegación de páginas y zoom ---
+        self.nav_frame = ttk.Frame(self.root)
+        self.nav_frame.pack(fill=tk.X, padx=5)
+        ttk.Button(self.nav_frame, text="◀", width=3, command=lambda: self.go_to_page(self.current_page - 1)).pack(side=tk.LEFT)
+        self.page_label = ttk.Label(self.nav_frame, text="Página -/-")
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.nav_frame, text="▶", width=3, command=lambda: self.go_to_page(self.current_page + 1)).pack(side=tk.LEFT)
+        ttk.Button(self.nav_frame, text="−", width=3, command=lambda: self.step_zoom(-1)).pack(side=tk.LEFT, padx=(15, 0))
+        self.zoom_label = ttk.Label(self.nav_frame, text="100%")
+        self.zoom_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.nav_frame, text="+", width=3, command=lambda: self.step_zoom(1)).pack(side=tk.LEFT)
 
         # --- Canvas y scrollbars ---
         self.canvas_frame = ttk.Frame(self.root)
         self.canvas_frame.pack(fill=tk.BOTH, expand=True)
         self.canvas = tk.Canvas(self.canvas_frame, bg="white")
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient=tk.HORIZONTAL, command=self.on_scroll_x)
+        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient=tk.VERTICAL, command=self.on_scroll_y)
         self.scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
         self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
         self.canvas.configure(xscrollcommand=self.scroll_x.set, yscrollcommand=self.scroll_y.set)
         self.canvas.bind("<ButtonPress-1>", self.on_mouse_press)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_release)
+        self.canvas.bind("<Configure>", lambda event: self.draw_visible_tiles())
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Control-MouseWheel>", self.on_zoom_wheel)
+        # En Linux la rueda del ratón llega como botones 4 y 5
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_canvas(-1))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_canvas(1))
+        self.canvas.bind("<Control-Button-4>", lambda event: self.step_zoom(1))
+        self.canvas.bind("<Control-Button-5>", lambda event: self.step_zoom(-1))
 
         # --- Áreas de previsualización en un PanedWindow ---
         self.bottom_pane = ttk.PanedWindow(self.root, orient=tk.VERTICAL)
@@ -162,27 +214,116 @@ class MainWindow:
         file_path = filedialog.askopenfilename(filetypes=[("PDF files", "*.pdf")])
         if file_path:
             try:
-                self.current_pdf = fitz.open(file_path)
+                # El documento anterior se cierra y sus teselas se descartan
+                if self.current_pdf_path and self.current_pdf_path != file_path:
+                    self.render_cache.forget(self.current_pdf_path)
+                # Abrir el documento aquí (en la caché) para informar enseguida si no es un PDF válido
+                self.render_cache.page_count(file_path)
+                self.current_pdf_path = file_path
                 self.current_page = 0
                 self.render_pdf_page()
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo cargar el PDF:\n{e}")
 
-    def render_pdf_page(self, page_num=0):
-        """Renderiza la página indicada del PDF en el canvas."""
-        if not self.current_pdf:
+    def render_pdf_page(self, page_num=None):
+        """Muestra la página indicada del PDF en el canvas con el zoom actual."""
+        if not self.current_pdf_path:
             return
+        if page_num is not None:
+            self.current_page = page_num
         try:
-            page = self.current_pdf.load_page(page_num)
-            pix = page.get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            self.tk_img = ImageTk.PhotoImage(img)
-            self.canvas.config(scrollregion=(0, 0, pix.width, pix.height))
+            width, height = self.render_cache.page_size(self.current_pdf_path, self.current_page, self.zoom)
+            self.canvas.config(scrollregion=(0, 0, width, height))
             self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_img)
+            self.tile_images = {}
+            self.page_label.config(
+                text=f"Página {self.current_page + 1}/{self.render_cache.page_count(self.current_pdf_path)}"
+            )
+            self.zoom_label.config(text=f"{int(self.zoom * 100)}%")
+            self.draw_visible_tiles()
         except Exception as e:
             messagebox.showerror("Error", f"Error al renderizar la página:\n{e}")
 
+    def visible_area(self):
+        """Área del canvas visible en pantalla, en coordenadas del canvas."""
+        x0 = self.canvas.canvasx(0)
+        y0 = self.canvas.canvasy(0)
+        return x0, y0, x0 + self.canvas.winfo_width(), y0 + self.canvas.winfo_height()
+
+    def draw_visible_tiles(self):
+        """Dibuja las teselas visibles que aún no están en el canvas y programa el prefetch."""
+        if not self.current_pdf_path:
+            return
+        area = self.visible_area()
+        size = self.render_cache.tile_size
+        for col, row in self.render_cache.visible_tiles(self.current_pdf_path, self.current_page, self.zoom, *area):
+            if (col, row) in self.tile_images:
+                continue
+            img = self.render_cache.tile(self.current_pdf_path, self.current_page, self.zoom, col, row)
+            self.tile_images[(col, row)] = ImageTk.PhotoImage(img)
+            self.canvas.create_image(col * size, row * size, anchor=tk.NW,
+                                     image=self.tile_images[(col, row)], tags="tile")
+        # Las teselas quedan debajo de las selecciones dibujadas
+        self.canvas.tag_lower("tile")
+        self.render_cache.prefetch(self.current_pdf_path, self.current_page, self.zoom, *area)
+        if self.prefetch_job is None:
+            self.prefetch_job = self.root.after_idle(self.prefetch_tiles)
+
+    def prefetch_tiles(self):
+        """Renderiza de a una tesela de las páginas vecinas cuando el bucle de eventos está libre."""
+        self.prefetch_job = None
+        if self.render_cache.prefetch_step():
+            self.prefetch_job = self.root.after(10, self.prefetch_tiles)
+
+    def go_to_page(self, page_num):
+        """Cambia a otra página del PDF cargado."""
+        if not self.current_pdf_path:
+            return
+        if 0 <= page_num < self.render_cache.page_count(self.current_pdf_path):
+            self.render_pdf_page(page_num)
+
+    def step_zoom(self, step):
+        """Pasa al nivel de zoom anterior o siguiente, conservando el punto del centro de la vista."""
+        if not self.current_pdf_path:
+            return
+        index = min(range(len(ZOOM_LEVELS)), key=lambda i: abs(ZOOM_LEVELS[i] - self.zoom))
+        index = max(0, min(len(ZOOM_LEVELS) - 1, index + step))
+        zoom = ZOOM_LEVELS[index]
+        if zoom == self.zoom:
+            return
+        x0, y0, x1, y1 = self.visible_area()
+        factor = zoom / self.zoom
+        self.zoom = zoom
+        self.render_pdf_page()
+        width, height = self.render_cache.page_size(self.current_pdf_path, self.current_page, self.zoom)
+        cx, cy = (x0 + x1) / 2 * factor, (y0 + y1) / 2 * factor
+        self.canvas.xview_moveto(max(0.0, (cx - (x1 - x0) / 2) / width))
+        self.canvas.yview_moveto(max(0.0, (cy - (y1 - y0) / 2) / height))
+        self.draw_visible_tiles()
+
+    def on_scroll_x(self, *args):
+        self.canvas.xview(*args)
+        self.draw_visible_tiles()
+
+    def on_scroll_y(self, *args):
+        self.canvas.yview(*args)
+        self.draw_visible_tiles()
+
+    def scroll_canvas(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self.draw_visible_tiles()
+
+    def on_mouse_wheel(self, event):
+        self.scroll_canvas(-1 if event.delta > 0 else 1)
+
+    def on_zoom_wheel(self, event):
+        self.step_zoom(1 if event.delta > 0 else -1)
+
+    def on_close(self):
+        """Cierra los documentos abiertos del diseñador antes de salir."""
+        self.render_cache.close()
+        self.root.destroy()
+
     # --- Manejo de eventos del canvas ---
     def on_mouse_press(self, event):
         self.start_x = self.canvas.canvasx(event.x)
@@ -197,7 +338,8 @@ class MainWindow:
     def on_mouse_release(self, event):
         end_x = self.canvas.canvasx(event.x)
         end_y = self.canvas.canvasy(event.y)
-        coords = (self.start_x, self.start_y, end_x, end_y)
+        # Las coordenadas de la plantilla se guardan en puntos PDF, independientes del zoom
+        coords = tuple(v / self.zoom for v in (self.start_x, self.start_y, end_x, end_y))
         if self.mode == "field":
             self.current_selection = coords
             self.preview_text.insert(tk.END, f"Área de campo seleccionada: {coords}\n")
@@ -252,36 +394,47 @@ class MainWindow:
 
     def auto_detect_columns(self):
         """
-        Tras definir el área de la tabla, se detectan columnas automáticamente.
-        Se requiere implementar get_pdf_elements_in_area para extraer los elementos del PDF en esa zona.
+        Tras definir el área de la tabla, se detectan columnas automáticamente a partir de los
+        huecos en blanco entre las palabras del área (ver processing.columns).
         """
         if "coordinates" not in self.current_table:
             messagebox.showerror("Error", "Área de tabla no definida")
             return
         x0, y0, x1, y1 = self.current_table["coordinates"]
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
         pdf_elements = self.get_pdf_elements_in_area(x0, y0, x1, y1)
-        detected_columns = self.detect_columns(pdf_elements)
+        detected_columns = self.detect_columns(pdf_elements, x0, x1)
         self.show_column_configurator(detected_columns)
 
     def get_pdf_elements_in_area(self, x0, y0, x1, y1):
         """
-        Placeholder: implementar la lógica para extraer elementos (por ejemplo, bloques de texto)
-        del PDF que se encuentren en el área dada.
+        Devuelve las palabras de la página actual cuyo centro está dentro del área dada (en puntos PDF),
+        como diccionarios {'text', 'x0', 'y0', 'x1', 'y1'}.
         """
-        return []
-
-    def detect_columns(self, elements, tolerance=5):
+        if not self.current_pdf_path:
+            return []
+        page = self.render_cache.documents.open(self.current_pdf_path).load_page(self.current_page)
+        layout = PageLayout.from_page(page)
+        return [
+            {'text': layout.text[i], 'x0': layout.x0[i], 'y0': layout.y0[i], 'x1': layout.x1[i], 'y1': layout.y1[i]}
+            for i in layout.query((x0, y0, x1, y1))
+        ]
+
+    def detect_columns(self, elements, x0=None, x1=None):
         """
-        Detecta columnas a partir de elementos con propiedades 'x0' y 'x1'.
+        Detecta columnas a partir de elementos con propiedades 'x0' y 'x1': los bordes se colocan en
+        los huecos verticales en blanco que atraviesan casi todas las líneas de la tabla.
+        Si no se indican los límites del área se usan los de los propios elementos.
         """
-        x_positions = []
-        for elem in elements:
-            x_positions.append(elem.get('x0', 0))
-            x_positions.append(elem.get('x1', 0))
-        if not x_positions:
+        if not elements:
             return []
-        rounded_x = [round(x / tolerance) * tolerance for x in x_positions]
-        column_borders = sorted(list(set(rounded_x)))
+        if x0 is None:
+            x0 = min(elem['x0'] for elem in elements)
+        if x1 is None:
+            x1 = max(elem['x1'] for elem in elements)
+        words = [(elem['x0'], elem['y0'], elem['x1'], elem['y1']) for elem in elements]
+        column_borders = detect_column_boundaries(words, x0, x1)
         columns = []
         for i in range(len(column_borders) - 1):
             columns.append({
@@ -387,7 +540,8 @@ class MainWindow:
         )
         if file_path:
             try:
-                self.template_manager.save_template(template, file_path)
+                # La huella del PDF de ejemplo permite elegir la plantilla automáticamente en una biblioteca
+                self.template_manager.save_template(template, file_path, pdf_path=self.current_pdf_path)
                 messagebox.showinfo("Éxito", "Template guardado correctamente.")
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo guardar el template:\n{e}")
@@ -400,68 +554,172 @@ class MainWindow:
         pdf_paths = filedialog.askopenfilenames(filetypes=[("PDF files", "*.pdf")])
         if not pdf_paths:
             return
-        extractor = PDFExtractor(template_path)
-        all_fields_data = []
-        all_tables_data = []
-        for pdf_path in pdf_paths:
-            try:
-                data = extractor.extract_from_pdf(pdf_path)
-                field_data = {"Archivo": os.path.basename(pdf_path)}
-                field_data.update(data.get("fields", {}))
-                all_fields_data.append(field_data)
-                for table_name, table_rows in data.get("tables", {}).items():
-                    for row in table_rows:
-                        row_data = {"Archivo": os.path.basename(pdf_path), "Tabla": table_name}
-                        row_data.update(row)
-                        all_tables_data.append(row_data)
-            except Exception as e:
-                messagebox.showwarning("Error", f"Error procesando {pdf_path}:\n{str(e)}")
-        if all_fields_data or all_tables_data:
-            self.export_to_excel(all_fields_data, all_tables_data)
+        try:
+            # Los PDFs ya procesados con la misma plantilla se toman del almacén de resultados
+            batch = BatchProcessor(template_path, result_store=ResultStore())
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        output_path = self.ask_output_path()
+        if not output_path:
+            return
+        self.start_batch(batch, list(pdf_paths), output_path)
+
+    def process_with_library(self):
+        """Procesa PDFs de distintos proveedores eligiendo la plantilla de cada uno en una carpeta de plantillas."""
+        library_dir = filedialog.askdirectory(title="Carpeta de plantillas")
+        if not library_dir:
+            return
+        pdf_paths = filedialog.askopenfilenames(filetypes=[("PDF files", "*.pdf")])
+        if not pdf_paths:
+            return
+        try:
+            batch = BatchProcessor(library_dir, result_store=ResultStore())
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        output_path = self.ask_output_path()
+        if not output_path:
+            return
+        self.start_batch(batch, list(pdf_paths), output_path)
 
-    def export_to_excel(self, fields_data, tables_data):
-        """Exporta la información extraída a un archivo Excel con dos hojas."""
-        from openpyxl import Workbook
+    # --- Procesamiento por lotes en segundo plano ---
+    def start_batch(self, batch, pdf_paths, output_path):
+        """
+        Lanza el lote en un hilo de trabajo para no bloquear la ventana. El hilo envía el progreso
+        por una cola que se consulta desde el bucle de eventos de Tk (ver poll_batch).
+        """
+        self.batch_events = queue.Queue()
+        self.batch_cancel = threading.Event()
+        self.batch_total = len(pdf_paths)
+        self.batch_done = 0
+        self.batch_pages = 0
+        self.batch_start = time.perf_counter()
+        self.batch_output = output_path
+        self.btn_process.config(state=tk.DISABLED)
+        self.btn_process_library.config(state=tk.DISABLED)
+        self.show_batch_progress()
+        self.batch_thread = threading.Thread(
+            target=self.run_batch, args=(batch, pdf_paths, output_path), daemon=True
+        )
+        self.batch_thread.start()
+        self.root.after(100, self.poll_batch)
+
+    def run_batch(self, batch, pdf_paths, output_path):
+        """Hilo de trabajo: extrae los documentos y escribe los resultados. No toca la interfaz."""
+        errors = []
+        count = 0
+        results = batch.iter_results(pdf_paths)
+        try:
+            # Las filas se escriben a medida que se extraen, sin acumular el lote en memoria
+            with export.open_sink(output_path) as sink:
+                for result in results:
+                    if result.error:
+                        errors.append((result.path, result.error))
+                    else:
+                        sink.write(result.path, result.data, file_hash=result.file_hash,
+                                   template=result.template or batch.template_name)
+                    self.batch_events.put(("progress", result.pages))
+                    if self.batch_cancel.is_set():
+                        break
+            count = sink.count
+        except Exception as e:
+            errors.append((output_path, f"No se pudo exportar los resultados: {e}"))
+        finally:
+            # Cerrar el generador descarta los bloques pendientes si el lote se canceló
+            results.close()
+        self.batch_events.put(("done", count, errors))
+
+    def show_batch_progress(self):
+        """Muestra la ventana de progreso con barra, velocidad, tiempo restante y botón de cancelar."""
+        self.progress_window = tk.Toplevel(self.root)
+        self.progress_window.title("Procesando documentos")
+        self.progress_window.resizable(False, False)
+        self.progress_window.protocol("WM_DELETE_WINDOW", self.cancel_batch)
+        frame = ttk.Frame(self.progress_window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.progress_bar = ttk.Progressbar(frame, length=400, mode="determinate", maximum=self.batch_total)
+        self.progress_bar.pack(fill=tk.X, pady=5)
+        self.progress_label = ttk.Label(frame, text=f"0/{self.batch_total} documentos")
+        self.progress_label.pack(fill=tk.X, pady=5)
+        self.btn_cancel_batch = ttk.Button(frame, text="Cancelar", command=self.cancel_batch)
+        self.btn_cancel_batch.pack(pady=5)
+
+    def cancel_batch(self):
+        """Solicita la cancelación del lote; los documentos ya procesados se conservan en la salida."""
+        self.batch_cancel.set()
+        self.btn_cancel_batch.config(state=tk.DISABLED)
+        self.progress_label.config(text="Cancelando...")
+
+    def poll_batch(self):
+        """Consulta la cola de eventos del hilo de trabajo y actualiza la ventana de progreso."""
+        finished = None
+        while True:
+            try:
+                event = self.batch_events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                self.batch_done += 1
+                self.batch_pages += event[1]
+            else:
+                finished = event
+        self.progress_bar["value"] = self.batch_done
+        if not self.batch_cancel.is_set():
+            elapsed = time.perf_counter() - self.batch_start
+            rate = self.batch_done / elapsed if elapsed > 0 else 0.0
+            eta = (self.batch_total - self.batch_done) / rate if rate > 0 else 0.0
+            self.progress_label.config(
+                text=f"{self.batch_done}/{self.batch_total} documentos · {rate:.2f} docs/s · "
+                     f"restante {int(eta // 60):02d}:{int(eta % 60):02d}"
+            )
+        if finished is None:
+            self.root.after(100, self.poll_batch)
+            return
+        _, count, errors = finished
+        self.progress_window.destroy()
+        self.btn_process.config(state=tk.NORMAL)
+        self.btn_process_library.config(state=tk.NORMAL)
+        self.batch_thread = None
+        self.show_batch_summary(count, errors)
+
+    def show_batch_summary(self, count, errors):
+        """Muestra un único resumen al final del lote, con la lista de errores si los hubo."""
+        elapsed = time.perf_counter() - self.batch_start
+        status = "Procesamiento cancelado" if self.batch_cancel.is_set() else "Procesamiento finalizado"
+        summary = (
+            f"{status}: {count} documentos exportados de {self.batch_total} "
+            f"({self.batch_pages} páginas en {elapsed:.1f} s).\nArchivo: {self.batch_output}"
+        )
+        if not errors:
+            messagebox.showinfo("Éxito", summary)
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Resumen del procesamiento")
+        ttk.Label(dialog, text=f"{summary}\n{len(errors)} documentos con errores:", padding=10).pack(fill=tk.X)
+        text = tk.Text(dialog, width=100, height=15)
+        text.pack(fill=tk.BOTH, expand=True, padx=10)
+        for path, error in errors:
+            text.insert(tk.END, f"{path}: {error}\n")
+        text.config(state=tk.DISABLED)
+        ttk.Button(dialog, text="Cerrar", command=dialog.destroy).pack(pady=10)
+
+    def ask_output_path(self):
+        """Solicita la ruta del archivo de salida (Excel por defecto), con un nombre basado en la fecha."""
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         default_name = f"Procesado_{timestamp}.xlsx"
-        output_path = filedialog.asksaveasfilename(
+        return filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx")],
+            filetypes=[
+                ("Excel files", "*.xlsx"),
+                ("CSV files", "*.csv"),
+                ("JSON Lines files", "*.jsonl"),
+                ("Parquet files", "*.parquet"),
+                ("SQLite files", "*.sqlite"),
+            ],
             initialfile=default_name
         )
-        if output_path:
-            try:
-                wb = Workbook()
-                ws_fields = wb.active
-                ws_fields.title = "Campos"
-                if fields_data:
-                    headers = list(fields_data[0].keys())
-                    ws_fields.append(headers)
-                    for item in fields_data:
-                        ws_fields.append([item.get(h, "") for h in headers])
-                ws_tables = wb.create_sheet("Tablas")
-                if tables_data:
-                    headers = list(tables_data[0].keys())
-                    ws_tables.append(headers)
-                    for item in tables_data:
-                        ws_tables.append([item.get(h, "") for h in headers])
-                for ws in [ws_fields, ws_tables]:
-                    for col in ws.columns:
-                        max_length = 0
-                        column = col[0].column_letter
-                        for cell in col:
-                            try:
-                                cell_length = len(str(cell.value))
-                                if cell_length > max_length:
-                                    max_length = cell_length
-                            except Exception:
-                                pass
-                        ws.column_dimensions[column].width = max_length + 2
-                wb.save(output_path)
-                messagebox.showinfo("Éxito", f"Documentos procesados.\nArchivo: {output_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo exportar a Excel:\n{e}")
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,177 @@
+"""
+Caché de renderizado para el diseñador de plantillas.
+
+Las páginas se renderizan por teselas (tiles) de TILE_SIZE píxeles y solo se generan las que
+se ven en el canvas. Las teselas se guardan en una caché LRU acotada en bytes e indexada por
+(documento, página, zoom, columna, fila), de modo que volver a una página o a un zoom ya visto
+no vuelve a renderizar nada. Los documentos abiertos se mantienen en un pool acotado que cierra
+los menos usados.
+
+El módulo no depende de Tk: las teselas se devuelven como imágenes PIL y la ventana se encarga
+de convertirlas en PhotoImage.
+"""
+import math
+from collections import OrderedDict
+
+import fitz
+
+from processing.raster import pixmap_image, render_pixmap
+
+# Lado de cada tesela en píxeles
+TILE_SIZE = 512
+# Memoria máxima por defecto de la caché de teselas (RGB, 3 bytes por píxel)
+DEFAULT_TILE_CACHE_BYTES = 256 * 1024 * 1024
+# Documentos abiertos como máximo en el pool
+DEFAULT_MAX_DOCUMENTS = 4
+# Niveles de zoom del diseñador (1.0 = 72 dpi, un píxel por punto PDF)
+ZOOM_LEVELS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 3.0, 4.0)
+
+
+class DocumentPool:
+    """Pool acotado de documentos PyMuPDF abiertos; al superar el máximo cierra el menos usado."""
+
+    def __init__(self, max_documents=DEFAULT_MAX_DOCUMENTS):
+        self.max_documents = max(1, max_documents)
+        self._docs = OrderedDict()
+
+    def open(self, path):
+        """Devuelve el documento abierto para la ruta, abriéndolo si hace falta."""
+        doc = self._docs.get(path)
+        if doc is not None and not doc.is_closed:
+            self._docs.move_to_end(path)
+            return doc
+        doc = fitz.open(path)
+        self._docs[path] = doc
+        while len(self._docs) > self.max_documents:
+            _, old = self._docs.popitem(last=False)
+            old.close()
+        return doc
+
+    def close(self, path):
+        doc = self._docs.pop(path, None)
+        if doc is not None:
+            doc.close()
+
+    def close_all(self):
+        while self._docs:
+            _, doc = self._docs.popitem()
+            doc.close()
+
+
+class RenderCache:
+    """
+    Renderizado por teselas con caché LRU.
+
+    - tile(path, page_num, zoom, col, row): imagen PIL de la tesela, renderizada solo si no está en caché
+    - visible_tiles(...): teselas que cubren un área del canvas
+    - prefetch(...) / prefetch_step(): cola de teselas a renderizar por adelantado (páginas vecinas),
+      que la ventana procesa de a una en los momentos libres del bucle de eventos
+    """
+
+    def __init__(self, max_bytes=DEFAULT_TILE_CACHE_BYTES, max_documents=DEFAULT_MAX_DOCUMENTS, tile_size=TILE_SIZE):
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.documents = DocumentPool(max_documents)
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._bytes = 0
+        self._page_key = None
+        self._page = None
+        self._prefetch = OrderedDict()
+
+    def page_count(self, path):
+        return self.documents.open(path).page_count
+
+    def _load_page(self, path, page_num):
+        # Se conserva la última página cargada: las teselas de una misma página llegan seguidas
+        key = (path, page_num)
+        if self._page_key != key or self._page.parent is None or self._page.parent.is_closed:
+            self._page = self.documents.open(path).load_page(page_num)
+            self._page_key = key
+        return self._page
+
+    def page_size(self, path, page_num, zoom):
+        """Tamaño en píxeles de la página con el zoom indicado."""
+        rect = self._load_page(path, page_num).rect
+        return int(math.ceil(rect.width * zoom)), int(math.ceil(rect.height * zoom))
+
+    def grid(self, path, page_num, zoom):
+        """Número de columnas y filas de teselas de la página."""
+        width, height = self.page_size(path, page_num, zoom)
+        return int(math.ceil(width / self.tile_size)), int(math.ceil(height / self.tile_size))
+
+    def visible_tiles(self, path, page_num, zoom, x0, y0, x1, y1):
+        """Devuelve (col, row) de las teselas que cubren el área (x0, y0, x1, y1) del canvas."""
+        cols, rows = self.grid(path, page_num, zoom)
+        size = self.tile_size
+        col0, col1 = max(0, int(x0 // size)), min(cols - 1, int(x1 // size))
+        row0, row1 = max(0, int(y0 // size)), min(rows - 1, int(y1 // size))
+        return [(col, row) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+    def tile(self, path, page_num, zoom, col, row):
+        """Devuelve la tesela (imagen PIL) de la página, desde la caché o renderizándola."""
+        key = (path, page_num, zoom, col, row)
+        img = self._tiles.get(key)
+        if img is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return img
+        self.misses += 1
+        img = self._render(path, page_num, zoom, col, row)
+        self._tiles[key] = img
+        self._bytes += img.width * img.height * 3
+        while self._bytes > self.max_bytes and len(self._tiles) > 1:
+            _, old = self._tiles.popitem(last=False)
+            self._bytes -= old.width * old.height * 3
+        return img
+
+    def _render(self, path, page_num, zoom, col, row):
+        page = self._load_page(path, page_num)
+        rect = page.rect
+        step = self.tile_size / zoom
+        clip = fitz.Rect(rect.x0 + col * step, rect.y0 + row * step,
+                         rect.x0 + (col + 1) * step, rect.y0 + (row + 1) * step) & rect
+        # Imagen RGB del pixmap: PIL copia el buffer una vez y el pixmap se libera al volver
+        return pixmap_image(render_pixmap(page, zoom * 72, clip, gray=False))
+
+    def prefetch(self, path, page_num, zoom, x0, y0, x1, y1):
+        """
+        Encola las teselas de las páginas vecinas (anterior y siguiente) que ocupan el mismo área
+        visible, para que cambiar de página no tenga que esperar al renderizado.
+        """
+        self._prefetch.clear()
+        count = self.page_count(path)
+        for neighbour in (page_num + 1, page_num - 1):
+            if 0 <= neighbour < count:
+                for col, row in self.visible_tiles(path, neighbour, zoom, x0, y0, x1, y1):
+                    key = (path, neighbour, zoom, col, row)
+                    if key not in self._tiles:
+                        self._prefetch[key] = None
+
+    def prefetch_step(self):
+        """Renderiza una tesela pendiente de la cola de prefetch. Devuelve False si no queda ninguna."""
+        if not self._prefetch:
+            return False
+        key, _ = self._prefetch.popitem(last=False)
+        if key not in self._tiles:
+            self.tile(*key)
+        return bool(self._prefetch)
+
+    def forget(self, path):
+        """Descarta las teselas y cierra el documento de la ruta indicada."""
+        for key in [k for k in self._tiles if k[0] == path]:
+            img = self._tiles.pop(key)
+            self._bytes -= img.width * img.height * 3
+        for key in [k for k in self._prefetch if k[0] == path]:
+            del self._prefetch[key]
+        if self._page_key and self._page_key[0] == path:
+            self._page_key = self._page = None
+        self.documents.close(path)
+
+    def close(self):
+        self._tiles.clear()
+        self._prefetch.clear()
+        self._bytes = 0
+        self._page_key = self._page = None
+        self.documents.close_all()
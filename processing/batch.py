@@ -0,0 +1,287 @@
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from processing import instrumentation
+from processing.pdf_parser import PDFExtractor
+from processing.result_store import template_hash
+from templates.manager import TemplateManager
+
+# Resultado de un documento del lote. 'data' es el diccionario que devuelve
+# PDFExtractor.extract_from_pdf; si la extracción falla, 'data' es None y 'error' contiene el mensaje.
+# 'file_hash' y 'cached' solo se completan cuando se usa un almacén de resultados, y 'trace' (registro
+# de tiempos y contadores del documento) solo cuando la instrumentación está activada. 'template' es
+# el nombre de la plantilla elegida cuando el lote usa una biblioteca de plantillas.
+BatchResult = namedtuple("BatchResult",
+                         ["path", "data", "error", "pages", "elapsed", "file_hash", "cached", "trace", "template"],
+                         defaults=(None, False, None, None))
+
+# Error de un documento que, estando solo en el grupo de procesos, terminó con el proceso trabajador
+WORKER_CRASH_ERROR = "El proceso de extracción terminó de forma inesperada con este documento"
+
+# Extractor "caliente" de cada proceso trabajador: se crea una sola vez en _init_worker
+# y se reutiliza para todos los documentos que procese ese proceso.
+_worker_extractor = None
+
+
+class TemplateRouter:
+    """
+    Extractor de un lote con plantillas mezcladas: elige la plantilla de cada documento con la
+    biblioteca (TemplateManager.match) y mantiene un PDFExtractor ya cargado por plantilla.
+    """
+
+    def __init__(self, library, extractor_options=None):
+        self.library = library
+        self.extractor_options = dict(extractor_options or {})
+        self._extractors = {}
+
+    def extractor_for(self, doc):
+        """Devuelve (TemplateMatch, PDFExtractor) para el documento abierto. Lanza ValueError si no hay plantilla."""
+        match = self.library.match(doc)
+        if match is None:
+            raise ValueError("Ninguna plantilla de la biblioteca corresponde al documento")
+        extractor = self._extractors.get(match.path)
+        if extractor is None:
+            extractor = self._extractors[match.path] = PDFExtractor(match.path, **self.extractor_options)
+        return match, extractor
+
+
+def load_extractor(template, extractor_options=None):
+    """
+    Crea el extractor de 'template': un PDFExtractor si es la ruta de una plantilla, o un
+    TemplateRouter si es una biblioteca (TemplateManager) ya indexada.
+    """
+    if isinstance(template, TemplateManager):
+        return TemplateRouter(template, extractor_options)
+    return PDFExtractor(template, **(extractor_options or {}))
+
+
+def _init_worker(template, extractor_options):
+    """
+    Inicializa el proceso trabajador cargando la plantilla una única vez. 'template' es la ruta de
+    la plantilla o la biblioteca (TemplateManager) ya indexada en el proceso principal.
+    """
+    global _worker_extractor
+    _worker_extractor = load_extractor(template, extractor_options)
+
+
+def _extract_chunk(pdf_paths):
+    """Procesa un bloque de documentos dentro de un proceso trabajador."""
+    return [extract_document(_worker_extractor, pdf_path) for pdf_path in pdf_paths]
+
+
+def _extract_bytes(pdf_bytes):
+    """
+    Extrae un PDF recibido en memoria dentro de un proceso trabajador (ver processing.server).
+    Devuelve (data, páginas); los errores se propagan al proceso principal.
+    """
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return extract_open_document(_worker_extractor, doc), doc.page_count
+
+
+def extract_open_document(extractor, doc):
+    """
+    Extrae un documento ya abierto (fitz.Document) con un PDFExtractor o un TemplateRouter. Con
+    TemplateRouter, el resultado incluye la plantilla elegida en "template".
+    """
+    if not isinstance(extractor, TemplateRouter):
+        return extractor.extract_from_document(doc)
+    with instrumentation.stage("match"):
+        match, doc_extractor = extractor.extractor_for(doc)
+    data = doc_extractor.extract_from_document(doc)
+    # La plantilla elegida viaja con el resultado (y con él, al almacén y a la salida)
+    data["template"] = match.name
+    return data
+
+
+def extract_document(extractor, pdf_path):
+    """
+    Extrae un documento con el extractor dado y devuelve un BatchResult.
+    Los errores se capturan en el resultado para que un archivo defectuoso no detenga el lote.
+    """
+    start = time.perf_counter()
+    instrumentation.begin_document(pdf_path)
+    pages = 0
+    template = None
+    try:
+        with instrumentation.stage("open"):
+            doc = fitz.open(pdf_path)
+        with doc:
+            instrumentation.count("bytes_read", os.path.getsize(pdf_path))
+            pages = doc.page_count
+            data = extract_open_document(extractor, doc)
+            template = data.get("template")
+        error = None
+    except Exception as e:
+        data, error = None, str(e)
+    trace = instrumentation.end_document(pages=pages, error=error, template=template)
+    return BatchResult(pdf_path, data, error, pages if error is None else 0, time.perf_counter() - start,
+                       trace=trace, template=template)
+
+
+class BatchProcessor:
+    """
+    Motor de extracción por lotes.
+
+    Reparte los documentos en bloques ('chunks') sobre un ProcessPoolExecutor. Cada proceso
+    trabajador mantiene su propio PDFExtractor con la plantilla ya cargada, y los resultados
+    se devuelven en el mismo orden que los archivos de entrada. Si un documento termina con el
+    proceso trabajador, el grupo se recrea y el lote sigue: solo ese documento queda con error.
+    """
+
+    def __init__(self, template_path, max_workers=None, chunksize=None, extractor_options=None,
+                 result_store=None):
+        """
+        - template_path: ruta a la plantilla JSON, o a una carpeta de plantillas (biblioteca): en ese
+          caso la plantilla de cada PDF se elige automáticamente por su huella (ver TemplateManager)
+          y un mismo lote puede mezclar documentos de distintos proveedores.
+        - max_workers: número de procesos (por defecto, el número de CPUs). Con 1 se procesa en el propio proceso.
+        - chunksize: documentos por bloque enviado a cada proceso (por defecto se calcula según el lote).
+        - extractor_options: argumentos adicionales para PDFExtractor (por ejemplo, ocr_mode u ocr_dpi).
+        - result_store: ResultStore opcional; los PDFs ya extraídos con la misma plantilla se sirven
+          desde el almacén y solo se extraen los nuevos o modificados.
+        """
+        self.extractor_options = dict(extractor_options or {})
+        self.template_path = template_path
+        self.result_store = result_store
+        if os.path.isdir(template_path):
+            # La biblioteca se indexa una sola vez aquí y se envía ya indexada a los procesos trabajadores
+            self.library = TemplateManager(template_path)
+            self.library.check_library()
+            # Validar las opciones antes de lanzar los procesos
+            extractor = PDFExtractor(self.library.entries[0].path, **self.extractor_options)
+            template = {entry.name: entry.template for entry in self.library.entries}
+            # Con biblioteca, la plantilla de cada documento viaja en su BatchResult
+            self.template_name = None
+        else:
+            self.library = None
+            self.template_name = os.path.splitext(os.path.basename(template_path))[0]
+            # Crear un extractor aquí para detectar errores de plantilla u opciones antes de lanzar los procesos
+            extractor = PDFExtractor(template_path, **self.extractor_options)
+            template = extractor.template
+        # La clave usa los valores que tendrán los extractores (incluidos los de las variables de
+        # entorno, como OCR_BACKEND), no solo las opciones explícitas
+        self.template_key = template_hash(template, extractor.result_options())
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.chunksize = chunksize
+
+    def _chunksize_for(self, total):
+        if self.chunksize:
+            return max(1, self.chunksize)
+        # Bloques pequeños reparten mejor la carga; bloques grandes reducen la comunicación entre procesos
+        return max(1, min(16, total // (self.max_workers * 4)))
+
+    def iter_results(self, pdf_paths):
+        """
+        Procesa los PDFs y va devolviendo un BatchResult por documento, en el orden de entrada.
+        Como máximo hay dos bloques en curso por proceso, por lo que la memoria no crece con el tamaño del lote.
+        """
+        if self.result_store is None:
+            yield from self._iter_extracted(pdf_paths)
+            return
+
+        store = self.result_store
+        # Calcular los hashes primero para enviar a extraer solo los archivos que no están en el almacén
+        entries = []
+        for pdf_path in pdf_paths:
+            try:
+                digest = store.hash_file(pdf_path)
+            except OSError as e:
+                entries.append((pdf_path, None, False, str(e)))
+                continue
+            entries.append((pdf_path, digest, store.contains(digest, self.template_key), None))
+        pending = [path for path, digest, hit, error in entries if not error and not hit]
+        extracted = self._iter_extracted(pending)
+
+        for pdf_path, digest, hit, error in entries:
+            if error:
+                yield BatchResult(pdf_path, None, error, 0, 0.0)
+            elif hit:
+                start = time.perf_counter()
+                data, pages = store.get(digest, self.template_key)
+                yield BatchResult(pdf_path, data, None, pages, time.perf_counter() - start, digest, True,
+                                  template=data.get("template"))
+            else:
+                result = next(extracted)._replace(file_hash=digest)
+                if result.error is None:
+                    store.put(digest, self.template_key, result.data, result.pages)
+                yield result
+
+    def _iter_extracted(self, pdf_paths):
+        """Extrae los PDFs indicados (en paralelo si corresponde) y devuelve los resultados en orden."""
+        pdf_paths = list(pdf_paths)
+        if not pdf_paths:
+            return
+        chunksize = self._chunksize_for(len(pdf_paths))
+        chunks = [pdf_paths[i:i + chunksize] for i in range(0, len(pdf_paths), chunksize)]
+        workers = min(self.max_workers, len(chunks))
+
+        template = self.library if self.library is not None else self.template_path
+        if workers == 1:
+            # Sin paralelismo posible: evitar el coste de arrancar procesos
+            extractor = load_extractor(template, self.extractor_options)
+            for pdf_path in pdf_paths:
+                yield extract_document(extractor, pdf_path)
+            return
+
+        def start():
+            return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(template, self.extractor_options))
+
+        def submit(chunk):
+            # Con el grupo ya roto, el error llega por el futuro como el de los bloques en curso
+            try:
+                return executor.submit(_extract_chunk, chunk)
+            except BrokenProcessPool as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+
+        executor = start()
+        pending_chunks = iter(chunks)
+        # Bloques en curso, en orden de entrada: (rutas, futuro)
+        in_flight = deque()
+        try:
+            for chunk in pending_chunks:
+                in_flight.append((chunk, submit(chunk)))
+                if len(in_flight) >= workers * 2:
+                    break
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                next_chunk = next(pending_chunks, None)
+                if next_chunk is not None:
+                    in_flight.append((next_chunk, submit(next_chunk)))
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    # Un proceso trabajador terminó de forma inesperada (por ejemplo, un PDF que tumba a
+                    # MuPDF o un proceso sin memoria). Todos los bloques en curso fallan a la vez: el grupo
+                    # se recrea una vez y los documentos del bloque se repiten de uno en uno, para que
+                    # solo el responsable quede con error
+                    wait([f for _, f in in_flight])
+                    executor.shutdown(wait=False)
+                    executor = start()
+                    results = []
+                    for pdf_path in chunk:
+                        try:
+                            results.extend(submit([pdf_path]).result())
+                        except BrokenProcessPool:
+                            results.append(BatchResult(pdf_path, None, WORKER_CRASH_ERROR, 0, 0.0))
+                            executor.shutdown(wait=False)
+                            executor = start()
+                    # Los bloques que terminaron antes de la interrupción conservan su resultado
+                    in_flight = deque((c, f if f.exception() is None else submit(c)) for c, f in in_flight)
+                yield from results
+        finally:
+            # Si se interrumpe el lote (por ejemplo, al cancelarlo), descartar los bloques que no empezaron
+            for _, future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def process(self, pdf_paths):
+        """Procesa todos los PDFs y devuelve la lista de BatchResult en el orden de entrada."""
+        return list(self.iter_results(pdf_paths))
@@ -0,0 +1,93 @@
+"""
+Clasificación de páginas en nativas o escaneadas.
+
+Se ejecuta una vez por página (DocumentLayout.page_kind guarda el resultado) y decide el camino de
+extracción de todos los campos de esa página:
+  - "native": página con capa de texto que no está sobre imágenes; se usa solo el texto nativo y un
+    campo vacío queda vacío, sin lanzar el OCR
+  - "scanned": página sin texto cubierta por imágenes; se va directamente al OCR, sin consultar
+    antes el texto nativo de cada campo
+  - "mixed": cualquier otro caso, por ejemplo texto escaso o texto sobre una imagen grande (un sello,
+    un número de página o la capa de texto de un escaneo); cada campo prueba el texto nativo y, si
+    está vacío, recurre al OCR
+
+Ante la duda la página se clasifica como "mixed": es más lenta, pero no pierde el OCR de los campos
+que solo están en la imagen.
+
+Las señales son la cantidad de palabras y la superficie que cubren, la parte de esa superficie que
+queda sobre imágenes, la superficie cubierta por imágenes y la presencia de fuentes en la página.
+"""
+from collections import namedtuple
+
+PAGE_KINDS = ("native", "scanned", "mixed")
+# Palabras a partir de las cuales una página puede considerarse nativa
+MIN_NATIVE_WORDS = 10
+# Fracción máxima de la superficie del texto que puede quedar sobre imágenes en una página nativa
+MAX_NATIVE_TEXT_ON_IMAGES = 0.1
+# Fracción de la página cubierta por imágenes a partir de la cual una página sin texto es un escaneo
+SCANNED_IMAGE_COVERAGE = 0.3
+
+# 'text_on_images' es la fracción de la superficie del texto que queda sobre imágenes
+PageClass = namedtuple("PageClass", ["kind", "words", "text_coverage", "image_coverage", "fonts", "text_on_images"])
+
+
+def _coverage(boxes, page_rect):
+    """Fracción de la página cubierta por las cajas (acotada a 1; los solapes se cuentan dos veces)."""
+    area = page_rect.width * page_rect.height
+    if area <= 0:
+        return 0.0
+    covered = 0.0
+    for x0, y0, x1, y1 in boxes:
+        w = min(x1, page_rect.x1) - max(x0, page_rect.x0)
+        h = min(y1, page_rect.y1) - max(y0, page_rect.y0)
+        if w > 0 and h > 0:
+            covered += w * h
+    return min(1.0, covered / area)
+
+
+def _overlap(boxes, image_boxes):
+    """Fracción de la superficie de las cajas que queda sobre alguna imagen (0 si no hay cajas)."""
+    total = 0.0
+    covered = 0.0
+    for x0, y0, x1, y1 in boxes:
+        area = (x1 - x0) * (y1 - y0)
+        if area <= 0:
+            continue
+        total += area
+        inside = 0.0
+        for ix0, iy0, ix1, iy1 in image_boxes:
+            w = min(x1, ix1) - max(x0, ix0)
+            h = min(y1, iy1) - max(y0, iy0)
+            if w > 0 and h > 0:
+                inside += w * h
+        covered += min(area, inside)
+    return covered / total if total else 0.0
+
+
+def classify_page(page, layout=None):
+    """
+    Clasifica la página (fitz.Page) y devuelve un PageClass. 'layout' es el PageLayout con el
+    texto nativo de la página, si ya se construyó, para no volver a leerla.
+    """
+    if layout is None:
+        from processing.layout import PageLayout
+        layout = PageLayout.from_page(page)
+    rect = page.rect
+    words = len(layout)
+    word_boxes = list(zip(layout.x0, layout.y0, layout.x1, layout.y1))
+    image_boxes = [tuple(info["bbox"]) for info in page.get_image_info()]
+    text_coverage = _coverage(word_boxes, rect)
+    image_coverage = _coverage(image_boxes, rect)
+    text_on_images = _overlap(word_boxes, image_boxes) if image_boxes else 0.0
+    fonts = len(page.get_fonts())
+
+    if words >= MIN_NATIVE_WORDS and fonts and text_on_images <= MAX_NATIVE_TEXT_ON_IMAGES:
+        # El texto ocupa la parte de la página que no cubren las imágenes
+        kind = "native"
+    elif not words and image_coverage >= SCANNED_IMAGE_COVERAGE:
+        kind = "scanned"
+    else:
+        # Texto escaso o sobre imágenes (un escaneo con un sello o con capa de texto): el texto
+        # nativo no basta para descartar el OCR
+        kind = "mixed"
+    return PageClass(kind, words, text_coverage, image_coverage, fonts, text_on_images)
@@ -0,0 +1,230 @@
+"""
+Extracción por lotes desde la línea de comandos, sin interfaz gráfica.
+
+Ejemplo:
+    python -m processing -t plantilla.json -o resultado.xlsx facturas/ otras/*.pdf
+
+Tesseract OCR se localiza con --tesseract / --tessdata o con las variables de entorno
+TESSERACT_PATH / TESSDATA_PREFIX (o el PATH del sistema). Este módulo no importa tkinter.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+
+def expand_inputs(inputs, recursive=False):
+    """
+    Expande la lista de entradas (archivos PDF, directorios o patrones glob) a una lista
+    de rutas de PDF sin duplicados, conservando el orden en que se indicaron.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = []
+            for dirpath, dirnames, filenames in os.walk(item):
+                dirnames.sort()
+                found.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(".pdf"))
+                if not recursive:
+                    break
+            paths.extend(sorted(found))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            paths.append(item)
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def add_template_arguments(parser):
+    """Opciones de plantilla (-t o --templates, obligatorias y excluyentes)."""
+    templates = parser.add_mutually_exclusive_group(required=True)
+    templates.add_argument("-t", "--template", help="Plantilla JSON de extracción")
+    templates.add_argument("--templates", metavar="CARPETA",
+                           help="Biblioteca de plantillas: la plantilla de cada PDF se elige por su huella, "
+                                "y un mismo lote puede mezclar proveedores")
+
+
+def add_extractor_arguments(parser):
+    """Opciones del extractor (OCR y Tesseract), compartidas con el modo vigilancia (processing.watcher)."""
+    parser.add_argument("--ocr-mode", choices=("page", "region"), default=None,
+                        help="'page' (por defecto): un OCR por página; 'region': un OCR por cada área sin texto nativo")
+    parser.add_argument("--ocr-dpi", type=int, default=None, help="Resolución del OCR de página (por defecto, 300)")
+    parser.add_argument("--ocr-backend", choices=("auto", "tesseract", "tesserocr", "fake"), default=None,
+                        help="Motor de OCR (por defecto, OCR_BACKEND o 'auto')")
+    parser.add_argument("--ocr-timeout", type=float, default=None, help="Tiempo máximo en segundos por llamada de OCR")
+    parser.add_argument("--ocr-pool-size", type=int, default=None,
+                        help="Instancias de Tesseract por idioma del motor 'tesserocr' (o OCR_POOL_SIZE; por defecto, una por CPU)")
+    parser.add_argument("--ocr-preprocess", nargs="+", choices=("binarize", "deskew", "trim"), default=None,
+                        help="Preprocesado de la imagen antes del OCR (por defecto, OCR_PREPROCESS o ninguno)")
+    parser.add_argument("--ocr-cache", default=None,
+                        help="Archivo SQLite de la caché de OCR (o OCR_CACHE_PATH); 'none' la desactiva")
+    parser.add_argument("--ocr-cache-max-mb", type=float, default=None, help="Tamaño máximo de la caché de OCR en MB")
+    parser.add_argument("--tesseract", default=None, help="Ruta al ejecutable de Tesseract (o TESSERACT_PATH)")
+    parser.add_argument("--tessdata", default=None, help="Carpeta tessdata de Tesseract (o TESSDATA_PREFIX)")
+
+
+def configure_extractor(args):
+    """
+    Aplica las opciones de add_extractor_arguments: configura Tesseract, la caché de OCR y el pool
+    de tesserocr (por entorno, para que los procesos trabajadores los hereden) y devuelve los
+    argumentos para PDFExtractor.
+    """
+    from processing import pdf_parser
+
+    if args.tesseract or args.tessdata:
+        if not pdf_parser.configure_tesseract(args.tesseract, args.tessdata):
+            print("Advertencia: no se encontró Tesseract OCR; los PDFs escaneados no podrán procesarse.", file=sys.stderr)
+
+    # La caché de OCR se configura por entorno para que los procesos trabajadores la hereden
+    if args.ocr_cache:
+        if args.ocr_cache.lower() == "none":
+            os.environ.pop("OCR_CACHE_PATH", None)
+        else:
+            os.environ["OCR_CACHE_PATH"] = args.ocr_cache
+    if args.ocr_cache_max_mb:
+        os.environ["OCR_CACHE_MAX_MB"] = str(args.ocr_cache_max_mb)
+    if args.ocr_pool_size:
+        os.environ["OCR_POOL_SIZE"] = str(args.ocr_pool_size)
+
+    extractor_options = {}
+    if args.ocr_mode:
+        extractor_options["ocr_mode"] = args.ocr_mode
+    if args.ocr_dpi:
+        extractor_options["ocr_dpi"] = args.ocr_dpi
+    if args.ocr_backend:
+        extractor_options["ocr_backend"] = args.ocr_backend
+    if args.ocr_timeout:
+        extractor_options["ocr_timeout"] = args.ocr_timeout
+    if args.ocr_preprocess:
+        extractor_options["ocr_preprocess"] = args.ocr_preprocess
+    return extractor_options
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m processing",
+        description="Extrae campos y tablas de facturas PDF usando una plantilla JSON."
+    )
+    parser.add_argument("inputs", nargs="+", help="Archivos PDF, directorios o patrones glob")
+    add_template_arguments(parser)
+    parser.add_argument("-o", "--output", required=True,
+                        help="Archivo de salida: .xlsx, .csv, .jsonl, .json, .parquet o .sqlite (CSV, JSONL y Parquet "
+                             "generan un archivo por hoja: <salida>_Campos y <salida>_Tablas; SQLite agrega los "
+                             "resultados a los de ejecuciones anteriores)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Recorrer los directorios de forma recursiva")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos de extracción (por defecto, uno por CPU)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Documentos por bloque enviado a cada proceso")
+    add_extractor_arguments(parser)
+    parser.add_argument("--store", default=None,
+                        help="Almacén SQLite de resultados: solo se extraen los PDFs nuevos o modificados")
+    parser.add_argument("--trace", default=None,
+                        help="Registrar tiempos y contadores por etapa y documento en este archivo JSON Lines")
+    parser.add_argument("--trace-summary", action="store_true",
+                        help="Mostrar al final una tabla con el tiempo de cada etapa")
+    parser.add_argument("--profile-slowest", type=int, default=0, metavar="N",
+                        help="Perfilar con cProfile y conservar los perfiles de los N documentos más lentos")
+    parser.add_argument("--profile-dir", default="perfiles", help="Carpeta de los perfiles de --profile-slowest")
+    parser.add_argument("-q", "--quiet", action="store_true", help="No mostrar el progreso por documento")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Importar aquí para que --help responda sin cargar PyMuPDF ni pytesseract
+    from processing import instrumentation
+    from processing.batch import BatchProcessor
+    from processing.export import open_sink
+    from processing.result_store import ResultStore
+
+    extractor_options = configure_extractor(args)
+
+    pdf_paths = expand_inputs(args.inputs, args.recursive)
+    if not pdf_paths:
+        print("Error: no se encontraron archivos PDF en las entradas indicadas.", file=sys.stderr)
+        return 2
+
+    # Se activa antes de crear los procesos trabajadores para que la hereden
+    tracing = bool(args.trace or args.trace_summary or args.profile_slowest)
+    if tracing:
+        instrumentation.enable(args.profile_dir if args.profile_slowest else None)
+    profiles = instrumentation.SlowestProfiles(args.profile_slowest)
+    records = []
+
+    try:
+        store = ResultStore(args.store) if args.store else None
+        batch = BatchProcessor(args.template or args.templates, max_workers=args.workers, chunksize=args.chunksize,
+                               extractor_options=extractor_options, result_store=store)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        sink = open_sink(args.output)
+        trace = instrumentation.TraceWriter(args.trace) if args.trace else None
+    except Exception as e:
+        print(f"Error: no se pudo crear la salida: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    errors = 0
+    pages = 0
+    cached = 0
+    try:
+        for i, result in enumerate(batch.iter_results(pdf_paths), 1):
+            if result.trace is not None:
+                if trace:
+                    trace.write(result.trace)
+                if args.trace_summary:
+                    records.append(result.trace)
+                profiles.add(result.trace)
+            if result.error:
+                errors += 1
+                print(f"Error procesando {result.path}: {result.error}", file=sys.stderr)
+                continue
+            pages += result.pages
+            cached += result.cached
+            sink.write(result.path, result.data, file_hash=result.file_hash,
+                       template=result.template or batch.template_name)
+            if not args.quiet:
+                origin = "almacén" if result.cached else f"{result.elapsed:.2f} s"
+                print(f"[{i}/{len(pdf_paths)}] {result.path} ({origin})", file=sys.stderr)
+    except BaseException:
+        # Cerrar la salida también si el lote se interrumpe, para conservar los resultados parciales
+        sink.close()
+        if trace:
+            trace.close()
+        raise
+    try:
+        sink.close()
+    except Exception as e:
+        print(f"Error: no se pudo escribir {args.output}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    if trace:
+        # Las etapas del proceso principal (exportación) van en un último registro sin 'path'
+        trace.write(instrumentation.global_record())
+        trace.close()
+    if args.trace_summary:
+        print(instrumentation.summarize(records + [instrumentation.global_record()]), file=sys.stderr)
+    for seconds, path in profiles.slowest():
+        print(f"Perfil ({seconds:.2f} s): {path}", file=sys.stderr)
+
+    docs = len(pdf_paths)
+    docs_per_s = docs / elapsed if elapsed else 0.0
+    pages_per_s = pages / elapsed if elapsed else 0.0
+    print(
+        f"{docs} documentos ({pages} páginas) en {elapsed:.2f} s: "
+        f"{docs_per_s:.2f} docs/s, {pages_per_s:.2f} páginas/s, {errors} errores"
+        + (f", {cached} desde el almacén" if store else ""),
+        file=sys.stderr
+    )
+    return 1 if errors else 0
@@ -0,0 +1,57 @@
+"""
+Detección automática de columnas de tabla a partir de los huecos verticales en blanco.
+
+Con las palabras del área de la tabla se construye un histograma de cobertura horizontal
+(cuántas palabras ocupan cada franja de 'resolution' puntos). Las franjas que quedan vacías en
+casi todas las líneas forman huecos persistentes; los huecos suficientemente anchos separan
+columnas y su centro es el borde propuesto. Todo el cálculo se hace con NumPy en una pasada.
+"""
+import numpy as np
+
+from processing.layout import COLUMN_GAP_RATIO
+
+# Ancho de cada franja del histograma, en puntos
+DEFAULT_RESOLUTION = 0.5
+# Fracción de líneas que puede atravesar un hueco sin romperlo (títulos o celdas que ocupan varias columnas)
+DEFAULT_MAX_OVERLAP = 0.1
+
+
+def detect_column_boundaries(words, x0, x1, min_gap=None, max_overlap=DEFAULT_MAX_OVERLAP,
+                             resolution=DEFAULT_RESOLUTION):
+    """
+    Devuelve los bordes de columna [x0, b1, ..., x1] dentro del intervalo (x0, x1).
+
+    - words: secuencia de (x0, y0, x1, y1, ...) de las palabras del área (coordenadas PyMuPDF).
+    - min_gap: ancho mínimo en puntos de un hueco entre columnas; por defecto, COLUMN_GAP_RATIO
+      veces la altura mediana de las palabras (más ancho que un espacio entre palabras).
+    - max_overlap: fracción de líneas que pueden tener texto dentro de un hueco.
+    """
+    if x1 <= x0:
+        return [x0, x1]
+    if not words:
+        return [x0, x1]
+    boxes = np.array([w[:4] for w in words], dtype=float)
+    if min_gap is None:
+        min_gap = COLUMN_GAP_RATIO * float(np.median(boxes[:, 3] - boxes[:, 1]))
+    # Líneas distintas: palabras agrupadas por su centro vertical redondeado a media altura
+    heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+    centres = (boxes[:, 1] + boxes[:, 3]) / 2
+    lines = np.unique(np.round(centres / (np.median(heights) / 2))).size
+
+    # Histograma de cobertura con un arreglo de diferencias: +1 donde empieza cada palabra, -1 donde termina
+    bins = int(np.ceil((x1 - x0) / resolution))
+    start = np.clip(((boxes[:, 0] - x0) / resolution).astype(int), 0, bins)
+    end = np.clip(np.ceil((boxes[:, 2] - x0) / resolution).astype(int), 0, bins)
+    diff = np.zeros(bins + 1, dtype=int)
+    np.add.at(diff, start, 1)
+    np.add.at(diff, end, -1)
+    coverage = np.cumsum(diff[:-1])
+
+    # Tramos de franjas en blanco (o casi), delimitados por los cambios de la máscara
+    blank = coverage <= int(max_overlap * lines)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], blank.astype(np.int8), [0]))))
+    gap_starts, gap_ends = edges[0::2], edges[1::2]
+    # Los huecos pegados a los extremos del área son márgenes, no separadores
+    inner = (gap_starts > 0) & (gap_ends < bins) & ((gap_ends - gap_starts) * resolution >= min_gap)
+    centres = x0 + (gap_starts[inner] + gap_ends[inner]) / 2 * resolution
+    return [float(x0)] + [round(float(c), 1) for c in centres] + [float(x1)]
@@ -0,0 +1,605 @@
+import csv
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+
+from processing import instrumentation
+
+# Hojas (o archivos) de salida: una fila por documento en "Campos" y una por fila de tabla en "Tablas"
+SHEETS = ("Campos", "Tablas")
+
+
+def document_rows(pdf_path, data):
+    """
+    Convierte el resultado de extract_from_pdf en las filas que se exportan:
+      - Una fila para la hoja "Campos": {"Archivo": ..., campo: valor, ...}
+      - Una lista de filas para la hoja "Tablas": {"Archivo": ..., "Tabla": ..., columna: valor, ...}
+    Si el resultado indica la plantilla elegida de una biblioteca ("template"), las filas llevan
+    además la columna "Plantilla".
+    """
+    file_name = os.path.basename(pdf_path)
+    source = {"Archivo": file_name}
+    if data.get("template"):
+        source["Plantilla"] = data["template"]
+    field_row = dict(source)
+    field_row.update(data.get("fields", {}))
+    table_rows = []
+    for table_name, rows in data.get("tables", {}).items():
+        for row in rows:
+            row_data = dict(source, Tabla=table_name)
+            row_data.update(row)
+            table_rows.append(row_data)
+    return field_row, table_rows
+
+
+def document_item(pdf_path, data):
+    """
+    Resultado de un documento como objeto JSON: {"Archivo", "fields", "tables"} y, si se eligió de
+    una biblioteca, "template".
+    """
+    item = {"Archivo": os.path.basename(pdf_path), "fields": data.get("fields", {}), "tables": data.get("tables", {})}
+    if data.get("template"):
+        item["template"] = data["template"]
+    return item
+
+
+class OutputSink:
+    """
+    Destino de salida incremental. Recibe los resultados documento a documento con write() y
+    los reparte en las filas de "Campos" y "Tablas" (ver document_rows). Se usa como context
+    manager; al salir se cierra también si el lote se interrumpe, para conservar lo ya escrito.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.count = 0
+
+    def write(self, pdf_path, data, file_hash=None, template=None):
+        """
+        Agrega las filas de un documento (resultado de extract_from_pdf). 'file_hash' y 'template'
+        (hash del PDF y nombre de la plantilla) solo los guardan los formatos que los usan, como SQLite.
+        """
+        with instrumentation.stage("export"):
+            field_row, table_rows = document_rows(pdf_path, data)
+            self.add_row("Campos", field_row)
+            for row in table_rows:
+                self.add_row("Tablas", row)
+            self.count += 1
+            self.flush()
+
+    def add_row(self, sheet, row):
+        """Agrega una fila (diccionario) a la hoja indicada."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Vuelca a disco lo escrito hasta el momento."""
+
+    def close(self):
+        """Finaliza la salida y libera los recursos."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def sheet_path(output_path, sheet):
+    """Ruta del archivo de una hoja para los formatos de un archivo por hoja: 'salida.csv' -> 'salida_Campos.csv'."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_{sheet}{ext}"
+
+
+class ExcelSink(OutputSink):
+    """
+    Exportación incremental a Excel con memoria constante.
+
+    Las filas de las hojas "Campos" y "Tablas" se escriben a medida que se producen en archivos
+    temporales, y el ancho de cada columna se calcula de forma incremental. Al cerrar, el libro se
+    genera en modo write-only de openpyxl leyendo esos archivos, sin tener nunca todas las filas
+    en memoria. Las cabeceras de cada hoja son las claves de su primera fila, ampliadas con las
+    claves nuevas de las filas siguientes (lotes con plantillas mezcladas).
+    """
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self._spools = {name: tempfile.TemporaryFile() for name in SHEETS}
+        self._headers = {name: None for name in SHEETS}
+        self._widths = {name: [] for name in SHEETS}
+        self._known = {name: set() for name in SHEETS}
+
+    def add_row(self, sheet, row):
+        headers = self._headers[sheet]
+        widths = self._widths[sheet]
+        if headers is None:
+            headers = self._headers[sheet] = []
+        known = self._known[sheet]
+        for key in row:
+            if key not in known:
+                known.add(key)
+                headers.append(key)
+                widths.append(len(str(key)))
+        values = [row.get(h, "") for h in headers]
+        for i, value in enumerate(values):
+            length = len(str(value))
+            if length > widths[i]:
+                widths[i] = length
+        pickle.dump(values, self._spools[sheet], protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        """Genera el archivo Excel a partir de las filas escritas y libera los archivos temporales."""
+        try:
+            with instrumentation.stage("openpyxl"):
+                self._write_workbook()
+        finally:
+            for spool in self._spools.values():
+                spool.close()
+
+    def _write_workbook(self):
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+        wb = Workbook(write_only=True)
+        for name in SHEETS:
+            ws = wb.create_sheet(name)
+            headers = self._headers[name]
+            if headers is None:
+                continue
+            # En modo write-only los anchos deben definirse antes de escribir la primera fila
+            for i, width in enumerate(self._widths[name], 1):
+                ws.column_dimensions[get_column_letter(i)].width = width + 2
+            ws.append(headers)
+            spool = self._spools[name]
+            spool.seek(0)
+            while True:
+                try:
+                    ws.append(pickle.load(spool))
+                except EOFError:
+                    break
+        wb.save(self.output_path)
+
+
+class CsvSink(OutputSink):
+    """
+    Exportación a CSV: un archivo por hoja ('salida_Campos.csv' y 'salida_Tablas.csv').
+    Las columnas de cada archivo son las claves de su primera fila, ampliadas con las claves nuevas
+    de las filas siguientes, como en Excel. Las filas se escriben a medida que llegan; si aparecen
+    columnas nuevas (lotes con plantillas mezcladas), al cerrar se reescribe el archivo con la
+    cabecera completa, completando con vacíos las filas anteriores.
+    """
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self._files = {}
+        self._writers = {}
+        self._known = {}
+        self._widened = set()
+
+    def add_row(self, sheet, row):
+        writer = self._writers.get(sheet)
+        if writer is None:
+            f = open(sheet_path(self.output_path, sheet), "w", encoding="utf-8", newline="")
+            writer = csv.DictWriter(f, fieldnames=list(row.keys()), extrasaction="ignore", restval="")
+            writer.writeheader()
+            self._files[sheet] = f
+            self._writers[sheet] = writer
+            self._known[sheet] = set(writer.fieldnames)
+        else:
+            known = self._known[sheet]
+            for key in row:
+                if key not in known:
+                    # Las columnas nuevas se agregan al final: las filas anteriores son un prefijo
+                    known.add(key)
+                    writer.fieldnames.append(key)
+                    self._widened.add(sheet)
+        writer.writerow(row)
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        for sheet in self._widened:
+            self._rewrite_header(sheet, self._writers[sheet].fieldnames)
+        self._files.clear()
+        self._writers.clear()
+        self._widened.clear()
+
+    def _rewrite_header(self, sheet, headers):
+        path = sheet_path(self.output_path, sheet)
+        directory = os.path.dirname(os.path.abspath(path))
+        with open(path, encoding="utf-8", newline="") as source, \
+                tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", dir=directory,
+                                            suffix=".tmp", delete=False) as target:
+            reader = csv.reader(source)
+            writer = csv.writer(target)
+            next(reader, None)
+            writer.writerow(headers)
+            width = len(headers)
+            for values in reader:
+                writer.writerow(values + [""] * (width - len(values)))
+        os.replace(target.name, path)
+
+
+class JsonlSink(OutputSink):
+    """Exportación a JSON Lines: un archivo por hoja, con un objeto JSON por fila."""
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self._files = {}
+
+    def add_row(self, sheet, row):
+        f = self._files.get(sheet)
+        if f is None:
+            f = self._files[sheet] = open(sheet_path(self.output_path, sheet), "w", encoding="utf-8")
+        f.write(json.dumps(row, ensure_ascii=False))
+        f.write("\n")
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+class JsonArraySink(OutputSink):
+    """Exportación a un único archivo JSON: un array con {"Archivo", "fields", "tables"} por documento."""
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self._file = open(output_path, "w", encoding="utf-8")
+        self._file.write("[")
+
+    def write(self, pdf_path, data, file_hash=None, template=None):
+        item = document_item(pdf_path, data)
+        with instrumentation.stage("export"):
+            self._file.write(",\n" if self.count else "\n")
+            self._file.write(json.dumps(item, ensure_ascii=False))
+            self.count += 1
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write("\n]\n")
+            self._file.close()
+
+
+class ParquetSink(OutputSink):
+    """
+    Exportación a Parquet (requiere el paquete opcional 'pyarrow'): un archivo por hoja.
+    Las filas se acumulan hasta 'row_group_size' y se escriben como un grupo de filas, por lo que
+    la memoria queda acotada. Todas las columnas se guardan como texto; las columnas de cada
+    archivo son las claves de su primera fila, ampliadas con las claves nuevas de las filas
+    siguientes, como en Excel. Si aparecen columnas nuevas después de escribir algún grupo, se
+    empieza un segmento con el esquema ampliado y al cerrar los segmentos se unen en el archivo
+    final, con valores nulos en las columnas que no tenían. El archivo solo es legible una vez cerrado.
+    """
+
+    def __init__(self, output_path, row_group_size=10000):
+        super().__init__(output_path)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("La exportación a Parquet requiere el paquete opcional 'pyarrow'.") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.row_group_size = row_group_size
+        self._headers = {}
+        self._buffers = {}
+        self._writers = {}
+        # Segmentos ya cerrados de cada hoja, escritos con un esquema anterior al actual
+        self._segments = {}
+
+    def add_row(self, sheet, row):
+        headers = self._headers.get(sheet)
+        if headers is None:
+            headers = self._headers[sheet] = list(row.keys())
+            self._buffers[sheet] = {h: [] for h in headers}
+        buffer = self._buffers[sheet]
+        new_headers = [key for key in row if key not in buffer]
+        if new_headers:
+            self._widen(sheet, new_headers)
+        for h in headers:
+            value = row.get(h)
+            buffer[h].append(None if value is None else str(value))
+        if len(buffer[headers[0]]) >= self.row_group_size:
+            self._write_group(sheet)
+
+    def _widen(self, sheet, new_headers):
+        headers = self._headers[sheet]
+        buffer = self._buffers[sheet]
+        pending = len(buffer[headers[0]])
+        writer = self._writers.pop(sheet, None)
+        if writer is not None:
+            # El esquema de un archivo Parquet es fijo: lo escrito queda en un segmento aparte
+            writer.close()
+            segments = self._segments.setdefault(sheet, [])
+            segment = f"{sheet_path(self.output_path, sheet)}.{len(segments)}.tmp"
+            os.replace(sheet_path(self.output_path, sheet), segment)
+            segments.append(segment)
+        for h in new_headers:
+            headers.append(h)
+            buffer[h] = [None] * pending
+
+    def _write_group(self, sheet):
+        headers = self._headers[sheet]
+        buffer = self._buffers[sheet]
+        if not buffer[headers[0]]:
+            return
+        table = self._pa.table({h: self._pa.array(buffer[h], type=self._pa.string()) for h in headers})
+        writer = self._writers.get(sheet)
+        if writer is None:
+            writer = self._writers[sheet] = self._pq.ParquetWriter(sheet_path(self.output_path, sheet), table.schema)
+        writer.write_table(table)
+        for h in headers:
+            buffer[h].clear()
+
+    def close(self):
+        for sheet in list(self._headers):
+            self._write_group(sheet)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        for sheet, segments in self._segments.items():
+            self._merge_segments(sheet, segments)
+        self._segments.clear()
+
+    def _merge_segments(self, sheet, segments):
+        """Une los segmentos de la hoja, y lo escrito con el esquema final, en el archivo de la hoja."""
+        pa = self._pa
+        path = sheet_path(self.output_path, sheet)
+        if os.path.exists(path):
+            last = f"{path}.{len(segments)}.tmp"
+            os.replace(path, last)
+            segments = segments + [last]
+        headers = self._headers[sheet]
+        schema = pa.schema([(h, pa.string()) for h in headers])
+        with self._pq.ParquetWriter(path, schema) as writer:
+            for segment in segments:
+                for batch in self._pq.ParquetFile(segment).iter_batches(batch_size=self.row_group_size):
+                    columns = [batch.column(h) if h in batch.schema.names else pa.nulls(batch.num_rows, pa.string())
+                               for h in headers]
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        for segment in segments:
+            os.remove(segment)
+
+
+# Documentos por bloque de inserción de SqliteSink
+DEFAULT_SQLITE_BATCH = 500
+# Codificador compartido de las filas de tabla (json.dumps con opciones crea uno por llamada)
+_encode_row = json.JSONEncoder(ensure_ascii=False).encode
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " id INTEGER PRIMARY KEY,"
+    " started REAL NOT NULL,"
+    " finished REAL,"
+    " documents INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " id INTEGER PRIMARY KEY,"
+    " run_id INTEGER NOT NULL REFERENCES runs(id),"
+    " file_name TEXT NOT NULL,"
+    " path TEXT NOT NULL,"
+    " file_hash TEXT,"
+    " template TEXT,"
+    " processed REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS fields ("
+    " document_id INTEGER NOT NULL REFERENCES documents(id),"
+    " name TEXT NOT NULL,"
+    " value TEXT)",
+    "CREATE TABLE IF NOT EXISTS table_rows ("
+    " document_id INTEGER NOT NULL REFERENCES documents(id),"
+    " table_name TEXT NOT NULL,"
+    " row_index INTEGER NOT NULL,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_template ON documents(template)",
+    "CREATE INDEX IF NOT EXISTS idx_fields_name ON fields(name, value)",
+    "CREATE INDEX IF NOT EXISTS idx_fields_document ON fields(document_id)",
+    "CREATE INDEX IF NOT EXISTS idx_table_rows_document ON table_rows(document_id, table_name)",
+)
+# Un documento por contenido y plantilla: volver a procesarlo reemplaza su resultado
+_SQLITE_UNIQUE_INDEX = "idx_documents_file_template"
+
+
+class SqliteSink(OutputSink):
+    """
+    Exportación a una base de datos SQLite que acumula el historial de todas las ejecuciones.
+
+    Si el archivo ya existe, los resultados se agregan a los anteriores. Cada ejecución queda en
+    "runs"; cada documento en "documents" (archivo, hash del contenido, plantilla, fecha y la
+    ejecución que lo procesó por última vez); los campos en "fields" (una fila por campo) y las
+    filas de las tablas en "table_rows", con sus columnas como objeto JSON en "data" (se consultan
+    con json_extract). Un PDF con el mismo contenido y la misma plantilla es un único documento:
+    si se vuelve a procesar, sus campos y filas se reemplazan, por lo que las consultas no cuentan
+    dos veces una factura reprocesada. Hay índices por hash del PDF, plantilla y nombre de campo,
+    para consultas como:
+
+        SELECT d.file_name, f.value FROM documents d JOIN fields f ON f.document_id = d.id
+        WHERE d.template = 'proveedor_x' AND f.name = 'Total'
+
+        SELECT json_extract(r.data, '$.Importe') FROM documents d JOIN table_rows r ON r.document_id = d.id
+        WHERE d.file_hash = ? AND r.table_name = 'Detalle'
+
+    La base usa el modo WAL, por lo que puede consultarse mientras se escribe. Los campos y las
+    filas se insertan con executemany en bloques de 'batch_size' documentos, cada uno en una sola
+    transacción; sin 'file_hash' el hash se calcula aquí.
+
+    add_row recibe las filas ya aplanadas de "Campos" y "Tablas" (ver document_rows), sin hash del
+    PDF: cada fila de "Campos" es un documento nuevo y las de "Tablas" se asocian al último
+    documento con el mismo "Archivo".
+    """
+
+    def __init__(self, output_path, batch_size=DEFAULT_SQLITE_BATCH):
+        super().__init__(output_path)
+        self.batch_size = max(1, batch_size)
+        self._conn = sqlite3.connect(output_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SQLITE_SCHEMA:
+            self._conn.execute(statement)
+        self._create_unique_index()
+        self.run_id = self._conn.execute("INSERT INTO runs (started) VALUES (?)", (time.time(),)).lastrowid
+        self._conn.commit()
+        self._fields = []
+        self._rows = []
+        self._pending = 0
+        # Documentos con campos o filas aún sin insertar
+        self._pending_ids = set()
+        # Documentos creados con add_row por nombre de archivo, y filas de tabla de cada uno
+        self._row_documents = {}
+        self._row_counts = {}
+
+    def _create_unique_index(self):
+        exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                    (_SQLITE_UNIQUE_INDEX,)).fetchone()
+        if exists:
+            return
+        # Bases anteriores al índice: de cada documento repetido se conserva el procesado más tarde
+        stale = ("SELECT id FROM documents d WHERE EXISTS (SELECT 1 FROM documents n WHERE"
+                 " n.file_hash = d.file_hash AND n.template IS d.template AND n.id > d.id)")
+        self._conn.execute(f"DELETE FROM fields WHERE document_id IN ({stale})")
+        self._conn.execute(f"DELETE FROM table_rows WHERE document_id IN ({stale})")
+        self._conn.execute(f"DELETE FROM documents WHERE id IN ({stale})")
+        self._conn.execute(f"CREATE UNIQUE INDEX {_SQLITE_UNIQUE_INDEX} ON documents(file_hash, template)")
+
+    def _document(self, file_name, path, file_hash, template):
+        """
+        Devuelve el id del documento, creándolo o, si ya existe con el mismo hash y plantilla,
+        reemplazándolo (se borran sus campos y filas anteriores).
+        """
+        now = time.time()
+        row = None
+        if file_hash is not None:
+            row = self._conn.execute("SELECT id FROM documents WHERE file_hash = ? AND template IS ?",
+                                     (file_hash, template)).fetchone()
+        if row is None:
+            document_id = self._conn.execute(
+                "INSERT INTO documents (run_id, file_name, path, file_hash, template, processed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.run_id, file_name, path, file_hash, template, now)
+            ).lastrowid
+        else:
+            document_id = row[0]
+            if document_id in self._pending_ids:
+                # Repetido en el mismo bloque: sus filas pendientes deben insertarse antes de borrarlas
+                self.flush()
+            self._conn.execute("DELETE FROM fields WHERE document_id = ?", (document_id,))
+            self._conn.execute("DELETE FROM table_rows WHERE document_id = ?", (document_id,))
+            self._conn.execute("UPDATE documents SET run_id = ?, file_name = ?, path = ?, processed = ? WHERE id = ?",
+                               (self.run_id, file_name, path, now, document_id))
+        self._pending_ids.add(document_id)
+        return document_id
+
+    def write(self, pdf_path, data, file_hash=None, template=None):
+        if file_hash is None:
+            from processing.result_store import file_hash as compute_hash
+            try:
+                file_hash = compute_hash(pdf_path)
+            except OSError:
+                file_hash = None
+        with instrumentation.stage("export"):
+            document_id = self._document(os.path.basename(pdf_path), os.path.abspath(pdf_path), file_hash,
+                                         data.get("template") or template)
+            self._fields.extend(
+                (document_id, name, _sql_value(value)) for name, value in data.get("fields", {}).items()
+            )
+            for table_name, rows in data.get("tables", {}).items():
+                self._rows.extend(
+                    (document_id, table_name, row_index, _encode_row(row))
+                    for row_index, row in enumerate(rows)
+                )
+            self.count += 1
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.flush()
+
+    def add_row(self, sheet, row):
+        row = dict(row)
+        file_name = row.pop("Archivo", "")
+        template = row.pop("Plantilla", None)
+        if sheet == "Tablas":
+            table_name = row.pop("Tabla", "")
+            document_id = self._row_documents.get(file_name)
+            if document_id is None:
+                document_id = self._row_documents[file_name] = self._document(file_name, file_name, None, template)
+            key = (document_id, table_name)
+            row_index = self._row_counts.get(key, 0)
+            self._row_counts[key] = row_index + 1
+            self._rows.append((document_id, table_name, row_index, _encode_row(row)))
+            return
+        document_id = self._row_documents[file_name] = self._document(file_name, file_name, None, template)
+        self._fields.extend((document_id, name, _sql_value(value)) for name, value in row.items())
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Inserta los campos y filas pendientes y confirma la transacción."""
+        with instrumentation.stage("sqlite"):
+            if self._fields:
+                self._conn.executemany("INSERT INTO fields (document_id, name, value) VALUES (?, ?, ?)", self._fields)
+                self._fields = []
+            if self._rows:
+                self._conn.executemany(
+                    "INSERT INTO table_rows (document_id, table_name, row_index, data) VALUES (?, ?, ?, ?)", self._rows
+                )
+                self._rows = []
+            self._pending = 0
+            self._pending_ids.clear()
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            self.flush()
+            self._conn.execute("UPDATE runs SET finished = ?, documents = ? WHERE id = ?",
+                               (time.time(), self.count, self.run_id))
+            self._conn.commit()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+def _sql_value(value):
+    return None if value is None else str(value)
+
+
+# Formatos de salida por extensión de archivo
+SINKS = {
+    ".xlsx": ExcelSink,
+    ".csv": CsvSink,
+    ".jsonl": JsonlSink,
+    ".json": JsonArraySink,
+    ".parquet": ParquetSink,
+    ".sqlite": SqliteSink,
+    ".db": SqliteSink,
+}
+
+
+def open_sink(output_path):
+    """Crea el destino de salida adecuado según la extensión del archivo (ver SINKS)."""
+    ext = os.path.splitext(output_path)[1].lower()
+    sink_class = SINKS.get(ext)
+    if sink_class is None:
+        raise ValueError(f"Formato de salida no soportado: '{ext}'. Opciones: {', '.join(SINKS)}")
+    return sink_class(output_path)
+
+
+def export_to_excel(fields_data, tables_data, output_path):
+    """Exporta las filas de campos y tablas a un archivo Excel con las hojas "Campos" y "Tablas"."""
+    with ExcelSink(output_path) as sink:
+        for row in fields_data:
+            sink.add_row("Campos", row)
+        for row in tables_data:
+            sink.add_row("Tablas", row)
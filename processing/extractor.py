@@ -1,22 +1,47 @@
-import os
-import re
 import json
 import fitz
-import pytesseract
-from PIL import Image
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextContainer
 
-# Configurar la ruta de Tesseract (usando la variable de entorno o la ruta por defecto en Windows)
-tesseract_path = os.environ.get('TESSERACT_PATH', r'C:\Program Files\Tesseract-OCR\tesseract.exe')
-pytesseract.pytesseract.tesseract_cmd = tesseract_path
+from processing import instrumentation
+from processing.layout import DocumentLayout
+from processing.ocr import DEFAULT_OCR_DPI, DEFAULT_OCR_MODE, OCR_MODES
+from processing.ocr_backends import get_backend
+from processing.pdf_parser import configure_tesseract
+from processing.raster import default_steps, parse_steps, rasterize
+from processing.tables import (DEFAULT_ROW_TOLERANCE, DEFAULT_TABLE_BACKEND, ColumnIndex, cluster_rows,
+                               get_table_backend, iter_table_elements)
+from templates.compiled import compile_columns, compile_template
+
+# Configurar Tesseract sin interacción, como processing.pdf_parser. Si ya se configuró una ruta
+# (por ejemplo, la elegida en la interfaz), se conserva: configure_tesseract la toma de TESSERACT_PATH
+configure_tesseract()
 
 class PDFExtractor:
-    def __init__(self, template_path):
+    def __init__(self, template_path, ocr_mode=DEFAULT_OCR_MODE, ocr_dpi=DEFAULT_OCR_DPI,
+                 ocr_backend=None, ocr_timeout=None, ocr_preprocess=None,
+                 table_backend=DEFAULT_TABLE_BACKEND):
         """
         Inicializa el extractor cargando la plantilla de extracción (en formato JSON).
+
+        - ocr_mode: "page" (un único OCR por página, compartido por todos los campos) o
+          "region" (un OCR por cada área sin texto nativo).
+        - ocr_dpi: resolución de renderizado para el OCR de página.
+        - ocr_backend: motor de OCR (instancia o nombre, ver processing.ocr_backends); por defecto, OCR_BACKEND.
+        - ocr_timeout: tiempo máximo en segundos para cada llamada de OCR (sin límite si es None).
+        - ocr_preprocess: pasos de preprocesado de la imagen antes del OCR ("binarize", "deskew",
+          "trim"; ver processing.raster); por defecto, OCR_PREPROCESS.
+        - table_backend: motor de extract_tables, "pdfminer" o "pymupdf" (ver processing.tables).
         """
+        if ocr_mode not in OCR_MODES:
+            raise ValueError(f"Modo de OCR no válido: {ocr_mode}. Opciones: {', '.join(OCR_MODES)}")
         self.template = self._load_template(template_path)
+        # La plantilla se valida y se compila una sola vez; los errores de esquema se informan aquí
+        self.compiled = compile_template(self.template)
+        self.ocr_mode = ocr_mode
+        self.ocr_dpi = ocr_dpi
+        self.ocr_backend = get_backend(ocr_backend)
+        self.ocr_timeout = ocr_timeout
+        self.ocr_preprocess = default_steps() if ocr_preprocess is None else parse_steps(ocr_preprocess)
+        self.table_backend = get_table_backend(table_backend)
     
     @staticmethod
     def _load_template(path):
@@ -33,84 +58,98 @@ class PDFExtractor:
         Para cada campo, se extrae el texto de la zona indicada en el PDF.  
         Si el campo es de extracción múltiple, se procesa por filas.
         """
-        results = {}
-        # Uso de context manager para asegurar el cierre del documento
-        with fitz.open(pdf_path) as doc:
-            for field in self.template.get("fields", []):
-                page_num = field.get("page", 0)
-                page = doc.load_page(page_num)
-                
-                if field.get("multiple", False):
-                    results[field["name"]] = self._extract_multiple(page, field)
-                else:
-                    text = self._extract_text(page, field["coordinates"])
-                    results[field["name"]] = self._clean_text(text, field)
+        # Los resultados conservan el orden de la plantilla aunque se recorran página a página
+        results = {field.name: None for field in self.compiled.fields}
+        for name, value in self.iter_fields(pdf_path):
+            results[name] = value
         return results
+
+    def iter_fields(self, pdf_path):
+        """
+        Genera los pares (nombre del campo, valor) página a página, en el orden del documento.
+
+        Cada página se carga y se lee una sola vez, aunque tenga muchos campos, y se libera (con su
+        texto, su OCR y sus imágenes) antes de pasar a la siguiente, por lo que la memoria no crece
+        con el número de páginas del documento.
+        """
+        # Uso de context manager para asegurar el cierre del documento
+        with instrumentation.stage("open"):
+            doc = fitz.open(pdf_path)
+        with doc:
+            pages = DocumentLayout(doc)
+            for page_template in self.compiled.by_page:
+                page = pages.page(page_template.page)
+                for field in page_template.fields:
+                    with instrumentation.stage(None, field=field.name):
+                        if field.multiple:
+                            value = self._extract_multiple(page, field, pages)
+                        else:
+                            text = self._extract_text(page, field.rect, pages)
+                            value = self._clean_text(text, field)
+                    yield field.name, value
+                page = None
+                pages.release(page_template.page)
     
-    def _extract_multiple(self, page, field):
+    def _extract_multiple(self, page, field, pages=None):
         """
         Extrae campos repetidos (por ejemplo, filas de una tabla) de una zona específica de la página.
         
-        Se espera que en el diccionario del campo existan:
-          - "coordinates": lista o tupla con [x1, y1, x2, y2] (definiendo la columna base)
-          - "start_y": posición inicial en y para comenzar la extracción
-          - "end_y": posición final en y para detener la extracción
-          - "row_height": altura de cada fila a extraer
-          - "row_spacing": (opcional) espaciado entre filas (por defecto se usa el valor de row_height)
+        'field' es un CompiledField (ver templates.compiled) con:
+          - rect: área de la columna base (se usan sus límites horizontales)
+          - start_y: posición inicial en y para comenzar la extracción
+          - end_y: (opcional) posición final en y; por defecto, el final de la página
+          - row_height: (opcional) altura de cada fila; sin ella, cada línea de texto es una fila
+          - row_spacing: espaciado entre filas (por defecto, row_height)
+
+        Las palabras de la franja de la columna se toman una sola vez y se reparten en filas según
+        su posición vertical (ver PageLayout.rows), en lugar de extraer cada fila por separado.
+        Si la franja no tiene texto nativo se hace un único OCR: el de la página completa en modo
+        "page" o el de la franja en modo "region". En las páginas clasificadas como nativas no se
+        recurre al OCR y en las escaneadas se va directamente a él.
         """
-        items = []
-        current_y = field.get("start_y", 0)
-        end_y = field.get("end_y")
-        row_height = field.get("row_height")
-        row_spacing = field.get("row_spacing", row_height)
+        end_y = field.end_y if field.end_y is not None else page.rect.y1
+        band = fitz.Rect(field.rect.x0, field.start_y, field.rect.x1, end_y)
+        if pages is None:
+            pages = DocumentLayout(page.parent)
+        kind = pages.page_kind(page.number)
+        rows = []
+        if kind != "scanned":
+            layout = pages.layout(page.number)
+            rows = layout.rows(band, field.row_height, field.row_spacing)
+        if not rows and kind != "native":
+            # Sin texto nativo se recurre a OCR, una sola vez para toda la franja
+            clip = band if self.ocr_mode == "region" else None
+            layout = pages.ocr_layout(page.number, self.ocr_dpi, self.ocr_backend,
+                                      timeout=self.ocr_timeout, clip=clip, preprocess=self.ocr_preprocess)
+            rows = layout.rows(band, field.row_height, field.row_spacing)
         
-        if end_y is None or row_height is None:
-            raise ValueError("Para la extracción múltiple se requieren 'end_y' y 'row_height' en la plantilla.")
-        
-        # Extraer cada fila dentro de la zona definida
-        while current_y < end_y:
-            # Se usan los valores x1 y x2 de la definición base de la columna
-            x1, _, x2, _ = field["coordinates"]
-            rect = fitz.Rect(x1, current_y, x2, current_y + row_height)
-            text = self._extract_text(page, rect)
+        items = []
+        for row in rows:
+            text = layout.text_of(row).strip()
             if text:
                 items.append(self._clean_text(text, field))
-            current_y += row_spacing
-        
         return items
     
     def _clean_text(self, text, field):
         """
         Realiza una limpieza básica del texto extraído y aplica validaciones según el tipo de campo.
+        La función de limpieza se elige al compilar la plantilla (ver templates.compiled.CLEANERS).
         """
-        text = text.replace('\n', ' ').strip()
-        field_type = field.get("type", "").lower()
-        if field_type == "monto":
-            return self._clean_currency(text)
-        elif field_type == "fecha":
-            return self._clean_date(text)
-        return text
-    
-    def _clean_currency(self, text):
-        """
-        Limpia y deja solo los dígitos y los caracteres permitidos para montos.
-        """
-        return ''.join(c for c in text if c.isdigit() or c in [',', '.'])
-    
-    def _clean_date(self, text):
-        """
-        Implementa la lógica de conversión de fecha si es necesario.
-        Actualmente retorna el texto sin modificar.
-        """
-        return text
+        with instrumentation.stage("clean"):
+            return field.clean(text)
     
-    def _extract_text(self, page, coords):
+    def _extract_text(self, page, coords, pages=None):
         """
         Extrae texto de la página usando las coordenadas especificadas.
         
         El parámetro 'coords' puede ser:
           - Una secuencia (lista/tupla) con [x1, y1, x2, y2]
           - Un objeto fitz.Rect
+        
+        Si se indica 'pages' (DocumentLayout del documento), el texto nativo se consulta en el
+        índice de palabras de la página y, en modo OCR "page", el OCR de la página completa
+        se hace una sola vez y se reutiliza para todas las áreas. El tipo de página decide
+        además si se usa solo el texto nativo, solo el OCR o el nativo con OCR de respaldo.
         """
         # Si ya es un objeto fitz.Rect, usarlo directamente; de lo contrario, convertir usando float
         if isinstance(coords, fitz.Rect):
@@ -121,82 +160,92 @@ class PDFExtractor:
             except Exception as e:
                 raise ValueError(f"Coordenadas inválidas: {coords}. Error: {e}")
         
-        # Primer intento: extracción nativa de texto
-        text = page.get_text("text", clip=rect).strip()
-        if text:
-            return text
+        # Con 'pages' la página se clasifica una vez (ver processing.classify): en una página nativa
+        # no se recurre al OCR aunque el área esté vacía y en una escaneada no se prueba el texto nativo
+        kind = pages.page_kind(page.number) if pages is not None else "mixed"
+        if kind != "scanned":
+            # Primer intento: extracción nativa de texto
+            if pages is not None:
+                text = pages.layout(page.number).text_in(rect).strip()
+            else:
+                text = page.get_text("text", clip=rect).strip()
+            if text or kind == "native":
+                return text
         
         # Si no se extrajo texto, se recurre a OCR (útil para PDFs escaneados)
-        pix = page.get_pixmap(clip=rect)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        ocr_text = pytesseract.image_to_string(img).strip()
+        instrumentation.count("ocr_fallbacks")
+        if pages is not None and self.ocr_mode == "page":
+            layout = pages.ocr_layout(page.number, self.ocr_dpi, self.ocr_backend,
+                                      timeout=self.ocr_timeout, preprocess=self.ocr_preprocess)
+            return layout.text_in(rect).strip()
+        with instrumentation.stage("get_pixmap"):
+            raster = rasterize(page, clip=rect, steps=self.ocr_preprocess)
+        instrumentation.count("pixels_rendered", raster.pixels)
+        with instrumentation.stage("ocr"):
+            ocr_text = self.ocr_backend.image_to_string(raster.image, timeout=self.ocr_timeout).strip()
         # Puedes agregar logging para indicar que se usó OCR
         return ocr_text
     
-    def extract_tables(self, pdf_path, template):
+    def extract_tables(self, pdf_path, template=None):
         """
-        Extrae tablas a partir de la definición dada en la plantilla.
-        Usa pdfminer para recorrer los elementos de la página (teniendo en cuenta que usa numeración 1-based).
+        Extrae tablas a partir de la definición dada en la plantilla (por defecto, la del extractor).
+
+        Cada página que usan las tablas se analiza una sola vez con el motor de tablas del extractor,
+        y sus elementos se comparten entre todas las tablas definidas en ella (ver processing.tables).
+        'pdf_path' puede ser también un fitz.Document abierto.
         """
-        tables_data = {}
-    
-        for table_def in template.get('tables', []):
-            table_elements = []
-            # Recorre las páginas usando pdfminer
-            for page in extract_pages(pdf_path):
-                # Ajuste: pdfminer usa numeración 1-based, por ello se suma 1 al valor de la plantilla
-                if page.page_number == table_def['page'] + 1:
-                    for element in page:
-                        if isinstance(element, LTTextContainer):
-                            x0, y0, x1, y1 = element.bbox
-                            # Se comprueba que el contenedor se encuentre enteramente dentro del área definida
-                            if (x0 >= table_def['coordinates']['x0'] and
-                                x1 <= table_def['coordinates']['x1'] and
-                                y0 >= table_def['coordinates']['y0'] and
-                                y1 <= table_def['coordinates']['y1']):
-                                table_elements.append({
-                                    'text': element.get_text().strip(),
-                                    'x0': x0,
-                                    'y0': y0,
-                                    'x1': x1,
-                                    'y1': y1
-                                })
-        
-            # Procesar la estructura de la tabla a partir de los elementos encontrados
-            structured_data = self.structure_table_data(table_elements, table_def['columns'])
-            tables_data[table_def['name']] = structured_data
-    
+        compiled = compile_template(template if template is not None else self.compiled)
+        tables_data = {table.name: [] for table in compiled.tables}
+        for name, row in self.iter_table_rows(pdf_path, compiled):
+            tables_data[name].append(row)
         return tables_data
+
+    def iter_table_rows(self, pdf_path, template=None):
+        """
+        Genera las filas de las tablas como pares (nombre de la tabla, fila), página a página y en el
+        orden del documento. Solo se mantiene en memoria el análisis de la página en curso, por lo
+        que el consumo no depende del número de páginas (por ejemplo, para escribir las filas de un
+        extracto de miles de páginas a medida que se obtienen).
+        """
+        compiled = compile_template(template if template is not None else self.compiled)
+        elements = iter_table_elements(pdf_path, compiled, self.table_backend)
+        try:
+            while True:
+                with instrumentation.stage("tables"):
+                    item = next(elements, None)
+                    if item is None:
+                        return
+                    table_def, table_elements = item
+                    # Procesar la estructura de la tabla a partir de los elementos encontrados
+                    rows = self.structure_table_data(table_elements, table_def.columns, table_def.row_tolerance)
+                for row in rows:
+                    yield table_def.name, row
+        finally:
+            # Cierra el documento si el consumidor abandona el generador antes del final
+            elements.close()
     
-    def structure_table_data(self, elements, columns):
+    def structure_table_data(self, elements, columns, row_tolerance=None):
         """
         Agrupa elementos de texto en filas y los asigna a las columnas definidas.
         
-        Actualmente, se agrupan los elementos por su posición vertical redondeada.  
-        Para mayor robustez, se podría implementar una agrupación usando una tolerancia.
-        """
-        rows = {}
-        for elem in elements:
-            # Agrupar por posición vertical; se usa round() (se puede ajustar la tolerancia)
-            row_key = round(elem['y0'])
-            rows.setdefault(row_key, []).append(elem)
-    
-        # Ordenar filas de arriba a abajo (dependiendo del origen de coordenadas en el PDF)
-        sorted_rows = sorted(rows.values(), key=lambda r: -r[0]['y0'])
+        Las filas se forman ordenando los elementos por su posición vertical y agrupando los que
+        difieren en menos de 'row_tolerance' puntos (por defecto, DEFAULT_ROW_TOLERANCE); cada
+        elemento se asigna a su columna por búsqueda binaria sobre los límites de las columnas.
+        """
+        columns = compile_columns(columns)
+        if row_tolerance is None:
+            row_tolerance = DEFAULT_ROW_TOLERANCE
+        index = ColumnIndex(columns)
     
         final_data = []
-        for row in sorted_rows:
+        # Filas de arriba a abajo (en pdfminer el eje y crece hacia arriba)
+        for row in cluster_rows(elements, row_tolerance):
+            cells = [[] for _ in columns]
             # Ordenar elementos de izquierda a derecha
-            row_items = sorted(row, key=lambda x: x['x0'])
-            row_data = {}
-            for col in columns:
-                cell_text = []
-                for item in row_items:
-                    # Se asigna el contenido del elemento si se encuentra dentro de los límites de la columna
-                    if item['x0'] >= col['x0'] and item['x1'] <= col['x1']:
-                        cell_text.append(item['text'])
-                row_data[col['name']] = ' '.join(cell_text).strip()
-            final_data.append(row_data)
+            for item in sorted(row, key=lambda x: x['x0']):
+                for i in index.columns_for(item):
+                    cells[i].append(item['text'])
+            final_data.append({col.name: ' '.join(cell).strip() for col, cell in zip(columns, cells)})
     
         return final_data
     
@@ -207,19 +256,19 @@ class PDFExtractor:
         Cada columna se define mediante:
           - "name": nombre del campo.
           - "pattern": expresión regular para extraer el valor de esa columna.
+        Las columnas pueden venir ya compiladas (CompiledColumn); si no, las expresiones se compilan
+        una sola vez por llamada y no por cada fila.
         
         Retorna una lista de diccionarios, donde cada diccionario representa una fila de la tabla.
         """
+        columns = [col for col in compile_columns(columns) if col.pattern is not None]
         rows = table_text.strip().splitlines()
         table_data = []
         for row in rows:
             row_data = {}
             for col in columns:
-                col_name = col.get("name")
-                pattern = col.get("pattern")
-                if col_name and pattern:
-                    match = re.search(pattern, row)
-                    row_data[col_name] = match.group(0).strip() if match else ""
+                match = col.pattern.search(row)
+                row_data[col.name] = match.group(0).strip() if match else ""
             if row_data:
                 table_data.append(row_data)
         return table_data
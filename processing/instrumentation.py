@@ -0,0 +1,275 @@
+"""
+Instrumentación del extractor: tiempos y contadores por etapa, por documento, por campo y por tabla.
+
+Las etapas medidas son, entre otras: "open" (fitz.open), "load_page", "get_text", "get_pixmap",
+"ocr", "classify", "tables", "clean" y "export". Los contadores registran las caídas al OCR
+("ocr_fallbacks"), los píxeles renderizados ("pixels_rendered"), los bytes leídos ("bytes_read")
+y las páginas de cada tipo ("pages_native", "pages_scanned", "pages_mixed").
+
+Uso:
+    instrumentation.enable()                  # o la variable de entorno EXTRACTOR_TRACE=1
+    instrumentation.begin_document(path)
+    with instrumentation.stage("get_text"):
+        ...
+    instrumentation.count("ocr_fallbacks")
+    record = instrumentation.end_document()   # diccionario serializable a JSON
+
+Desactivada (por defecto), stage() devuelve un context manager vacío compartido y count() no
+hace nada, por lo que el coste es una comprobación de un booleano. La activación se propaga por
+entorno para que los procesos trabajadores del lote la hereden. Cada proceso registra un único
+documento a la vez.
+
+Con profile_documents(directorio) (o EXTRACTOR_PROFILE_DIR) cada documento se perfila con cProfile
+y el perfil se guarda en el directorio; SlowestProfiles conserva solo los de los N documentos más
+lentos.
+"""
+import cProfile
+import heapq
+import json
+import os
+import time
+
+_enabled = os.environ.get("EXTRACTOR_TRACE", "") not in ("", "0")
+_profile_dir = os.environ.get("EXTRACTOR_PROFILE_DIR") or None
+_current = None
+_profiler = None
+# Etapas ajenas a un documento (por ejemplo, la exportación), acumuladas por proceso
+_global = {"stages": {}, "counters": {}}
+
+
+def enable(profile_dir=None):
+    """Activa la instrumentación en este proceso y en los procesos trabajadores que se creen después."""
+    global _enabled
+    _enabled = True
+    os.environ["EXTRACTOR_TRACE"] = "1"
+    if profile_dir:
+        profile_documents(profile_dir)
+
+
+def disable():
+    global _enabled, _profile_dir
+    _enabled = False
+    _profile_dir = None
+    os.environ.pop("EXTRACTOR_TRACE", None)
+    os.environ.pop("EXTRACTOR_PROFILE_DIR", None)
+
+
+def is_enabled():
+    return _enabled
+
+
+def profile_documents(directory):
+    """Perfila cada documento con cProfile y guarda el perfil (.prof) en 'directory'."""
+    global _profile_dir
+    os.makedirs(directory, exist_ok=True)
+    _profile_dir = directory
+    os.environ["EXTRACTOR_PROFILE_DIR"] = directory
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "scope", "item", "start")
+
+    def __init__(self, name, scope, item):
+        self.name = name
+        # Mapa del documento ("fields" o "tables") y elemento de la plantilla al que se suma el tiempo
+        self.scope = scope
+        self.item = item
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self.name is not None:
+            target = _current if _current is not None else _global
+            _add(target["stages"], self.name, elapsed)
+        if self.item is not None and _current is not None:
+            _add(_current[self.scope], self.item, elapsed)
+        return False
+
+
+def _add(table, name, elapsed):
+    entry = table.get(name)
+    if entry is None:
+        table[name] = [elapsed, 1]
+    else:
+        entry[0] += elapsed
+        entry[1] += 1
+
+
+def stage(name, field=None, table=None):
+    """
+    Context manager que mide una etapa. Con 'field' (o 'table') el tiempo se suma también al campo
+    (o a la tabla) de la plantilla indicado (con name=None solo al campo o a la tabla). Fuera de un
+    documento se acumula en las etapas globales del proceso.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    if table is not None:
+        return _Stage(name, "tables", table)
+    return _Stage(name, "fields", field)
+
+
+def count(name, n=1):
+    """Suma 'n' al contador indicado del documento actual (o a los globales)."""
+    if not _enabled:
+        return
+    counters = (_current if _current is not None else _global)["counters"]
+    counters[name] = counters.get(name, 0) + n
+
+
+def begin_document(path):
+    """Empieza el registro de un documento (y su perfil, si está activado)."""
+    global _current, _profiler
+    if not _enabled:
+        return
+    _current = {"path": path, "start": time.perf_counter(), "stages": {}, "counters": {}, "fields": {},
+                "tables": {}}
+    if _profile_dir:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def end_document(**extra):
+    """
+    Termina el registro del documento actual y lo devuelve como diccionario serializable
+    ({"path", "elapsed", "stages": {etapa: {"seconds", "calls"}}, "counters", "fields", "tables", ...}).
+    Devuelve None si la instrumentación está desactivada.
+    """
+    global _current, _profiler
+    if not _enabled or _current is None:
+        return None
+    record, _current = _current, None
+    elapsed = time.perf_counter() - record.pop("start")
+    result = {
+        "path": record["path"],
+        "elapsed": elapsed,
+        "stages": {name: {"seconds": s, "calls": c} for name, (s, c) in record["stages"].items()},
+        "counters": record["counters"],
+        "fields": {name: s for name, (s, _) in record["fields"].items()},
+        "tables": {name: s for name, (s, _) in record["tables"].items()},
+    }
+    result.update(extra)
+    if _profiler is not None:
+        _profiler.disable()
+        profile_path = os.path.join(_profile_dir, f"{os.getpid()}_{time.time_ns()}.prof")
+        _profiler.dump_stats(profile_path)
+        result["profile"] = profile_path
+        _profiler = None
+    return result
+
+
+def global_record():
+    """Etapas y contadores registrados fuera de los documentos en este proceso (por ejemplo, la exportación)."""
+    return {
+        "path": None,
+        "stages": {name: {"seconds": s, "calls": c} for name, (s, c) in _global["stages"].items()},
+        "counters": dict(_global["counters"]),
+    }
+
+
+class TraceWriter:
+    """Escribe los registros de instrumentación en un archivo JSON Lines, uno por documento."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        if record is None:
+            return
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SlowestProfiles:
+    """Conserva los perfiles de cProfile de los N documentos más lentos y borra el resto."""
+
+    def __init__(self, n):
+        self.n = n
+        self._heap = []
+
+    def add(self, record):
+        path = (record or {}).get("profile")
+        if not path:
+            return
+        item = (record["elapsed"], path)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+            return
+        dropped = heapq.heappushpop(self._heap, item)[1]
+        try:
+            os.remove(dropped)
+        except OSError:
+            pass
+
+    def slowest(self):
+        """Perfiles conservados, del documento más lento al más rápido: [(segundos, ruta)]."""
+        return sorted(self._heap, reverse=True)
+
+
+def summarize(records):
+    """
+    Tabla de texto con el tiempo total, las llamadas y el porcentaje de cada etapa, seguida de
+    los contadores y de los campos y tablas de la plantilla más costosos.
+    """
+    stages = {}
+    counters = {}
+    fields = {}
+    tables = {}
+    total = 0.0
+    docs = 0
+    for record in records:
+        if record is None:
+            continue
+        if record.get("path") is not None:
+            docs += 1
+            total += record.get("elapsed", 0.0)
+        for name, entry in record.get("stages", {}).items():
+            acc = stages.setdefault(name, [0.0, 0])
+            acc[0] += entry["seconds"]
+            acc[1] += entry["calls"]
+        for name, value in record.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+        for name, seconds in record.get("fields", {}).items():
+            fields[name] = fields.get(name, 0.0) + seconds
+        for name, seconds in record.get("tables", {}).items():
+            tables[name] = tables.get(name, 0.0) + seconds
+    lines = [f"{docs} documentos, {total:.3f} s de extracción",
+             f"{'etapa':<14} {'segundos':>10} {'llamadas':>9} {'% docs':>7}"]
+    for name, (seconds, calls) in sorted(stages.items(), key=lambda item: -item[1][0]):
+        share = seconds / total * 100 if total else 0.0
+        lines.append(f"{name:<14} {seconds:>10.3f} {calls:>9} {share:>6.1f}%")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name:<14} {value:>10}")
+    for title, times in (("Campos más costosos:", fields), ("Tablas más costosas:", tables)):
+        if times:
+            lines.append(title)
+            for name, seconds in sorted(times.items(), key=lambda item: -item[1])[:10]:
+                lines.append(f"  {name:<24} {seconds:>10.3f} s")
+    return "\n".join(lines)
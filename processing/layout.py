@@ -0,0 +1,210 @@
+from array import array
+
+from processing import instrumentation
+
+# Tamaño (en puntos PDF) de cada celda de la rejilla del índice espacial
+GRID_CELL_SIZE = 32.0
+# Separación horizontal entre palabras (relativa a la altura de la línea) a partir de la cual
+# se considera que hay un salto de columna; se representa con dos espacios, como espera process_table
+COLUMN_GAP_RATIO = 0.6
+
+
+class PageLayout:
+    """
+    Palabras de una página almacenadas en arrays compactos, con un índice espacial de rejilla.
+
+    Se construye una sola vez por página (normalmente a partir de page.get_text("words")) y
+    responde a todas las consultas por rectángulo (campos, tablas, filas) sin volver a
+    recorrer el contenido de la página. Una palabra pertenece a un rectángulo si su centro
+    está dentro de él.
+    """
+
+    def __init__(self, words, cell_size=GRID_CELL_SIZE):
+        """
+        - words: iterable de tuplas (x0, y0, x1, y1, texto, bloque, línea, número_de_palabra),
+          el mismo formato que devuelve page.get_text("words").
+        """
+        self.cell_size = cell_size
+        self.x0 = array('d')
+        self.y0 = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.block = array('l')
+        self.line = array('l')
+        self.word_no = array('l')
+        self.text = []
+        self.grid = {}
+        for i, (x0, y0, x1, y1, text, block, line, word_no) in enumerate(words):
+            self.x0.append(x0)
+            self.y0.append(y0)
+            self.x1.append(x1)
+            self.y1.append(y1)
+            self.block.append(block)
+            self.line.append(line)
+            self.word_no.append(word_no)
+            self.text.append(text)
+            cell = (int((x0 + x1) / 2 // cell_size), int((y0 + y1) / 2 // cell_size))
+            self.grid.setdefault(cell, []).append(i)
+
+    @classmethod
+    def from_page(cls, page):
+        """Construye el layout a partir del texto nativo de una página de PyMuPDF."""
+        return cls(page.get_text("words"))
+
+    def __len__(self):
+        return len(self.text)
+
+    def query(self, rect):
+        """Devuelve los índices de las palabras cuyo centro está dentro de 'rect', en orden de lectura."""
+        x0, y0, x1, y1 = rect
+        size = self.cell_size
+        found = []
+        for cx in range(int(x0 // size), int(x1 // size) + 1):
+            for cy in range(int(y0 // size), int(y1 // size) + 1):
+                for i in self.grid.get((cx, cy), ()):
+                    mx = (self.x0[i] + self.x1[i]) / 2
+                    my = (self.y0[i] + self.y1[i]) / 2
+                    if x0 <= mx <= x1 and y0 <= my <= y1:
+                        found.append(i)
+        found.sort(key=lambda i: (self.block[i], self.line[i], self.word_no[i]))
+        return found
+
+    def text_in(self, rect):
+        """
+        Reconstruye el texto contenido en 'rect' como lo haría page.get_text("text", clip=rect):
+        una línea por cada línea del PDF y las palabras separadas por espacios.
+        """
+        return self.text_of(self.query(rect))
+
+    def text_of(self, indices):
+        """Reconstruye el texto de las palabras indicadas (en orden de lectura), como text_in."""
+        lines = []
+        current_key = None
+        parts = []
+        prev = None
+        for i in indices:
+            key = (self.block[i], self.line[i])
+            if key != current_key:
+                if parts:
+                    lines.append("".join(parts))
+                parts = [self.text[i]]
+                current_key = key
+            else:
+                gap = self.x0[i] - self.x1[prev]
+                height = self.y1[i] - self.y0[i]
+                parts.append("  " if gap > height * COLUMN_GAP_RATIO else " ")
+                parts.append(self.text[i])
+            prev = i
+        if parts:
+            lines.append("".join(parts))
+        return "\n".join(lines)
+
+    def rows(self, rect, row_height=None, row_spacing=None):
+        """
+        Reparte en filas, en una sola pasada, las palabras de 'rect' (por ejemplo, la franja de una
+        columna). Devuelve una lista de filas de arriba a abajo; cada fila es una lista de índices
+        en orden de lectura.
+
+        - Con 'row_height', las filas son franjas de esa altura que empiezan en rect.y0 y se repiten
+          cada 'row_spacing' puntos (por defecto, row_height); una palabra pertenece a la franja que
+          contiene su centro. Las franjas vacías no se devuelven.
+        - Sin 'row_height', cada línea de texto es una fila: las palabras se ordenan por su centro
+          vertical y se agrupan las que difieren en menos de media altura de palabra.
+        """
+        indices = self.query(rect)
+        if not indices:
+            return []
+        centre = {i: (self.y0[i] + self.y1[i]) / 2 for i in indices}
+        buckets = {}
+        if row_height:
+            spacing = row_spacing or row_height
+            for i in indices:
+                slot = int((centre[i] - rect[1]) // spacing)
+                # Fuera de la franja: en el hueco entre filas cuando row_spacing > row_height
+                if centre[i] - rect[1] - slot * spacing <= row_height:
+                    buckets.setdefault(slot, []).append(i)
+        else:
+            slot = -1
+            anchor = None
+            for i in sorted(indices, key=centre.__getitem__):
+                if anchor is None or centre[i] - anchor > (self.y1[i] - self.y0[i]) / 2:
+                    slot += 1
+                    anchor = centre[i]
+                buckets.setdefault(slot, []).append(i)
+        # Los índices de cada fila conservan el orden de lectura de query()
+        order = {i: n for n, i in enumerate(indices)}
+        return [sorted(buckets[slot], key=order.__getitem__) for slot in sorted(buckets)]
+
+
+class DocumentLayout:
+    """
+    Caché por documento de las páginas cargadas y de su PageLayout, para que cada página
+    se cargue y se lea una única vez aunque la plantilla tenga muchos campos sobre ella.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self._pages = {}
+        self._layouts = {}
+        self._ocr_layouts = {}
+        self._kinds = {}
+
+    def page(self, page_num):
+        """Devuelve la página indicada, cargándola solo la primera vez."""
+        page = self._pages.get(page_num)
+        if page is None:
+            with instrumentation.stage("load_page"):
+                page = self.doc.load_page(page_num)
+            self._pages[page_num] = page
+        return page
+
+    def layout(self, page_num):
+        """Devuelve el PageLayout con el texto nativo de la página indicada."""
+        layout = self._layouts.get(page_num)
+        if layout is None:
+            page = self.page(page_num)
+            with instrumentation.stage("get_text"):
+                layout = PageLayout.from_page(page)
+            self._layouts[page_num] = layout
+        return layout
+
+    def page_kind(self, page_num):
+        """
+        Devuelve el tipo de la página ("native", "scanned" o "mixed", ver processing.classify),
+        clasificándola solo la primera vez.
+        """
+        kind = self._kinds.get(page_num)
+        if kind is None:
+            from processing.classify import classify_page
+            layout = self.layout(page_num)
+            with instrumentation.stage("classify"):
+                kind = classify_page(self.page(page_num), layout).kind
+            instrumentation.count(f"pages_{kind}")
+            self._kinds[page_num] = kind
+        return kind
+
+    def ocr_layout(self, page_num, dpi, backend=None, lang=None, config="", timeout=None, clip=None,
+                   preprocess=()):
+        """
+        Devuelve el PageLayout obtenido con un único OCR de la página completa (ver ocr_page_layout).
+        El OCR se ejecuta solo la primera vez que se pide para esa página.
+
+        Con 'clip' se reconoce solo esa área de la página; el resultado se guarda por área.
+        'preprocess' son los pasos de preprocesado de la imagen (ver processing.raster).
+        """
+        from processing.ocr import ocr_page_layout
+        key = page_num if clip is None else (page_num, tuple(clip))
+        layout = self._ocr_layouts.get(key)
+        if layout is None:
+            layout = ocr_page_layout(self.page(page_num), dpi, backend, lang, config, timeout, clip=clip,
+                                     preprocess=preprocess)
+            self._ocr_layouts[key] = layout
+        return layout
+
+    def release(self, page_num):
+        """Libera la página y sus layouts cuando ya no se van a consultar (se conserva su tipo)."""
+        self._pages.pop(page_num, None)
+        self._layouts.pop(page_num, None)
+        for key in [k for k in self._ocr_layouts if k == page_num or (isinstance(k, tuple) and k[0] == page_num)]:
+            del self._ocr_layouts[key]
+
@@ -0,0 +1,48 @@
+from processing import instrumentation
+from processing.layout import PageLayout
+from processing.ocr_backends import get_backend
+from processing.raster import rasterize
+
+# Modos de OCR: "page" renderiza cada página una sola vez y ejecuta un único image_to_data,
+# reutilizando las palabras para todos los campos y tablas; "region" lanza Tesseract por cada área.
+OCR_MODES = ("page", "region")
+DEFAULT_OCR_MODE = "page"
+# Resolución de renderizado para el OCR de página completa
+DEFAULT_OCR_DPI = 300
+
+
+def ocr_page_layout(page, dpi=DEFAULT_OCR_DPI, backend=None, lang=None, config="", timeout=None, clip=None,
+                    preprocess=()):
+    """
+    Renderiza la página completa una sola vez, ejecuta un único pase de OCR (image_to_data)
+    y devuelve un PageLayout con las palabras reconocidas en coordenadas de la página PDF,
+    de modo que puede consultarse con los mismos rectángulos de la plantilla.
+
+    'backend' es el motor de OCR (instancia o nombre, ver processing.ocr_backends).
+    'clip' limita el renderizado y el OCR a un área de la página (por ejemplo, una columna).
+    'preprocess' son los pasos de preprocesado de la imagen (ver processing.raster).
+    """
+    with instrumentation.stage("get_pixmap"):
+        raster = rasterize(page, dpi, clip, preprocess)
+    instrumentation.count("pixels_rendered", raster.pixels)
+    with instrumentation.stage("ocr"):
+        data = get_backend(backend).image_to_data(raster.image, lang=lang, config=config, timeout=timeout, dpi=dpi)
+    return PageLayout(_ocr_words(data, raster))
+
+
+def _ocr_words(data, raster):
+    """
+    Convierte la salida de image_to_data (en píxeles) en tuplas de palabra con el formato
+    de page.get_text("words"), llevando las cajas a puntos PDF con raster.to_page.
+    """
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text:
+            continue
+        left, top = data["left"][i], data["top"][i]
+        x0, y0, x1, y1 = raster.to_page(left, top, left + data["width"][i], top + data["height"][i])
+        # Tesseract numera bloque > párrafo > línea; se combinan párrafo y línea en el número de línea
+        line = data["par_num"][i] * 1000 + data["line_num"][i]
+        words.append((x0, y0, x1, y1, text, data["block_num"][i], line, data["word_num"][i]))
+    return words
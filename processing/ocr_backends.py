@@ -0,0 +1,310 @@
+"""
+Motores de OCR intercambiables.
+
+Todo el OCR del extractor pasa por un OCRBackend, con dos operaciones:
+  - image_to_string(img, ...): texto de una imagen PIL
+  - image_to_data(img, ...): palabras con sus cajas, en el formato de pytesseract.Output.DICT
+
+Motores disponibles:
+  - "tesseract": pytesseract, un proceso de Tesseract por llamada (comportamiento original)
+  - "tesserocr": pool de instancias de la API de Tesseract (paquete opcional 'tesserocr') que
+    mantienen cargados los datos de idioma entre llamadas
+  - "fake": motor determinista para pruebas y benchmarks en equipos sin Tesseract
+  - "auto": "tesserocr" si está instalado; si no, "tesseract"
+
+El motor por defecto se elige con la variable de entorno OCR_BACKEND (por defecto "auto").
+OCR_POOL_SIZE limita las instancias de la API de Tesseract por idioma del motor "tesserocr"
+(por defecto, una por CPU; se crean solo a medida que hay llamadas simultáneas).
+Si se define OCR_CACHE_PATH, los motores compartidos consultan antes la caché persistente de
+OCR (ver processing.ocr_cache); OCR_CACHE_MAX_MB limita su tamaño.
+"""
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+
+import pytesseract
+
+BACKEND_NAMES = ("auto", "tesseract", "tesserocr", "fake")
+# Espera máxima por una instancia libre del pool de tesserocr cuando la llamada no tiene tiempo máximo
+DEFAULT_ACQUIRE_TIMEOUT = 300.0
+
+# Claves del diccionario que devuelve image_to_data (mismo formato que pytesseract.Output.DICT)
+DATA_KEYS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+             "left", "top", "width", "height", "conf", "text")
+
+
+class OCRTimeoutError(RuntimeError):
+    """El OCR de una imagen superó el tiempo máximo permitido."""
+
+
+class OCRBackend:
+    """Interfaz común de los motores de OCR."""
+
+    name = "base"
+
+    def image_to_string(self, img, lang=None, config="", timeout=None, dpi=None):
+        """Devuelve el texto reconocido en la imagen."""
+        raise NotImplementedError
+
+    def image_to_data(self, img, lang=None, config="", timeout=None, dpi=None):
+        """Devuelve las palabras reconocidas con sus cajas (formato pytesseract.Output.DICT)."""
+        raise NotImplementedError
+
+    def engine_version(self):
+        """Versión del motor; cambia cuando puede cambiar el resultado del OCR."""
+        return ""
+
+    def identity(self):
+        """Nombre y versión del motor, para las claves de las cachés de OCR y de resultados."""
+        return f"{self.name} {self.engine_version()}".strip()
+
+    def close(self):
+        """Libera los recursos del motor."""
+
+
+class TesseractBackend(OCRBackend):
+    """OCR mediante pytesseract: lanza un proceso de Tesseract en cada llamada."""
+
+    name = "tesseract"
+    # Versión del ejecutable de Tesseract, consultada una sola vez por proceso
+    _version = None
+
+    def engine_version(self):
+        if TesseractBackend._version is None:
+            try:
+                TesseractBackend._version = str(pytesseract.get_tesseract_version())
+            except OSError:
+                # TesseractNotFoundError es un OSError: sin Tesseract el OCR fallará igualmente
+                return "desconocida"
+        return TesseractBackend._version
+
+    @staticmethod
+    def _config(config, dpi):
+        return f"{config} --dpi {int(dpi)}".strip() if dpi else config
+
+    def _call(self, func, img, lang, config, timeout, dpi, **kwargs):
+        try:
+            return func(img, lang=lang, config=self._config(config, dpi), timeout=timeout or 0, **kwargs)
+        except RuntimeError as e:
+            # pytesseract señala el tiempo agotado con un RuntimeError genérico
+            if "timeout" in str(e).lower():
+                raise OCRTimeoutError(f"El OCR superó el tiempo máximo de {timeout} s") from e
+            raise
+
+    def image_to_string(self, img, lang=None, config="", timeout=None, dpi=None):
+        return self._call(pytesseract.image_to_string, img, lang, config, timeout, dpi)
+
+    def image_to_data(self, img, lang=None, config="", timeout=None, dpi=None):
+        return self._call(pytesseract.image_to_data, img, lang, config, timeout, dpi,
+                          output_type=pytesseract.Output.DICT)
+
+
+class TesserocrPoolBackend(OCRBackend):
+    """
+    Pool de instancias de la API de Tesseract (tesserocr) que se crean una sola vez por idioma
+    y se reutilizan, por lo que los datos de idioma no se vuelven a cargar en cada llamada.
+    Cada llamada toma una instancia libre del pool, lo que permite usarlo desde varios hilos; las
+    instancias se crean a medida que hacen falta, hasta 'size' por idioma (por defecto,
+    OCR_POOL_SIZE o una por CPU).
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, size=None, tessdata_path=None, default_lang="eng"):
+        try:
+            import tesserocr
+        except ImportError as e:
+            raise RuntimeError("El motor 'tesserocr' requiere el paquete opcional 'tesserocr'.") from e
+        self._tesserocr = tesserocr
+        self.size = max(1, size or int(os.environ.get("OCR_POOL_SIZE") or 0) or os.cpu_count() or 1)
+        self.tessdata_path = tessdata_path or os.environ.get("TESSDATA_PREFIX")
+        self.default_lang = default_lang
+        self._pools = {}
+        self._created = {}
+        self._lock = threading.Lock()
+
+    def _new_api(self, lang):
+        kwargs = {"lang": lang}
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path
+        return self._tesserocr.PyTessBaseAPI(**kwargs)
+
+    def engine_version(self):
+        return self._tesserocr.tesseract_version().split("\n")[0]
+
+    def _acquire(self, lang, timeout=None):
+        lang = lang or self.default_lang
+        with self._lock:
+            pool = self._pools.setdefault(lang, queue.LifoQueue())
+            create = pool.empty() and self._created.get(lang, 0) < self.size
+            if create:
+                self._created[lang] = self._created.get(lang, 0) + 1
+        if create:
+            # La instancia se crea fuera del bloqueo (carga los datos del idioma); si falla, por
+            # ejemplo por falta del idioma, se libera su plaza para no dejar esperando a las demás llamadas
+            try:
+                return lang, self._new_api(lang)
+            except BaseException:
+                with self._lock:
+                    self._created[lang] -= 1
+                raise
+        try:
+            return lang, pool.get(timeout=timeout or DEFAULT_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise OCRTimeoutError(f"No hubo una instancia de Tesseract libre para '{lang}' a tiempo") from None
+
+    def _release(self, lang, api):
+        self._pools[lang].put(api)
+
+    def _recognize(self, img, lang, config, timeout, dpi):
+        lang, api = self._acquire(lang, timeout)
+        try:
+            api.Clear()
+            psm = re.search(r"--psm\s+(\d+)", config or "")
+            api.SetPageSegMode(int(psm.group(1)) if psm else self._tesserocr.PSM.AUTO)
+            api.SetImage(img)
+            if dpi:
+                api.SetSourceResolution(int(dpi))
+            if not api.Recognize(int(timeout * 1000) if timeout else 0):
+                raise OCRTimeoutError(f"El OCR superó el tiempo máximo de {timeout} s")
+            return self._collect(api)
+        finally:
+            self._release(lang, api)
+
+    def _collect(self, api):
+        RIL = self._tesserocr.RIL
+        data = {key: [] for key in DATA_KEYS}
+        data["_text"] = api.GetUTF8Text()
+        iterator = api.GetIterator()
+        block = par = line = word = 0
+        if iterator is None:
+            return data
+        while True:
+            if iterator.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+            if iterator.IsAtBeginningOf(RIL.PARA):
+                par, line, word = par + 1, 0, 0
+            if iterator.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            box = iterator.BoundingBox(RIL.WORD)
+            if box is not None:
+                x0, y0, x1, y1 = box
+                values = (5, 1, block, par, line, word, x0, y0, x1 - x0, y1 - y0,
+                          iterator.Confidence(RIL.WORD), iterator.GetUTF8Text(RIL.WORD) or "")
+                for key, value in zip(DATA_KEYS, values):
+                    data[key].append(value)
+            if not iterator.Next(RIL.WORD):
+                break
+        return data
+
+    def image_to_string(self, img, lang=None, config="", timeout=None, dpi=None):
+        return self._recognize(img, lang, config, timeout, dpi)["_text"]
+
+    def image_to_data(self, img, lang=None, config="", timeout=None, dpi=None):
+        data = self._recognize(img, lang, config, timeout, dpi)
+        data.pop("_text")
+        return data
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                while not pool.empty():
+                    pool.get().End()
+            self._pools.clear()
+            self._created.clear()
+
+
+class FakeOCRBackend(OCRBackend):
+    """
+    Motor de OCR determinista, sin Tesseract. Devuelve siempre el mismo texto para la misma imagen
+    (o el texto fijo indicado) y cuenta las llamadas, para pruebas y benchmarks.
+
+    - text: texto fijo a devolver; si es None se genera a partir del hash de los píxeles.
+    - delay: segundos de espera por llamada, para simular el coste del OCR real.
+    """
+
+    name = "fake"
+
+    def __init__(self, text=None, delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.calls = {"image_to_string": 0, "image_to_data": 0}
+        self._lock = threading.Lock()
+
+    def engine_version(self):
+        # Con texto fijo el resultado no depende de la imagen: se distingue en la clave
+        return "1" if self.text is None else f"1 texto={self.text!r}"
+
+    def _text_for(self, img, timeout):
+        if self.delay:
+            if timeout and self.delay > timeout:
+                raise OCRTimeoutError(f"El OCR superó el tiempo máximo de {timeout} s")
+            time.sleep(self.delay)
+        if self.text is not None:
+            return self.text
+        digest = hashlib.sha1(img.tobytes()).hexdigest()[:8]
+        return f"OCR{digest}"
+
+    def image_to_string(self, img, lang=None, config="", timeout=None, dpi=None):
+        with self._lock:
+            self.calls["image_to_string"] += 1
+        return self._text_for(img, timeout)
+
+    def image_to_data(self, img, lang=None, config="", timeout=None, dpi=None):
+        with self._lock:
+            self.calls["image_to_data"] += 1
+        text = self._text_for(img, timeout)
+        # Una única palabra que ocupa toda la imagen
+        values = (5, 1, 1, 1, 1, 1, 0, 0, img.width, img.height, 100, text)
+        return {key: [value] for key, value in zip(DATA_KEYS, values)}
+
+
+def create_backend(name=None, **options):
+    """Crea un motor de OCR por nombre (ver BACKEND_NAMES); por defecto usa OCR_BACKEND o "auto"."""
+    name = (name or os.environ.get("OCR_BACKEND") or "auto").lower()
+    if name == "auto":
+        try:
+            return TesserocrPoolBackend(**options)
+        except RuntimeError:
+            return TesseractBackend()
+    if name == "tesseract":
+        return TesseractBackend()
+    if name == "tesserocr":
+        return TesserocrPoolBackend(**options)
+    if name == "fake":
+        return FakeOCRBackend(**options)
+    raise ValueError(f"Motor de OCR no válido: {name}. Opciones: {', '.join(BACKEND_NAMES)}")
+
+
+# Motores compartidos del proceso, uno por nombre, para no recrear el pool en cada extractor
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(backend=None, pool_size=None):
+    """
+    Devuelve el motor de OCR a usar:
+      - Si 'backend' ya es un OCRBackend, lo devuelve tal cual.
+      - Si es un nombre (o None, para el motor por defecto), devuelve el motor compartido del
+        proceso con ese nombre, creándolo la primera vez. 'pool_size' (instancias por idioma del
+        motor "tesserocr", ver TesserocrPoolBackend) solo se aplica al crearlo.
+    """
+    if isinstance(backend, OCRBackend):
+        return backend
+    name = (backend or os.environ.get("OCR_BACKEND") or "auto").lower()
+    with _backends_lock:
+        if name not in _backends:
+            options = {"size": pool_size} if pool_size and name in ("auto", "tesserocr") else {}
+            shared = create_backend(name, **options)
+            cache_path = os.environ.get("OCR_CACHE_PATH")
+            if cache_path:
+                from processing.ocr_cache import DEFAULT_CACHE_MAX_BYTES, CachedOCRBackend, OCRCache
+                max_mb = os.environ.get("OCR_CACHE_MAX_MB")
+                max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_CACHE_MAX_BYTES
+                shared = CachedOCRBackend(shared, OCRCache(cache_path, max_bytes))
+            _backends[name] = shared
+        return _backends[name]
@@ -0,0 +1,168 @@
+"""
+Caché persistente de resultados de OCR, direccionada por contenido.
+
+La clave es un hash de los píxeles renderizados (modo, tamaño y bytes de la imagen) junto con
+el motor de OCR y su versión, la resolución, el idioma, la configuración de Tesseract y el tipo
+de llamada, de modo que los resultados de un motor nunca se devuelven para otro. Los resultados se
+guardan en SQLite con expulsión LRU acotada por tamaño, de modo que volver a procesar un PDF ya
+visto no vuelve a lanzar el OCR para las regiones que no cambiaron.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from processing.ocr_backends import OCRBackend
+
+# Tamaño máximo por defecto de la caché en disco
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Escrituras tras las que se vuelve a leer el tamaño real de la caché, que otros procesos comparten
+RESYNC_PUTS = 256
+
+
+def default_cache_path():
+    """Ruta por defecto de la caché de OCR (carpeta de datos del usuario)."""
+    return os.path.join(os.path.expanduser("~"), ".extractor_facturas", "ocr_cache.sqlite")
+
+
+class OCRCache:
+    """
+    Caché de OCR en SQLite con expulsión LRU acotada por tamaño y contadores de aciertos y fallos.
+    Puede compartirse entre procesos: cada proceso abre su propia conexión.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Tamaño ocupado según este proceso; se sincroniza con el real cada RESYNC_PUTS escrituras
+        self._total = None
+        self._puts = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_access ON ocr_cache (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(img, kind, dpi=None, lang=None, config="", engine=""):
+        """
+        Calcula la clave de la caché a partir de los píxeles de la imagen y los parámetros del OCR.
+        'engine' identifica el motor y su versión (ver OCRBackend.identity).
+        """
+        h = hashlib.sha256()
+        h.update(f"{engine}|{kind}|{img.mode}|{img.width}x{img.height}|{dpi}|{lang}|{config}|".encode("utf-8"))
+        h.update(img.tobytes())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Devuelve el resultado guardado para la clave (o None) y actualiza su último acceso."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Guarda un resultado y expulsa las entradas menos usadas si se supera el tamaño máximo."""
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self._puts += 1
+            if self._total is None or self._puts % RESYNC_PUTS == 0:
+                self._total = self._stored_bytes()
+            else:
+                self._total += len(payload) - (previous[0] if previous else 0)
+            if self._total > self.max_bytes:
+                # Antes de expulsar se confirma el tamaño real, que otros procesos pueden haber reducido
+                self._total = self._stored_bytes()
+                self._evict()
+            self._conn.commit()
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        excess = self._total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", stale)
+        self._total -= freed
+
+    def stats(self):
+        """Devuelve los contadores de la caché: aciertos, fallos, entradas y bytes ocupados."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedOCRBackend(OCRBackend):
+    """
+    Envuelve otro motor de OCR y consulta la caché antes de llamarlo.
+    Solo se ejecuta el OCR real para las imágenes que no están en la caché.
+    """
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = f"{backend.name}+cache"
+        self._identity = None
+
+    def engine_version(self):
+        return self.backend.engine_version()
+
+    def identity(self):
+        # La caché no cambia el resultado: se identifica como el motor que envuelve
+        if self._identity is None:
+            self._identity = self.backend.identity()
+        return self._identity
+
+    def _cached(self, kind, func, img, lang, config, timeout, dpi):
+        key = self.cache.make_key(img, kind, dpi, lang, config, self.identity())
+        value = self.cache.get(key)
+        if value is None:
+            value = func(img, lang=lang, config=config, timeout=timeout, dpi=dpi)
+            self.cache.put(key, value)
+        return value
+
+    def image_to_string(self, img, lang=None, config="", timeout=None, dpi=None):
+        return self._cached("string", self.backend.image_to_string, img, lang, config, timeout, dpi)
+
+    def image_to_data(self, img, lang=None, config="", timeout=None, dpi=None):
+        return self._cached("data", self.backend.image_to_data, img, lang, config, timeout, dpi)
+
+    def close(self):
+        self.backend.close()
+        self.cache.close()
@@ -1,61 +1,101 @@
 import os
 import re
 import json
+import shutil
 import fitz
 import pytesseract
-from PIL import Image
-import tkinter as tk
-from tkinter import filedialog
 
-def configure_tesseract():
+from processing import instrumentation
+from processing.layout import DocumentLayout
+from processing.ocr import DEFAULT_OCR_DPI, DEFAULT_OCR_MODE, OCR_MODES
+from processing.ocr_backends import get_backend
+from processing.raster import default_steps, parse_steps, rasterize
+from templates.compiled import compile_columns, compile_template
+
+# Separador de celdas en el texto de las tablas: dos o más espacios
+CELL_SEPARATOR = re.compile(r'\s{2,}')
+
+# Ruta de instalación por defecto de Tesseract en Windows
+DEFAULT_TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+def find_tesseract(tesseract_path=None):
     """
-    Configura la ruta de Tesseract OCR:
-      - Intenta usar la variable de entorno 'TESSERACT_PATH'
-      - Si no está definida, usa la ruta por defecto en Windows.
-      - Si la ruta por defecto no existe, solicita al usuario que seleccione el ejecutable.
-    Devuelve la ruta a tesseract.exe.
+    Busca el ejecutable de Tesseract OCR, en este orden:
+      - La ruta indicada como argumento
+      - La variable de entorno 'TESSERACT_PATH'
+      - El ejecutable 'tesseract' en el PATH del sistema
+      - La ruta por defecto en Windows
+    Devuelve la ruta encontrada o None. Nunca abre diálogos, por lo que puede usarse sin interfaz gráfica.
     """
-    # Intentar obtener la ruta desde la variable de entorno
-    tesseract_path = os.environ.get('TESSERACT_PATH')
-    if tesseract_path and os.path.exists(tesseract_path):
-        return tesseract_path
-
-    # Ruta por defecto en Windows
-    default_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    if os.path.exists(default_path):
-        tesseract_path = default_path
-    else:
-        # Si no se encuentra, pedir al usuario que seleccione el ejecutable
-        root = tk.Tk()
-        root.withdraw()  # Oculta la ventana principal
-        tesseract_path = filedialog.askopenfilename(
-            title="Selecciona tesseract.exe",
-            filetypes=[("Ejecutable", "*.exe")]
-        )
-        root.destroy()
-        if not tesseract_path or not os.path.exists(tesseract_path):
-            raise RuntimeError("No se pudo encontrar Tesseract OCR. Por favor, instálalo o configura TESSERACT_PATH.")
+    candidates = [tesseract_path, os.environ.get('TESSERACT_PATH'), shutil.which('tesseract'), DEFAULT_TESSERACT_PATH]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
 
-    return tesseract_path
+def configure_tesseract(tesseract_path=None, tessdata_dir=None):
+    """
+    Configura pytesseract con la ruta de Tesseract OCR (ver find_tesseract) y, si no está
+    definida, la variable TESSDATA_PREFIX. Devuelve la ruta configurada o None si no se encontró.
+
+    La ruta se exporta en TESSERACT_PATH para que los procesos trabajadores del procesamiento
+    por lotes la hereden sin volver a buscarla.
+    """
+    global tesseract_path_configured
+    tesseract_path = find_tesseract(tesseract_path)
+    if not tesseract_path:
+        return None
+    pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    os.environ['TESSERACT_PATH'] = tesseract_path
+    tesseract_path_configured = tesseract_path
 
-# Configurar Tesseract
-tesseract_path = configure_tesseract()
-pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    if tessdata_dir:
+        os.environ['TESSDATA_PREFIX'] = tessdata_dir
+    elif not os.environ.get('TESSDATA_PREFIX'):
+        tessdata_folder = os.path.join(os.path.dirname(tesseract_path), "tessdata")
+        if os.path.exists(tessdata_folder):
+            os.environ['TESSDATA_PREFIX'] = tessdata_folder
+    return tesseract_path
 
-# Configurar TESSDATA_PREFIX, si no está definida
-if not os.environ.get('TESSDATA_PREFIX'):
-    tessdata_folder = os.path.join(os.path.dirname(tesseract_path), "tessdata")
-    if os.path.exists(tessdata_folder):
-        os.environ['TESSDATA_PREFIX'] = tessdata_folder
-    else:
-        print("Advertencia: No se encontró la carpeta 'tessdata' en la ruta de Tesseract.")
+# Configurar Tesseract sin interacción; la interfaz gráfica solicita la ruta si no se encontró
+tesseract_path_configured = None
+configure_tesseract()
 
 class PDFExtractor:
-    def __init__(self, template_path):
+    def __init__(self, template_path, ocr_mode=DEFAULT_OCR_MODE, ocr_dpi=DEFAULT_OCR_DPI,
+                 ocr_backend=None, ocr_timeout=None, ocr_preprocess=None):
         """
         Inicializa el extractor cargando la plantilla de extracción (en formato JSON).
+
+        - ocr_mode: "page" (un único OCR por página, compartido por todos los campos) o
+          "region" (un OCR por cada área sin texto nativo).
+        - ocr_dpi: resolución de renderizado para el OCR de página.
+        - ocr_backend: motor de OCR (instancia o nombre, ver processing.ocr_backends); por defecto, OCR_BACKEND.
+        - ocr_timeout: tiempo máximo en segundos para cada llamada de OCR (sin límite si es None).
+        - ocr_preprocess: pasos de preprocesado de la imagen antes del OCR ("binarize", "deskew",
+          "trim"; ver processing.raster); por defecto, OCR_PREPROCESS.
+
+        Lanza TemplateError (ValueError) si la plantilla no es válida.
         """
+        if ocr_mode not in OCR_MODES:
+            raise ValueError(f"Modo de OCR no válido: {ocr_mode}. Opciones: {', '.join(OCR_MODES)}")
         self.template = self._load_template(template_path)
+        # La plantilla se valida y se compila una sola vez; los errores de esquema se informan aquí
+        self.compiled = compile_template(self.template)
+        self.ocr_mode = ocr_mode
+        self.ocr_dpi = ocr_dpi
+        self.ocr_backend = get_backend(ocr_backend)
+        self.ocr_timeout = ocr_timeout
+        self.ocr_preprocess = default_steps() if ocr_preprocess is None else parse_steps(ocr_preprocess)
+
+    def result_options(self):
+        """
+        Opciones ya resueltas que cambian el resultado de la extracción (motor de OCR con su
+        versión, modo, resolución y preprocesado), para la clave del almacén de resultados. Incluye
+        las que llegan por variables de entorno; el tiempo máximo de OCR no cambia el resultado.
+        """
+        return {"ocr_backend": self.ocr_backend.identity(), "ocr_mode": self.ocr_mode, "ocr_dpi": self.ocr_dpi,
+                "ocr_preprocess": list(self.ocr_preprocess)}
 
     @staticmethod
     def _load_template(path):
@@ -78,39 +118,71 @@ class PDFExtractor:
                 "tables": { nombre_tabla: [lista_de_filas, ...] }
             }
         """
-        results = {}
         # Usar context manager para asegurar que el PDF se cierra correctamente
         with fitz.open(pdf_path) as doc:
-            # Extraer campos fijos
-            fields_data = {}
-            for field in self.template.get("fields", []):
-                page_num = field.get("page", 0)
-                page = doc.load_page(page_num)
-                text = self._extract_text(page, field["coordinates"])
-                fields_data[field["name"]] = text
-            results["fields"] = fields_data
-
-            # Extraer tablas
-            tables_data = {}
-            for table in self.template.get("tables", []):
-                page_num = table.get("page", 0)
-                page = doc.load_page(page_num)
-                text = self._extract_text(page, table["coordinates"])
-                table_rows = self.process_table(text, table.get("columns", []))
-                tables_data[table["name"]] = table_rows
-            results["tables"] = tables_data
+            return self.extract_from_document(doc)
 
+    def extract_from_document(self, doc):
+        """
+        Extrae la información de la plantilla desde un documento ya abierto (fitz.Document).
+        Devuelve la misma estructura que extract_from_pdf.
+        """
+        compiled = self.compiled
+        # Los resultados conservan el orden de la plantilla aunque se recorran página a página
+        results = {
+            "fields": {field.name: "" for field in compiled.fields},
+            "tables": {table.name: [] for table in compiled.tables},
+        }
+        for section, name, value in self.iter_document(doc):
+            results[section][name] = value
         return results
 
-    def _extract_text(self, page, coords):
+    def iter_pdf(self, pdf_path):
+        """Abre el PDF y genera sus resultados con iter_document, cerrándolo al terminar."""
+        with fitz.open(pdf_path) as doc:
+            yield from self.iter_document(doc)
+
+    def iter_document(self, doc):
+        """
+        Genera los resultados de la plantilla página a página, en el orden del documento, como
+        tuplas (sección, nombre, valor): ("fields", campo, texto) o ("tables", tabla, filas).
+
+        Cada página se carga y se lee una sola vez, aunque tenga muchos campos, y se libera (con su
+        texto, su OCR y sus imágenes) antes de pasar a la siguiente, por lo que la memoria no crece
+        con el número de páginas del documento.
+        """
+        pages = DocumentLayout(doc)
+        for page_template in self.compiled.by_page:
+            page = pages.page(page_template.page)
+            # Extraer campos fijos
+            for field in page_template.fields:
+                with instrumentation.stage(None, field=field.name):
+                    text = self._extract_text(page, field.rect, pages)
+                yield "fields", field.name, text
+            # Extraer tablas
+            for table in page_template.tables:
+                with instrumentation.stage(None, table=table.name):
+                    text = self._extract_text(page, table.rect, pages)
+                    with instrumentation.stage("tables"):
+                        rows = self.process_table(text, table.columns)
+                yield "tables", table.name, rows
+            page = None
+            pages.release(page_template.page)
+
+    def _extract_text(self, page, coords, pages=None):
         """
         Extrae texto de la página utilizando las coordenadas especificadas.
         
         El parámetro 'coords' puede ser:
           - Un objeto fitz.Rect
           - Una secuencia (lista/tupla) con [x1, y1, x2, y2]
+        
+        Si se indica 'pages' (DocumentLayout del documento), el texto nativo se obtiene del índice
+        de palabras de la página en lugar de volver a leerla y, en modo OCR "page", el OCR
+        de la página completa se hace una sola vez y se reutiliza para todas las áreas.
           
-        Primero intenta la extracción nativa. Si no obtiene texto, recurre a OCR.
+        Primero intenta la extracción nativa. Si no obtiene texto, recurre a OCR. Con 'pages', en
+        las páginas nativas un área vacía no lanza el OCR y en las escaneadas se va directamente a él.
         """
         # Convertir coordenadas a un objeto fitz.Rect usando float para mayor precisión
         if isinstance(coords, fitz.Rect):
@@ -121,15 +193,28 @@ class PDFExtractor:
             except Exception as e:
                 raise ValueError(f"Coordenadas inválidas: {coords}. Error: {e}")
         
-        # Intento de extracción nativa
-        text = page.get_text("text", clip=rect).strip()
-        if text:
-            return text
+        # Con 'pages' la página se clasifica una vez (ver processing.classify)
+        kind = pages.page_kind(page.number) if pages is not None else "mixed"
+        if kind != "scanned":
+            # Intento de extracción nativa
+            if pages is not None:
+                text = pages.layout(page.number).text_in(rect).strip()
+            else:
+                text = page.get_text("text", clip=rect).strip()
+            if text or kind == "native":
+                return text
         
         # Si falla la extracción nativa, se utiliza OCR
-        pix = page.get_pixmap(clip=rect)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        ocr_text = pytesseract.image_to_string(img).strip()
+        instrumentation.count("ocr_fallbacks")
+        if pages is not None and self.ocr_mode == "page":
+            layout = pages.ocr_layout(page.number, self.ocr_dpi, self.ocr_backend,
+                                      timeout=self.ocr_timeout, preprocess=self.ocr_preprocess)
+            return layout.text_in(rect).strip()
+        with instrumentation.stage("get_pixmap"):
+            raster = rasterize(page, clip=rect, steps=self.ocr_preprocess)
+        instrumentation.count("pixels_rendered", raster.pixels)
+        with instrumentation.stage("ocr"):
+            ocr_text = self.ocr_backend.image_to_string(raster.image, timeout=self.ocr_timeout).strip()
         return ocr_text
 
     def process_table(self, table_text, columns):
@@ -139,15 +224,16 @@ class PDFExtractor:
         Se asigna cada celda a la columna definida por orden. Retorna una lista de diccionarios,
         donde cada diccionario representa una fila de la tabla.
         """
+        columns = compile_columns(columns)
         rows = table_text.strip().splitlines()
         table_data = []
         for row in rows:
             # Dividir la fila por dos o más espacios
-            cells = re.split(r'\s{2,}', row.strip())
+            cells = CELL_SEPARATOR.split(row.strip())
             row_data = {}
             num_defined_columns = len(columns)
             for i in range(num_defined_columns):
-                col_name = columns[i].get("name")
+                col_name = columns[i].name
                 # Si hay más celdas que columnas definidas, se ignoran las adicionales o se pueden agrupar
                 cell_value = cells[i] if i < len(cells) else ""
                 row_data[col_name] = cell_value
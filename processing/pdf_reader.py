@@ -7,14 +7,16 @@ def load_pdf_page(file_path, page_num=0):
     return doc, page
 
 # Ejemplo de renderización usando tkinter (suponiendo que 'canvas' es un tkinter.Canvas)
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from io import BytesIO
 
+from processing.raster import pixmap_image, render_pixmap
+
 def render_pdf_preview(page, canvas):
     """Renderiza una página del PDF en el canvas de la GUI."""
-    pix = page.get_pixmap()
-    # Convertir el pixmap a bytes y luego a imagen PIL
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    pix = render_pixmap(page, gray=False)
+    # Imagen PIL RGB del pixmap (PIL copia el buffer una vez; PhotoImage lo vuelve a copiar igualmente)
+    img = pixmap_image(pix)
     tk_img = ImageTk.PhotoImage(img)
     # Usar create_image para mostrar la imagen en el canvas
     canvas.create_image(0, 600, image=tk_img, anchor='nw')
@@ -0,0 +1,230 @@
+"""
+Renderizado de páginas a imagen para el OCR y la vista previa.
+
+Las páginas se renderizan en escala de grises (un byte por píxel, un tercio de la memoria de un
+RGB) y el buffer del pixmap se envuelve en una imagen PIL o en un array de NumPy sin copiarlo
+(las imágenes RGB, solo para la vista previa, sí se copian: ver pixmap_image).
+Antes del OCR pueden aplicarse, por orden, estos pasos de preprocesado (PREPROCESS_STEPS):
+  - "binarize": umbral global de Otsu (texto negro sobre fondo blanco)
+  - "deskew": endereza la página girándola el ángulo que maximiza el contraste del perfil de filas
+  - "trim": recorta los bordes en blanco
+Por defecto no se aplica ninguno; la variable de entorno OCR_PREPROCESS (por ejemplo,
+"binarize,deskew,trim") define los pasos por defecto y se hereda en los procesos trabajadores.
+
+Raster.to_page convierte una caja en píxeles de la imagen procesada en coordenadas de la página
+PDF, deshaciendo el recorte y el giro, para que las palabras del OCR puedan consultarse con los
+rectángulos de la plantilla.
+"""
+import math
+import os
+
+import fitz
+import numpy as np
+from PIL import Image
+
+# Resolución por defecto del renderizado (la de page.get_pixmap() sin matriz)
+DEFAULT_RASTER_DPI = 72
+PREPROCESS_STEPS = ("binarize", "deskew", "trim")
+# Inclinación máxima que se corrige y paso de la búsqueda, en grados
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.2
+# Lado máximo en píxeles de la imagen reducida sobre la que se estima la inclinación
+SKEW_MAX_SIDE = 1200
+# Píxeles oscuros muestreados como máximo para estimar la inclinación
+SKEW_SAMPLE_PIXELS = 200000
+# Margen en píxeles que se conserva alrededor del contenido al recortar
+TRIM_MARGIN = 8
+# Nivel de gris por debajo del cual un píxel se considera tinta
+INK_LEVEL = 128
+
+
+def parse_steps(value):
+    """
+    Convierte una lista de pasos ("binarize,trim" o un iterable) en una tupla validada.
+    Lanza ValueError si algún paso no existe.
+    """
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    steps = tuple(step.strip().lower() for step in value if step.strip())
+    for step in steps:
+        if step not in PREPROCESS_STEPS:
+            raise ValueError(f"Paso de preprocesado no válido: {step}. Opciones: {', '.join(PREPROCESS_STEPS)}")
+    return steps
+
+
+def default_steps():
+    """Pasos de preprocesado por defecto (variable de entorno OCR_PREPROCESS)."""
+    return parse_steps(os.environ.get("OCR_PREPROCESS", ""))
+
+
+def render_pixmap(page, dpi=None, clip=None, gray=True):
+    """
+    Renderiza la página (o el área 'clip') a 'dpi' puntos por pulgada, en escala de grises o
+    en RGB, sin canal alfa.
+    """
+    scale = (dpi or DEFAULT_RASTER_DPI) / 72
+    colorspace = fitz.csGRAY if gray else fitz.csRGB
+    return page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, colorspace=colorspace, alpha=False)
+
+
+def pixmap_image(pix):
+    """
+    Imagen PIL ("L" o "RGB") del pixmap. En escala de grises la imagen comparte el buffer del
+    pixmap, sin copiarlo, y guarda una referencia al pixmap para que el buffer siga vivo mientras
+    se use. En RGB, PIL no puede envolver el buffer (solo lo hace con "L", "RGBX", "RGBA"...) y
+    lo copia una vez, por lo que el pixmap puede liberarse.
+    """
+    mode = "L" if pix.n == 1 else "RGB"
+    img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    if img.readonly:
+        img.pixmap = pix
+    return img
+
+
+def pixmap_array(pix):
+    """Vista de NumPy (alto x ancho, o alto x ancho x canales) sobre el buffer del pixmap, sin copiarlo."""
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    pixels = rows[:, :pix.width * pix.n]
+    return pixels if pix.n == 1 else pixels.reshape(pix.height, pix.width, pix.n)
+
+
+def otsu_threshold(gray):
+    """Umbral de Otsu de una imagen en escala de grises (array uint8)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if not total:
+        return INK_LEVEL
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    mass = np.cumsum(hist * levels)
+    background = total - weight
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dark = mass / weight
+        mean_light = (mass[-1] - mass) / background
+        between = weight * background * (mean_dark - mean_light) ** 2
+    between[~np.isfinite(between)] = 0
+    return int(np.argmax(between))
+
+
+def binarize(gray):
+    """Devuelve la imagen binarizada con el umbral de Otsu (0 = tinta, 255 = fondo)."""
+    lut = np.zeros(256, dtype=np.uint8)
+    lut[otsu_threshold(gray) + 1:] = 255
+    return lut[gray]
+
+
+def estimate_skew(gray, max_degrees=MAX_SKEW_DEGREES, step=SKEW_STEP_DEGREES):
+    """
+    Estima la inclinación del texto en grados (positiva si las líneas bajan hacia la derecha).
+
+    Para cada ángulo candidato se proyectan los píxeles de tinta sobre el eje vertical
+    corrigiendo la inclinación; con el ángulo correcto las líneas de texto caen en pocas filas
+    y el perfil tiene la máxima energía (suma de cuadrados).
+    """
+    # El ángulo no depende de la resolución: se estima sobre una versión reducida de la imagen
+    factor = max(1, max(gray.shape) // SKEW_MAX_SIDE)
+    ys, xs = np.nonzero(gray[::factor, ::factor] < INK_LEVEL)
+    if len(ys) < 2:
+        return 0.0
+    if len(ys) > SKEW_SAMPLE_PIXELS:
+        keep = slice(None, None, len(ys) // SKEW_SAMPLE_PIXELS + 1)
+        ys, xs = ys[keep], xs[keep]
+    xs = xs - gray.shape[1] / factor / 2
+    best_angle, best_score = 0.0, None
+    for angle in np.arange(-max_degrees, max_degrees + step / 2, step):
+        rows = np.round(ys - xs * math.tan(math.radians(angle))).astype(np.int64)
+        rows -= rows.min()
+        profile = np.bincount(rows).astype(np.float64)
+        score = float(np.dot(profile, profile))
+        if best_score is None or score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def content_box(gray, margin=TRIM_MARGIN):
+    """Caja (x0, y0, x1, y1) en píxeles que contiene la tinta más un margen (None si no hay tinta)."""
+    ink = gray < INK_LEVEL
+    rows = np.flatnonzero(ink.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(ink.any(axis=0))
+    height, width = gray.shape
+    return (max(0, int(cols[0]) - margin), max(0, int(rows[0]) - margin),
+            min(width, int(cols[-1]) + 1 + margin), min(height, int(rows[-1]) + 1 + margin))
+
+
+class Raster:
+    """
+    Imagen de una página (o de un área) lista para el OCR, con la transformación necesaria para
+    llevar las cajas de la imagen a coordenadas de la página.
+    """
+
+    def __init__(self, image, scale, origin, angle=0.0, center=(0.0, 0.0), offset=(0, 0)):
+        self.image = image
+        self.scale = scale
+        self.origin = origin
+        self.angle = angle
+        self.center = center
+        self.offset = offset
+
+    @property
+    def pixels(self):
+        return self.image.width * self.image.height
+
+    def to_page(self, x0, y0, x1, y1):
+        """Convierte una caja en píxeles de la imagen en una caja en puntos de la página."""
+        cx = (x0 + x1) / 2 + self.offset[0]
+        cy = (y0 + y1) / 2 + self.offset[1]
+        if self.angle:
+            # Inversa del giro de PIL Image.rotate alrededor del centro de la imagen
+            a = -math.radians(self.angle)
+            dx, dy = cx - self.center[0], cy - self.center[1]
+            cx = math.cos(a) * dx + math.sin(a) * dy + self.center[0]
+            cy = -math.sin(a) * dx + math.cos(a) * dy + self.center[1]
+        half_w = (x1 - x0) / 2 / self.scale
+        half_h = (y1 - y0) / 2 / self.scale
+        px = self.origin[0] + cx / self.scale
+        py = self.origin[1] + cy / self.scale
+        return px - half_w, py - half_h, px + half_w, py + half_h
+
+
+def rasterize(page, dpi=None, clip=None, steps=()):
+    """
+    Renderiza la página (o el área 'clip') en escala de grises y aplica los pasos de
+    preprocesado indicados, siempre en el orden de PREPROCESS_STEPS. Devuelve un Raster.
+    Sin pasos, la imagen comparte el buffer del pixmap; cada paso produce un array nuevo.
+    """
+    dpi = dpi or DEFAULT_RASTER_DPI
+    area = page.rect if clip is None else fitz.Rect(clip) & page.rect
+    pix = render_pixmap(page, dpi, clip)
+    scale = dpi / 72
+    if not steps:
+        return Raster(pixmap_image(pix), scale, (area.x0, area.y0))
+
+    gray = pixmap_array(pix)
+    angle = 0.0
+    center = (pix.width / 2, pix.height / 2)
+    offset = (0, 0)
+    # Raster.to_page deshace primero el recorte y después el giro
+    for step in PREPROCESS_STEPS:
+        if step not in steps:
+            continue
+        if step == "binarize":
+            gray = binarize(gray)
+        elif step == "deskew":
+            skew = estimate_skew(gray)
+            if skew:
+                angle = skew
+                # Sobre una imagen binarizada basta el vecino más próximo, bastante más rápido
+                resample = Image.NEAREST if "binarize" in steps else Image.BILINEAR
+                rotated = Image.fromarray(gray).rotate(skew, resample=resample, fillcolor=255)
+                gray = np.asarray(rotated)
+        elif step == "trim":
+            box = content_box(gray)
+            if box is not None:
+                gray = gray[box[1]:box[3], box[0]:box[2]]
+                offset = (offset[0] + box[0], offset[1] + box[1])
+    image = Image.fromarray(np.ascontiguousarray(gray))
+    return Raster(image, scale, (area.x0, area.y0), angle, center, offset)
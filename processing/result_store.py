@@ -0,0 +1,123 @@
+"""
+Almacén de resultados para el reprocesamiento incremental.
+
+Guarda, para cada par (hash del contenido del PDF, hash de la plantilla), el resultado de
+extract_from_pdf ({"fields": ..., "tables": ...}). En una nueva ejecución solo se extraen los
+archivos o plantillas que cambiaron; el resto se sirve desde el almacén.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def default_store_path():
+    """Ruta por defecto del almacén de resultados (carpeta de datos del usuario)."""
+    return os.path.join(os.path.expanduser("~"), ".extractor_facturas", "resultados.sqlite")
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """Devuelve el SHA-256 del contenido del archivo, leyéndolo por bloques."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def template_hash(template, options=None):
+    """
+    Devuelve el SHA-256 del contenido de la plantilla (independiente del orden de las claves)
+    junto con las opciones del extractor que afectan al resultado (por ejemplo, el modo de OCR).
+    """
+    payload = {"template": template, "options": options or {}}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Almacén SQLite de resultados de extracción indexado por (hash del PDF, hash de la plantilla).
+
+    También recuerda el tamaño y la fecha de modificación de cada archivo para no recalcular
+    el hash de los PDFs que no cambiaron desde la ejecución anterior.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " pdf_hash TEXT NOT NULL,"
+            " template_hash TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " pages INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (pdf_hash, template_hash))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " pdf_hash TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def hash_file(self, path):
+        """Devuelve el hash del PDF, reutilizando el calculado antes si el archivo no cambió."""
+        abs_path = os.path.abspath(path)
+        st = os.stat(abs_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pdf_hash FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (abs_path, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_hash(abs_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, pdf_hash) VALUES (?, ?, ?, ?)",
+                (abs_path, st.st_size, st.st_mtime_ns, digest)
+            )
+            self._conn.commit()
+        return digest
+
+    def contains(self, pdf_hash, template_key):
+        """Indica si hay un resultado guardado para el par (PDF, plantilla)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM results WHERE pdf_hash = ? AND template_hash = ?", (pdf_hash, template_key)
+            ).fetchone()
+        return row is not None
+
+    def get(self, pdf_hash, template_key):
+        """Devuelve (data, páginas) guardados para el par (PDF, plantilla), o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, pages FROM results WHERE pdf_hash = ? AND template_hash = ?", (pdf_hash, template_key)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, pdf_hash, template_key, data, pages):
+        """Guarda el resultado de la extracción para el par (PDF, plantilla)."""
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (pdf_hash, template_hash, data, pages, created) VALUES (?, ?, ?, ?, ?)",
+                (pdf_hash, template_key, payload, pages, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
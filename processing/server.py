@@ -0,0 +1,396 @@
+"""
+Servicio HTTP local de extracción, para integraciones (por ejemplo, un ERP) que envían un PDF y
+reciben el resultado en JSON sin arrancar la aplicación.
+
+Ejemplo:
+    python -m processing.server -t plantilla.json --port 8765 -w 4
+    curl --data-binary @factura.pdf -H "Content-Type: application/pdf" http://127.0.0.1:8765/extract
+
+Rutas:
+  - POST /extract: el cuerpo es el PDF. Responde con el resultado de extract_from_pdf,
+    {"fields": ..., "tables": ...}, y con "template" si el servidor usa una biblioteca de
+    plantillas (--templates).
+  - GET /health: estado del servidor, plantillas cargadas y contadores de peticiones.
+
+El servidor usa solo asyncio (sin dependencias). La plantilla se compila y los extractores se
+crean una sola vez, en un grupo de procesos trabajadores que se arranca antes de aceptar
+conexiones, por lo que cada petición cuesta solo la extracción. Límites:
+  - --max-concurrency: extracciones simultáneas (por defecto, una por proceso). Las peticiones
+    que no consiguen turno dentro de su tiempo máximo reciben 503.
+  - --timeout: tiempo máximo de cada petición, incluida la espera de turno; si se supera, 504.
+    Es también el tiempo máximo de cada llamada al OCR, salvo que se indique --ocr-timeout. El
+    turno no se libera hasta que el proceso termina el documento; si sigue ocupado STUCK_GRACE
+    segundos después de vencer la petición, se detienen los procesos y el grupo se vuelve a
+    arrancar (las demás extracciones en curso en ese momento responden 422).
+  - --max-body-mb: tamaño máximo del PDF (413 si se supera).
+Respuestas de error: {"error": mensaje} con 400, 404, 405, 411, 413, 415, 422 (el documento no
+pudo extraerse), 503 o 504.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Tiempo máximo de una petición de extracción, en segundos
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_BODY_MB = 50.0
+# Segundos que un proceso puede seguir ocupado tras vencer su petición antes de reiniciar el grupo
+STUCK_GRACE = 5.0
+# Tiempo máximo para recibir una petición completa y de inactividad de una conexión persistente
+IO_TIMEOUT = 30.0
+# Tamaño máximo de la línea de petición más las cabeceras
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class HttpError(Exception):
+    """Error que se responde al cliente con el estado HTTP indicado."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _discard_result(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _init_server_worker(pids, template, extractor_options):
+    """Inicializa el proceso trabajador (ver processing.batch._init_worker) e informa de su PID."""
+    from processing.batch import _init_worker
+
+    pids.put(os.getpid())
+    _init_worker(template, extractor_options)
+
+
+class ExtractionServer:
+    """
+    Servidor HTTP de extracción con extractores calientes en un grupo de procesos.
+
+    - template: ruta de la plantilla o carpeta de plantillas (biblioteca, ver TemplateManager).
+    - workers: procesos de extracción (por defecto, uno por CPU).
+    - max_concurrency: extracciones simultáneas (por defecto, 'workers').
+    - timeout: tiempo máximo de cada petición de extracción, en segundos.
+    - max_body: tamaño máximo del PDF, en bytes.
+    """
+
+    def __init__(self, template, workers=None, max_concurrency=None, timeout=DEFAULT_TIMEOUT,
+                 max_body=int(DEFAULT_MAX_BODY_MB * 2 ** 20), extractor_options=None, log_requests=True, log=None):
+        from processing.batch import load_extractor
+        from templates.manager import TemplateManager
+
+        self.extractor_options = dict(extractor_options or {})
+        # Sin límite propio, ninguna llamada al OCR puede durar más que una petición
+        self.extractor_options.setdefault("ocr_timeout", timeout)
+        if os.path.isdir(template):
+            self.template = TemplateManager(template)
+            self.template.check_library()
+            self.template_names = [entry.name for entry in self.template.entries]
+        else:
+            self.template = template
+            self.template_names = [os.path.splitext(os.path.basename(template))[0]]
+        # Validar la plantilla y las opciones antes de arrancar los procesos
+        load_extractor(self.template, self.extractor_options)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_concurrency = max(1, max_concurrency or self.workers)
+        self.timeout = timeout
+        self.max_body = max_body
+        self.log_requests = log_requests
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.stats = {"requests": 0, "extracted": 0, "failed": 0, "rejected": 0, "timeouts": 0, "restarts": 0}
+        self.in_flight = 0
+        self._pool = None
+        # PIDs que los procesos del grupo actual comunican al arrancar, para poder detenerlos
+        self._pid_queue = None
+        self._slots = None
+        self._connections = set()
+
+    # --- Procesos trabajadores ---
+    def start_pool(self, warm=True):
+        """Arranca el grupo de procesos; con 'warm', espera a que todos tengan la plantilla cargada."""
+        context = multiprocessing.get_context()
+        pid_queue = context.SimpleQueue()
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_server_worker,
+                                   initargs=(pid_queue, self.template, self.extractor_options))
+        if warm:
+            for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+        self._pool, self._pid_queue = pool, pid_queue
+
+    def _kill_workers(self):
+        """Detiene los procesos del grupo actual por su PID, sin esperar a que terminen sus trabajos."""
+        pid_queue = self._pid_queue
+        sig = getattr(signal, "SIGKILL", signal.SIGTERM)
+        while not pid_queue.empty():
+            try:
+                os.kill(pid_queue.get(), sig)
+            except OSError:
+                # El proceso ya había terminado
+                pass
+
+    def _restart_pool(self, broken):
+        # Varias peticiones pueden detectar a la vez el mismo grupo roto: se recrea una sola vez
+        if self._pool is broken:
+            self.log("El grupo de procesos de extracción se interrumpió; se vuelve a arrancar")
+            broken.shutdown(wait=False)
+            # Sin esperar a los procesos, para no bloquear el bucle de eventos
+            self.start_pool(warm=False)
+
+    def _restart_if_stuck(self, pool, future):
+        # El proceso sigue con un documento cuya petición ya venció: se detiene para recuperar el turno.
+        # Si el grupo ya se reinició (por otra extracción atascada, por ejemplo), no queda nada que hacer
+        if future.done() or self._pool is not pool:
+            return
+        self.log(f"Una extracción sigue en curso {STUCK_GRACE:g} s después de vencer su petición; "
+                 "se reinicia el grupo de procesos")
+        self.stats["restarts"] += 1
+        self._kill_workers()
+        # Los trabajos del grupo terminan con BrokenProcessPool y liberan sus turnos
+        self._restart_pool(pool)
+
+    async def extract(self, pdf_bytes):
+        """Extrae el PDF en un proceso trabajador respetando el límite de concurrencia y el tiempo máximo."""
+        from processing.batch import _extract_bytes
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Servidor ocupado: no hubo turno de extracción a tiempo")
+        pool = self._pool
+        try:
+            future = pool.submit(_extract_bytes, pdf_bytes)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._restart_pool(pool)
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "El grupo de procesos de extracción se está reiniciando")
+        # El turno se libera cuando el proceso termina de verdad, aunque la petición haya vencido antes
+        self.in_flight += 1
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release_slot))
+        result = asyncio.wrap_future(future)
+        try:
+            data, pages = await asyncio.wait_for(asyncio.shield(result), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            # Nadie espera ya el resultado: se recoge al terminar para que asyncio no avise de errores sin leer
+            result.add_done_callback(_discard_result)
+            # Si aún no empezó, se descarta; si ya está en curso, el proceso lo termina igualmente
+            if not future.cancel():
+                loop.call_later(STUCK_GRACE, self._restart_if_stuck, pool, future)
+            self.stats["timeouts"] += 1
+            raise HttpError(HTTPStatus.GATEWAY_TIMEOUT, f"La extracción superó el tiempo máximo ({self.timeout:g} s)")
+        except BrokenProcessPool:
+            self.stats["failed"] += 1
+            self._restart_pool(pool)
+            raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, "El proceso de extracción terminó de forma inesperada")
+        except Exception as e:
+            self.stats["failed"] += 1
+            raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        self.stats["extracted"] += 1
+        return data, pages
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    # --- HTTP ---
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, stop_event=None):
+        """Arranca los procesos y atiende peticiones hasta que se activa 'stop_event'."""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        # El arranque de los procesos bloquea; se hace fuera del bucle de eventos
+        await loop.run_in_executor(None, self.start_pool)
+        stop_event = stop_event or asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        address = server.sockets[0].getsockname()
+        self.log(f"Escuchando en http://{address[0]}:{address[1]} ({self.workers} procesos, "
+                 f"{self.max_concurrency} extracciones simultáneas)")
+        try:
+            await stop_event.wait()
+        finally:
+            server.close()
+            # Esperar las extracciones en curso y cerrar después las conexiones inactivas
+            while self.in_flight:
+                await asyncio.sleep(0.05)
+            for writer in list(self._connections):
+                writer.close()
+            await server.wait_closed()
+            self._pool.shutdown(wait=True)
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer), IO_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HttpError as e:
+                    await self._respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._dispatch(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                if self.log_requests:
+                    self.log(f"{method} {path} {int(status)} {time.perf_counter() - start:.3f} s")
+                await self._respond(writer, status, payload, keep_alive)
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """Lee una petición: (método, ruta, cabeceras, cuerpo, conexión persistente), o None al cerrarse."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Cabeceras demasiado grandes")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Línea de petición no válida")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        body = b""
+        if method in ("POST", "PUT"):
+            if "chunked" in headers.get("transfer-encoding", "").lower() or "content-length" not in headers:
+                raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Se requiere la cabecera Content-Length")
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length no válido")
+            if length > self.max_body:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                f"El PDF supera el tamaño máximo ({self.max_body // 2 ** 20} MB)")
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            body = await reader.readexactly(length)
+        return method, urlsplit(target).path, headers, body, keep_alive
+
+    async def _dispatch(self, method, path, body):
+        self.stats["requests"] += 1
+        if path == "/extract":
+            if method != "POST":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST con el PDF en el cuerpo")
+            if b"%PDF" not in body[:1024]:
+                raise HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "El cuerpo de la petición no es un PDF")
+            data, _ = await self.extract(body)
+            return HTTPStatus.OK, data
+        if path == "/health":
+            if method != "GET":
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "workers": self.workers,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "templates": self.template_names,
+                "stats": self.stats,
+            }
+        raise HttpError(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {path}")
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        status = HTTPStatus(status)
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def build_parser():
+    from processing.cli import add_extractor_arguments, add_template_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="python -m processing.server",
+        description="Servicio HTTP local: POST /extract con un PDF devuelve los datos extraídos en JSON."
+    )
+    add_template_arguments(parser)
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Dirección de escucha (por defecto, {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Puerto (por defecto, {DEFAULT_PORT})")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos de extracción (por defecto, uno por CPU)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Extracciones simultáneas (por defecto, una por proceso)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Tiempo máximo por petición en segundos (por defecto, {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--max-body-mb", type=float, default=DEFAULT_MAX_BODY_MB,
+                        help=f"Tamaño máximo del PDF en MB (por defecto, {DEFAULT_MAX_BODY_MB:g})")
+    parser.add_argument("-q", "--quiet", action="store_true", help="No registrar cada petición")
+    add_extractor_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    from processing.cli import configure_extractor
+
+    args = build_parser().parse_args(argv)
+    extractor_options = configure_extractor(args)
+    try:
+        server = ExtractionServer(args.template or args.templates, workers=args.workers,
+                                  max_concurrency=args.max_concurrency, timeout=args.timeout,
+                                  max_body=int(args.max_body_mb * 2 ** 20), extractor_options=extractor_options,
+                                  log_requests=not args.quiet)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    async def run():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop_event.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C interrumpe el bucle con KeyboardInterrupt
+                pass
+        await server.serve(args.host, args.port, stop_event)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: no se pudo iniciar el servidor: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Extracción de tablas con un único análisis por documento.
+
+Las tablas de la plantilla se agrupan por página: cada página necesaria se analiza una sola vez
+y sus elementos de texto se reparten entre todas las tablas definidas en ella. Así, una plantilla
+con cinco tablas sobre un PDF de 20 páginas cuesta un único análisis (y solo de las páginas
+que usan las tablas), en lugar de cinco análisis del documento completo.
+
+Motores disponibles (TABLE_BACKENDS):
+  - "pdfminer": contenedores de texto del análisis de layout de pdfminer (comportamiento original)
+  - "pymupdf": palabras de PyMuPDF (page.get_text("words")), mucho más rápido
+
+Ambos motores devuelven los elementos en el formato que espera PDFExtractor.structure_table_data:
+diccionarios {'text', 'x0', 'y0', 'x1', 'y1'} en el espacio de coordenadas de pdfminer
+(origen abajo a la izquierda, y hacia arriba).
+"""
+import io
+from bisect import bisect_right
+from collections import namedtuple
+
+import fitz
+
+from templates.compiled import compile_template
+
+TABLE_BACKENDS = ("pdfminer", "pymupdf")
+DEFAULT_TABLE_BACKEND = "pdfminer"
+# Diferencia vertical máxima (en puntos) entre elementos de una misma fila
+DEFAULT_ROW_TOLERANCE = 2.0
+
+# Elementos de texto de una página analizada. 'left' y 'top' son la posición del borde izquierdo y
+# del borde superior de la página en el espacio de pdfminer, para convertir las áreas del diseñador
+PageElements = namedtuple("PageElements", ["left", "top", "elements"])
+
+
+class TableBackend:
+    """Interfaz común de los motores de tablas."""
+
+    name = "base"
+
+    def parse(self, source, page_numbers):
+        """
+        Analiza una sola vez las páginas indicadas (numeración desde 0) del PDF 'source' (ruta o
+        fitz.Document abierto) y devuelve {página: PageElements}.
+        """
+        return dict(self.iter_pages(source, page_numbers))
+
+    def iter_pages(self, source, page_numbers):
+        """
+        Igual que parse, pero genera los pares (página, PageElements) de uno en uno y en orden, sin
+        conservar el análisis de las páginas ya devueltas.
+        """
+        raise NotImplementedError
+
+
+class PdfminerTableBackend(TableBackend):
+    """Contenedores de texto (LTTextContainer) del análisis de layout de pdfminer."""
+
+    name = "pdfminer"
+
+    def iter_pages(self, source, page_numbers):
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+
+        if isinstance(source, fitz.Document):
+            # Los documentos abiertos desde memoria no tienen ruta
+            source = source.name or io.BytesIO(source.tobytes())
+        page_numbers = sorted(set(page_numbers))
+        # pdfminer devuelve las páginas pedidas en el orden del documento, analizando cada una
+        # solo cuando se pide; el árbol de layout de la página se descarta al pasar a la siguiente.
+        # Sin la caché de objetos de pdfminer la memoria no crece con el número de páginas
+        pages = extract_pages(source, page_numbers=page_numbers, caching=False)
+        for page_num, page in zip(page_numbers, pages):
+            elements = []
+            for element in page:
+                if isinstance(element, LTTextContainer):
+                    x0, y0, x1, y1 = element.bbox
+                    elements.append({'text': element.get_text().strip(), 'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1})
+            yield page_num, PageElements(page.bbox[0], page.bbox[3], elements)
+
+
+class PyMuPDFTableBackend(TableBackend):
+    """Palabras de PyMuPDF convertidas al espacio de coordenadas de pdfminer."""
+
+    name = "pymupdf"
+
+    def iter_pages(self, source, page_numbers):
+        if isinstance(source, fitz.Document):
+            yield from self._iter_document(source, page_numbers)
+            return
+        with fitz.open(source) as doc:
+            yield from self._iter_document(doc, page_numbers)
+
+    @staticmethod
+    def _iter_document(doc, page_numbers):
+        for page_num in sorted(set(page_numbers)):
+            if page_num >= doc.page_count:
+                continue
+            page = doc.load_page(page_num)
+            # Desplazamientos de la transformación de PyMuPDF a coordenadas PDF (páginas sin rotar)
+            matrix = ~page.transformation_matrix
+            left, top = matrix.e, matrix.f
+            elements = [
+                {'text': text, 'x0': x0 + left, 'y0': top - y1, 'x1': x1 + left, 'y1': top - y0}
+                for x0, y0, x1, y1, text, *_ in page.get_text("words")
+            ]
+            yield page_num, PageElements(left, top, elements)
+
+
+def get_table_backend(backend=None):
+    """Devuelve el motor de tablas: una instancia de TableBackend o un nombre (ver TABLE_BACKENDS)."""
+    if isinstance(backend, TableBackend):
+        return backend
+    name = (backend or DEFAULT_TABLE_BACKEND).lower()
+    if name == "pdfminer":
+        return PdfminerTableBackend()
+    if name == "pymupdf":
+        return PyMuPDFTableBackend()
+    raise ValueError(f"Motor de tablas no válido: {name}. Opciones: {', '.join(TABLE_BACKENDS)}")
+
+
+def table_bbox(table, page):
+    """
+    Área de la tabla en el espacio de pdfminer. Las áreas definidas como diccionario ya están en ese
+    espacio; las definidas como lista vienen del diseñador (origen arriba a la izquierda) y se convierten.
+    """
+    if table.y_up:
+        return table.bbox
+    x0, y0, x1, y1 = table.bbox
+    return x0 + page.left, page.top - y1, x1 + page.left, page.top - y0
+
+
+def elements_in(elements, bbox):
+    """Elementos contenidos por completo en el área (x0, y0, x1, y1)."""
+    bx0, by0, bx1, by1 = bbox
+    return [e for e in elements if e['x0'] >= bx0 and e['x1'] <= bx1 and e['y0'] >= by0 and e['y1'] <= by1]
+
+
+def extract_table_elements(source, template, backend=None):
+    """
+    Devuelve {nombre de tabla: elementos} para todas las tablas de la plantilla, analizando cada
+    página necesaria una sola vez con el motor indicado.
+    """
+    tables = compile_template(template).tables
+    result = {table.name: [] for table in tables}
+    for table, elements in iter_table_elements(source, template, backend):
+        result[table.name] = elements
+    return result
+
+
+def iter_table_elements(source, template, backend=None):
+    """
+    Genera (CompiledTable, elementos) página a página, en el orden del documento: cada página se
+    analiza, se reparte entre sus tablas y se descarta antes de pasar a la siguiente.
+    """
+    compiled = compile_template(template)
+    if not compiled.tables:
+        return
+    by_page = {}
+    for table in compiled.tables:
+        by_page.setdefault(table.page, []).append(table)
+    for page_num, page in get_table_backend(backend).iter_pages(source, by_page):
+        for table in by_page[page_num]:
+            yield table, elements_in(page.elements, table_bbox(table, page))
+
+
+def cluster_rows(elements, tolerance=DEFAULT_ROW_TOLERANCE):
+    """
+    Agrupa los elementos en filas, de arriba a abajo, ordenándolos por 'y0' y recorriéndolos una
+    sola vez: un elemento abre una fila nueva cuando su 'y0' se aleja más de 'tolerance' puntos del
+    primer elemento de la fila actual. Comparar con el primero (y no con el anterior) evita que
+    pequeñas diferencias acumuladas unan filas distintas. Coste O(n log n).
+    """
+    rows = []
+    anchor = None
+    for elem in sorted(elements, key=lambda e: -e['y0']):
+        if anchor is None or anchor - elem['y0'] > tolerance:
+            rows.append([])
+            anchor = elem['y0']
+        rows[-1].append(elem)
+    return rows
+
+
+class ColumnIndex:
+    """
+    Asignación de elementos a columnas por búsqueda binaria sobre los bordes izquierdos ordenados.
+    Un elemento pertenece a una columna si está contenido por completo en sus límites horizontales.
+    Si las columnas se solapan se comprueban todas, como antes.
+    """
+
+    def __init__(self, columns):
+        missing = [col.name for col in columns if col.x0 is None or col.x1 is None]
+        if missing:
+            raise ValueError(f"Las columnas {', '.join(missing)} no tienen límites horizontales ('x0' y 'x1')")
+        self.columns = columns
+        self.order = sorted(range(len(columns)), key=lambda i: columns[i].x0)
+        self.starts = [columns[i].x0 for i in self.order]
+        ends = [columns[i].x1 for i in self.order]
+        self.overlapping = any(ends[i] > self.starts[i + 1] for i in range(len(self.order) - 1))
+
+    def columns_for(self, elem):
+        """Índices (en el orden de la plantilla) de las columnas que contienen al elemento."""
+        if self.overlapping:
+            return [i for i, col in enumerate(self.columns) if elem['x0'] >= col.x0 and elem['x1'] <= col.x1]
+        pos = bisect_right(self.starts, elem['x0']) - 1
+        if pos < 0:
+            return []
+        i = self.order[pos]
+        return [i] if elem['x1'] <= self.columns[i].x1 else []
@@ -0,0 +1,600 @@
+"""
+Modo vigilancia ("carpeta caliente"): extracción continua de los PDFs que llegan a una o varias
+carpetas de entrada, sin interfaz gráfica y sin coste de arranque por documento.
+
+Ejemplo:
+    python -m processing.watcher -t plantilla.json -o resultados/ entrada/ otra_entrada/
+
+Funcionamiento:
+  - Las carpetas se vigilan con inotify en Linux (por ctypes, sin dependencias) y, si no está
+    disponible, recorriéndolas cada --poll-interval segundos. Al arrancar se recogen también los
+    PDFs que ya estaban en las carpetas.
+  - Un PDF se procesa cuando su tamaño y su fecha de modificación no cambian durante --settle
+    segundos y termina con la marca %%EOF, para no leer archivos que aún se están copiando.
+  - Los PDFs listos pasan a una cola acotada (--queue-size): si la extracción no da abasto, la
+    vigilancia espera en lugar de acumular trabajo en memoria.
+  - La plantilla (o la biblioteca, con --templates) se carga una sola vez; con -w N la extracción
+    se reparte entre N procesos trabajadores que se mantienen vivos.
+  - El resultado de cada PDF se escribe como JSON en la carpeta de salida, de forma atómica, con el
+    nombre '<pdf>_<hash>.json'. Después el PDF se mueve a la carpeta de archivo (por defecto,
+    'procesados' dentro de su carpeta de entrada) o, si falla, a la de errores ('errores') junto a
+    un '<pdf>.error.txt' con el motivo.
+  - Es idempotente: si el resultado de un PDF con el mismo contenido ya existe no se vuelve a
+    extraer, y si se interrumpe entre la escritura del resultado y el archivado, el PDF se archiva
+    en el siguiente arranque sin repetir la extracción.
+
+SIGINT y SIGTERM detienen la vigilancia tras terminar los documentos en curso; los PDFs que
+seguían en la cola permanecen en su carpeta y se procesan en el siguiente arranque.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+WATCH_MODES = ("auto", "inotify", "poll")
+# Segundos que un archivo debe permanecer sin cambios para considerarse completo
+DEFAULT_SETTLE_SECONDS = 2.0
+# Intervalo entre recorridos de las carpetas cuando no hay inotify
+DEFAULT_POLL_INTERVAL = 2.0
+# Documentos listos en espera como máximo antes de frenar la vigilancia
+DEFAULT_QUEUE_SIZE = 32
+# Espera máxima de cada vuelta de los bucles, para comprobar la parada y los archivos pendientes
+TICK_SECONDS = 0.25
+# Un PDF estable sin la marca %%EOF se procesa igualmente pasado este tiempo (y fallará si está truncado)
+INCOMPLETE_GRACE_SECONDS = 60.0
+# Bytes finales del archivo en los que se busca la marca %%EOF
+EOF_WINDOW = 2048
+# Carpetas por defecto, dentro de cada carpeta de entrada, para los originales procesados y los fallidos
+ARCHIVE_DIR_NAME = "procesados"
+ERROR_DIR_NAME = "errores"
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_candidate(file_name):
+    """PDFs que pueden procesarse: se ignoran los archivos ocultos y los temporales de las copias."""
+    return file_name.lower().endswith(".pdf") and not file_name.startswith((".", "~"))
+
+
+def scan_directory(directory):
+    """PDFs candidatos de la carpeta (sin recorrer subcarpetas)."""
+    try:
+        with os.scandir(directory) as entries:
+            return [entry.path for entry in entries if is_candidate(entry.name) and entry.is_file()]
+    except FileNotFoundError:
+        return []
+
+
+class PollingWatcher:
+    """Vigilancia recorriendo las carpetas cada 'interval' segundos."""
+
+    name = "poll"
+
+    def __init__(self, directories, interval=DEFAULT_POLL_INTERVAL):
+        self.directories = list(directories)
+        self.interval = interval
+        self._last_scan = None
+
+    def poll(self, timeout):
+        """Espera hasta 'timeout' segundos y devuelve las rutas que pueden haber cambiado."""
+        now = time.monotonic()
+        if self._last_scan is not None and now - self._last_scan < self.interval:
+            time.sleep(min(timeout, self.interval - (now - self._last_scan)))
+            return []
+        self._last_scan = now
+        return [path for directory in self.directories for path in scan_directory(directory)]
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Vigilancia con inotify (Linux) mediante ctypes. Lanza OSError si inotify no está disponible.
+    Si la cola de eventos del núcleo se desborda, se recorren de nuevo las carpetas.
+    """
+
+    name = "inotify"
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify solo está disponible en Linux")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("la biblioteca C no ofrece inotify")
+        self.directories = list(directories)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self._dirs = {}
+        try:
+            for directory in self.directories:
+                wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+                if wd < 0:
+                    errno = ctypes.get_errno()
+                    raise OSError(errno, f"inotify_add_watch({directory}): {os.strerror(errno)}")
+                self._dirs[wd] = directory
+        except OSError:
+            os.close(self._fd)
+            raise
+        # Los PDFs que ya estaban antes de empezar a vigilar se devuelven en la primera llamada
+        self._rescan = True
+
+    def poll(self, timeout):
+        if self._rescan:
+            self._rescan = False
+            return [path for directory in self.directories for path in scan_directory(directory)]
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self._rescan = True
+                continue
+            directory = self._dirs.get(wd)
+            if directory is not None and name:
+                file_name = os.fsdecode(name)
+                if is_candidate(file_name):
+                    paths.append(os.path.join(directory, file_name))
+        return paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(directories, mode="auto", poll_interval=DEFAULT_POLL_INTERVAL):
+    """Crea la vigilancia de las carpetas: "inotify", "poll" o "auto" (inotify si está disponible)."""
+    if mode not in WATCH_MODES:
+        raise ValueError(f"Modo de vigilancia no válido: {mode}. Opciones: {', '.join(WATCH_MODES)}")
+    if mode != "poll":
+        try:
+            return InotifyWatcher(directories)
+        except OSError:
+            if mode == "inotify":
+                raise
+    return PollingWatcher(directories, poll_interval)
+
+
+def _has_eof_marker(path, size):
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, size - EOF_WINDOW))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+class Debouncer:
+    """
+    Decide cuándo un archivo terminó de escribirse: su firma (tamaño, fecha de modificación) no
+    cambia durante 'settle' segundos y el PDF tiene la marca %%EOF. Un archivo ya entregado no se
+    vuelve a entregar mientras conserve la misma firma (ver done y forget).
+    """
+
+    def __init__(self, settle=DEFAULT_SETTLE_SECONDS, grace=INCOMPLETE_GRACE_SECONDS):
+        self.settle = settle
+        self.grace = grace
+        # ruta -> [firma, instante del último cambio]
+        self._pending = {}
+        # ruta -> firma ya entregada
+        self._handled = {}
+        self._lock = threading.Lock()
+
+    def touch(self, path):
+        """Registra un archivo nuevo o modificado; se comprobará en las siguientes llamadas a ready."""
+        with self._lock:
+            if path not in self._pending:
+                self._pending[path] = [None, time.monotonic()]
+
+    def ready(self):
+        """Devuelve los archivos completos y deja de seguirlos."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, state in list(self._pending.items()):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    del self._pending[path]
+                    continue
+                signature = (st.st_size, st.st_mtime_ns)
+                if self._handled.get(path) == signature:
+                    del self._pending[path]
+                    continue
+                if signature != state[0]:
+                    state[0], state[1] = signature, now
+                    continue
+                stable = now - state[1]
+                if not st.st_size or stable < self.settle:
+                    continue
+                if not _has_eof_marker(path, st.st_size) and stable < self.grace:
+                    continue
+                del self._pending[path]
+                self._handled[path] = signature
+                ready.append(path)
+        return ready
+
+    def forget(self, path):
+        """Olvida un archivo entregado (ya no está en la carpeta); si vuelve a aparecer se procesará."""
+        with self._lock:
+            self._handled.pop(path, None)
+
+
+def result_path(output_dir, pdf_path, digest):
+    """Ruta del resultado de un PDF: '<pdf sin extensión>_<12 primeros caracteres del hash>.json'."""
+    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, f"{base}_{digest[:12]}.json")
+
+
+def write_atomic(path, text):
+    """Escribe el archivo en un temporal de la misma carpeta y lo renombra: nunca queda a medias."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def move_file(path, directory, digest):
+    """
+    Mueve el PDF a la carpeta indicada y devuelve la ruta final. Si ya hay un archivo con ese
+    nombre y el mismo contenido, el original simplemente se elimina; si el contenido es distinto,
+    se añade el hash al nombre.
+    """
+    from processing.result_store import file_hash
+
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(path))
+    if os.path.exists(target):
+        if file_hash(target) == digest:
+            os.remove(path)
+            return target
+        base, ext = os.path.splitext(os.path.basename(path))
+        target = os.path.join(directory, f"{base}_{digest[:12]}{ext}")
+    shutil.move(path, target)
+    return target
+
+
+class _InlineExecutor:
+    """Ejecuta los trabajos en el propio proceso, con la misma interfaz que ProcessPoolExecutor."""
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+
+    def submit(self, fn, pdf_paths):
+        from processing.batch import extract_document
+
+        future = Future()
+        future.set_result([extract_document(self.extractor, path) for path in pdf_paths])
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class HotFolder:
+    """
+    Vigila las carpetas de entrada y extrae cada PDF que llega con un extractor ya cargado.
+
+    - template: ruta de la plantilla o carpeta de plantillas (biblioteca, ver TemplateManager).
+    - output_dir: carpeta de los resultados JSON.
+    - archive_dir / error_dir: carpetas de los originales procesados y fallidos; por defecto,
+      ARCHIVE_DIR_NAME y ERROR_DIR_NAME dentro de la carpeta de entrada de cada PDF.
+    - workers: procesos de extracción (con 1, en el propio proceso).
+
+    Si un proceso trabajador termina de forma inesperada, el grupo de procesos se recrea una sola
+    vez y los documentos que estaban en curso se repiten de uno en uno: solo va a errores el que
+    vuelve a interrumpir el grupo estando solo.
+    """
+
+    def __init__(self, directories, template, output_dir, archive_dir=None, error_dir=None, workers=1,
+                 extractor_options=None, settle=DEFAULT_SETTLE_SECONDS, queue_size=DEFAULT_QUEUE_SIZE,
+                 mode="auto", poll_interval=DEFAULT_POLL_INTERVAL, log=None):
+        from processing.batch import load_extractor
+        from templates.manager import TemplateManager
+
+        self.directories = [os.path.abspath(d) for d in directories]
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise ValueError(f"La carpeta de entrada no existe: {directory}")
+        self.output_dir = output_dir
+        self.archive_dir = archive_dir
+        self.error_dir = error_dir
+        self.workers = max(1, workers or 1)
+        self.extractor_options = dict(extractor_options or {})
+        if os.path.isdir(template):
+            self.template = TemplateManager(template)
+            self.template.check_library()
+        else:
+            self.template = template
+        # Extractor caliente del propio proceso; también valida la plantilla y las opciones antes de empezar
+        self.extractor = load_extractor(self.template, self.extractor_options)
+        self.debouncer = Debouncer(settle)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.watcher = open_watcher(self.directories, mode, poll_interval)
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self._executor = None
+        # Trabajos en curso cuando se interrumpió el grupo de procesos, a repetir de uno en uno
+        self._suspects = deque()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def stop(self):
+        """Pide la parada; los documentos en curso se terminan."""
+        self.stop_event.set()
+
+    def run(self):
+        """Vigila y procesa hasta que se llama a stop()."""
+        self.log(f"Vigilando {', '.join(self.directories)} ({self.watcher.name}, {self.workers} procesos)")
+        watch_thread = threading.Thread(target=self._watch, name="watcher", daemon=True)
+        watch_thread.start()
+        self._executor = self._create_executor()
+        try:
+            self._consume()
+        finally:
+            self.stop_event.set()
+            self._executor.shutdown(wait=True)
+            watch_thread.join()
+            self.watcher.close()
+
+    # --- Vigilancia (hilo "watcher") ---
+    def _watch(self):
+        while not self.stop_event.is_set():
+            for path in self.watcher.poll(TICK_SECONDS):
+                self.debouncer.touch(path)
+            for path in self.debouncer.ready():
+                # Contrapresión: con la cola llena se espera aquí y no se acumulan más documentos
+                while not self.stop_event.is_set():
+                    try:
+                        self.queue.put(path, timeout=TICK_SECONDS)
+                        break
+                    except queue.Full:
+                        continue
+
+    # --- Extracción (hilo principal) ---
+    def _create_executor(self):
+        if self.workers == 1:
+            return _InlineExecutor(self.extractor)
+        from processing.batch import _init_worker
+
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.template, self.extractor_options))
+        # Arrancar los procesos ahora, para que el primer documento no pague la carga de la plantilla
+        for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _consume(self):
+        from processing.batch import _extract_chunk
+
+        in_flight = {}
+        while not self.stop_event.is_set() or in_flight:
+            # Mientras haya sospechosos de una interrupción, se procesan de uno en uno
+            capacity = 1 if self._suspects else self.workers
+            while not self.stop_event.is_set() and len(in_flight) < capacity:
+                job = self._next_job(timeout=0 if in_flight else TICK_SECONDS)
+                if job is None:
+                    break
+                in_flight[self._executor.submit(_extract_chunk, [job[0]])] = job
+            if not in_flight:
+                continue
+            done, _ = wait(in_flight, timeout=TICK_SECONDS, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                self._recover(in_flight)
+                continue
+            for future in done:
+                self._finish(in_flight.pop(future), future)
+        for path, _, _ in self._suspects:
+            self.log(f"{path}: queda en su carpeta y se procesará en el siguiente arranque")
+
+    def _next_job(self, timeout):
+        """Siguiente trabajo: primero los sospechosos de una interrupción y después la cola. None si no hay."""
+        if self._suspects:
+            return self._suspects.popleft()
+        try:
+            path = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self._prepare(path)
+
+    def _recover(self, in_flight):
+        """
+        Atiende una interrupción del grupo de procesos: lo recrea una sola vez y vuelve a encolar,
+        para procesarlos de uno en uno, los trabajos que estaban en curso. Si solo había uno en
+        curso, ese documento es el responsable y va a errores.
+        """
+        # Con el grupo roto, todos los trabajos pendientes terminan enseguida con BrokenProcessPool
+        wait(in_flight)
+        broken = []
+        for future, job in in_flight.items():
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken.append(job)
+            else:
+                # Los que terminaron antes de la interrupción conservan su resultado
+                self._finish(job, future)
+        in_flight.clear()
+        self.log("El grupo de procesos de extracción se interrumpió; se vuelve a arrancar")
+        self._executor.shutdown(wait=False)
+        self._executor = self._create_executor()
+        if len(broken) == 1:
+            path, digest, _ = broken[0]
+            self._write_error(path, digest, "El proceso de extracción terminó de forma inesperada con este documento")
+        else:
+            self._suspects.extend(broken)
+
+    def _prepare(self, path):
+        """Calcula el hash del PDF; si su resultado ya existe, solo lo archiva. Devuelve el trabajo o None."""
+        from processing.result_store import file_hash
+
+        try:
+            digest = file_hash(path)
+        except OSError as e:
+            self.debouncer.forget(path)
+            self.log(f"No se pudo leer {path}: {e}")
+            return None
+        output = result_path(self.output_dir, path, digest)
+        if os.path.exists(output):
+            self.log(f"{path}: ya procesado ({output})")
+            self._archive(path, digest, self.archive_dir, ARCHIVE_DIR_NAME)
+            return None
+        return path, digest, output
+
+    def _finish(self, job, future):
+        from processing.batch import BatchResult
+
+        path, digest, output = job
+        try:
+            result = future.result()[0]
+        except Exception as e:
+            # Un error al recibir el resultado (por ejemplo, al deserializarlo) no detiene la vigilancia
+            result = BatchResult(path, None, f"{type(e).__name__}: {e}", 0, 0.0)
+        if result.error is None:
+            self._write_result(path, digest, output, result)
+        else:
+            self._write_error(path, digest, result.error)
+
+    def _write_result(self, path, digest, output, result):
+        from processing.export import document_item
+
+        item = document_item(path, result.data)
+        item["file_hash"] = digest
+        item["pages"] = result.pages
+        try:
+            write_atomic(output, json.dumps(item, ensure_ascii=False, indent=2))
+        except OSError as e:
+            self.failed += 1
+            self.log(f"No se pudo escribir el resultado de {path}: {e}")
+            return
+        self.processed += 1
+        template = f" [{result.template}]" if result.template else ""
+        self.log(f"{path}{template} -> {output} ({result.elapsed:.2f} s)")
+        self._archive(path, digest, self.archive_dir, ARCHIVE_DIR_NAME)
+
+    def _write_error(self, path, digest, error):
+        self.failed += 1
+        self.log(f"Error procesando {path}: {error}")
+        target = self._archive(path, digest, self.error_dir, ERROR_DIR_NAME)
+        if target:
+            try:
+                write_atomic(target + ".error.txt", error + "\n")
+            except OSError:
+                pass
+
+    def _archive(self, path, digest, directory, default_name):
+        """Mueve el original a 'directory' (o a 'default_name' dentro de su carpeta). Devuelve la ruta final o None."""
+        directory = directory or os.path.join(os.path.dirname(path), default_name)
+        try:
+            target = move_file(path, directory, digest)
+        except OSError as e:
+            # El archivo queda en la carpeta de entrada y no se reintenta mientras no cambie
+            self.log(f"No se pudo mover {path} a {directory}: {e}")
+            return None
+        self.debouncer.forget(path)
+        return target
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def build_parser():
+    from processing.cli import add_extractor_arguments, add_template_arguments
+
+    parser = argparse.ArgumentParser(
+        prog="python -m processing.watcher",
+        description="Vigila carpetas de entrada y extrae cada factura PDF que llega."
+    )
+    parser.add_argument("inputs", nargs="+", help="Carpetas de entrada a vigilar")
+    add_template_arguments(parser)
+    parser.add_argument("-o", "--output", required=True, help="Carpeta de los resultados JSON (uno por PDF)")
+    parser.add_argument("--archive", default=None,
+                        help=f"Carpeta de los PDFs procesados (por defecto, '{ARCHIVE_DIR_NAME}' en cada entrada)")
+    parser.add_argument("--errors", default=None,
+                        help=f"Carpeta de los PDFs que fallan (por defecto, '{ERROR_DIR_NAME}' en cada entrada)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Procesos de extracción (por defecto, 1)")
+    parser.add_argument("--mode", choices=WATCH_MODES, default="auto",
+                        help="'inotify', 'poll' o 'auto' (inotify si está disponible)")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Segundos sin cambios para considerar que un archivo terminó de copiarse")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Segundos entre recorridos de las carpetas en modo 'poll'")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Documentos listos en espera como máximo")
+    add_extractor_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    from processing.cli import configure_extractor
+
+    args = build_parser().parse_args(argv)
+    extractor_options = configure_extractor(args)
+    try:
+        hot_folder = HotFolder(args.inputs, args.template or args.templates, args.output, args.archive,
+                               args.errors, workers=args.workers, extractor_options=extractor_options,
+                               settle=args.settle, queue_size=args.queue_size, mode=args.mode,
+                               poll_interval=args.poll_interval)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    def request_stop(signum, frame):
+        hot_folder.log("Deteniendo la vigilancia...")
+        hot_folder.stop()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    hot_folder.run()
+    print(f"{hot_folder.processed} documentos procesados, {hot_folder.failed} errores", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Plantillas compiladas.
+
+Una plantilla JSON se valida y se convierte una sola vez en una estructura inmutable
+(namedtuples, sin __dict__) que los extractores reutilizan para todos los documentos:
+rectángulos ya construidos y agrupados por página, expresiones regulares de columna
+precompiladas, la función de limpieza de cada campo según su tipo y la lista de páginas
+que realmente se consultan. Los errores de esquema se informan al cargar la plantilla
+(TemplateError) y no en mitad del procesamiento de un lote.
+"""
+import re
+from collections import namedtuple
+
+import fitz
+
+
+class TemplateError(ValueError):
+    """La plantilla no respeta el esquema esperado."""
+
+
+def clean_text(text):
+    """Limpieza básica: une las líneas y quita los espacios de los extremos."""
+    return text.replace('\n', ' ').strip()
+
+
+def clean_currency(text):
+    """Deja solo los dígitos y los separadores permitidos en los montos."""
+    return ''.join(c for c in clean_text(text) if c.isdigit() or c in [',', '.'])
+
+
+def clean_date(text):
+    """Por ahora las fechas se devuelven como texto limpio, sin convertir."""
+    return clean_text(text)
+
+
+# Función de limpieza por tipo de campo ("type" en la plantilla); los tipos desconocidos se tratan como texto
+CLEANERS = {
+    "": clean_text,
+    "texto": clean_text,
+    "monto": clean_currency,
+    "fecha": clean_date,
+}
+
+CompiledField = namedtuple("CompiledField", [
+    "name", "page", "rect", "kind", "clean", "multiple", "start_y", "end_y", "row_height", "row_spacing",
+])
+CompiledColumn = namedtuple("CompiledColumn", ["name", "x0", "x1", "pattern"])
+# 'rect' es el área en coordenadas de PyMuPDF; 'bbox' conserva (x0, y0, x1, y1) tal como vienen en la
+# plantilla. 'y_up' indica que el área se definió como diccionario, en el espacio de pdfminer
+# (origen abajo a la izquierda); las definidas como lista vienen del diseñador. 'row_tolerance' es la
+# tolerancia vertical opcional para agrupar filas (None = valor por defecto del extractor)
+CompiledTable = namedtuple("CompiledTable", ["name", "page", "rect", "bbox", "y_up", "columns", "row_tolerance"])
+PageTemplate = namedtuple("PageTemplate", ["page", "fields", "tables"])
+CompiledTemplate = namedtuple("CompiledTemplate", ["fields", "tables", "pages", "by_page"])
+
+
+def _number(value, what):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise TemplateError(f"{what}: se esperaba un número y se encontró {value!r}")
+
+
+def _page(item, what):
+    page = item.get("page", 0)
+    if isinstance(page, bool) or not isinstance(page, int) or page < 0:
+        raise TemplateError(f"{what}: 'page' debe ser un entero mayor o igual a 0, no {page!r}")
+    return page
+
+
+def _bbox(coords, what):
+    """Convierte las coordenadas de la plantilla (lista [x0, y0, x1, y1] o diccionario) en una tupla."""
+    if isinstance(coords, dict):
+        try:
+            coords = [coords[k] for k in ("x0", "y0", "x1", "y1")]
+        except KeyError as e:
+            raise TemplateError(f"{what}: falta la coordenada {e}")
+    if not isinstance(coords, (list, tuple)) or len(coords) != 4:
+        raise TemplateError(f"{what}: 'coordinates' debe tener 4 valores [x0, y0, x1, y1], no {coords!r}")
+    x0, y0, x1, y1 = (_number(v, f"{what}: coordenadas") for v in coords)
+    # Un área seleccionada arrastrando hacia arriba o hacia la izquierda llega con los extremos invertidos
+    bbox = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    if bbox[2] == bbox[0] or bbox[3] == bbox[1]:
+        raise TemplateError(f"{what}: el área {list(bbox)} está vacía")
+    return bbox
+
+
+def _name(item, what):
+    if not isinstance(item, dict):
+        raise TemplateError(f"{what}: se esperaba un objeto y se encontró {item!r}")
+    name = item.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise TemplateError(f"{what}: falta el nombre ('name')")
+    return name
+
+
+def compile_field(field, index=0):
+    """Valida y compila la definición de un campo."""
+    name = _name(field, f"Campo #{index + 1}")
+    what = f"Campo '{name}'"
+    bbox = _bbox(field.get("coordinates"), what)
+    kind = str(field.get("type", "") or "").lower()
+    multiple = bool(field.get("multiple", False))
+    start_y = end_y = row_height = row_spacing = None
+    if multiple:
+        # 'end_y' y 'row_height' son opcionales: sin ellos se usa hasta el final de la página y
+        # cada línea de texto de la columna es una fila
+        start_y = _number(field.get("start_y", 0), f"{what}: start_y")
+        if field.get("end_y") is not None:
+            end_y = _number(field["end_y"], f"{what}: end_y")
+            if end_y <= start_y:
+                raise TemplateError(f"{what}: 'end_y' debe ser mayor que 'start_y'")
+        if field.get("row_height") is not None:
+            row_height = _number(field["row_height"], f"{what}: row_height")
+            row_spacing = _number(field.get("row_spacing", row_height), f"{what}: row_spacing")
+            if row_height <= 0 or row_spacing <= 0:
+                raise TemplateError(f"{what}: 'row_height' y 'row_spacing' deben ser mayores que 0")
+    return CompiledField(
+        name=name, page=_page(field, what), rect=fitz.Rect(*bbox), kind=kind,
+        clean=CLEANERS.get(kind, clean_text), multiple=multiple, start_y=start_y, end_y=end_y,
+        row_height=row_height, row_spacing=row_spacing,
+    )
+
+
+def compile_columns(columns, what="Tabla"):
+    """
+    Valida y compila las columnas de una tabla: límites horizontales opcionales ('x0', 'x1')
+    y expresión regular opcional ('pattern'), que se compila una sola vez.
+    Acepta columnas ya compiladas y las devuelve sin cambios.
+    """
+    if not isinstance(columns, (list, tuple)):
+        raise TemplateError(f"{what}: 'columns' debe ser una lista")
+    compiled = []
+    for i, col in enumerate(columns):
+        if isinstance(col, CompiledColumn):
+            compiled.append(col)
+            continue
+        name = _name(col, f"{what}: columna #{i + 1}")
+        x0 = _number(col["x0"], f"{what}: columna '{name}'") if col.get("x0") is not None else None
+        x1 = _number(col["x1"], f"{what}: columna '{name}'") if col.get("x1") is not None else None
+        pattern = col.get("pattern")
+        if pattern:
+            try:
+                pattern = re.compile(pattern)
+            except re.error as e:
+                raise TemplateError(f"{what}: expresión regular inválida en la columna '{name}': {e}")
+        compiled.append(CompiledColumn(name=name, x0=x0, x1=x1, pattern=pattern or None))
+    return tuple(compiled)
+
+
+def compile_table(table, index=0):
+    """Valida y compila la definición de una tabla."""
+    name = _name(table, f"Tabla #{index + 1}")
+    what = f"Tabla '{name}'"
+    bbox = _bbox(table.get("coordinates"), what)
+    row_tolerance = table.get("row_tolerance")
+    if row_tolerance is not None:
+        row_tolerance = _number(row_tolerance, f"{what}: row_tolerance")
+        if row_tolerance < 0:
+            raise TemplateError(f"{what}: 'row_tolerance' no puede ser negativa")
+    return CompiledTable(
+        name=name, page=_page(table, what), rect=fitz.Rect(*bbox), bbox=bbox,
+        y_up=isinstance(table.get("coordinates"), dict), columns=compile_columns(table.get("columns", []), what),
+        row_tolerance=row_tolerance,
+    )
+
+
+def compile_template(template):
+    """
+    Valida la plantilla (diccionario cargado del JSON) y devuelve un CompiledTemplate:
+      - fields / tables: campos y tablas compilados, en el orden de la plantilla
+      - pages: páginas que usa la plantilla, ordenadas
+      - by_page: un PageTemplate(page, fields, tables) por cada una de esas páginas
+    Lanza TemplateError si la plantilla no es válida. Si ya está compilada, la devuelve tal cual.
+    """
+    if isinstance(template, CompiledTemplate):
+        return template
+    if not isinstance(template, dict):
+        raise TemplateError("La plantilla debe ser un objeto JSON con 'fields' y/o 'tables'")
+    raw_fields = template.get("fields", []) or []
+    raw_tables = template.get("tables", []) or []
+    if not isinstance(raw_fields, list) or not isinstance(raw_tables, list):
+        raise TemplateError("'fields' y 'tables' deben ser listas")
+    fields = tuple(compile_field(f, i) for i, f in enumerate(raw_fields))
+    tables = tuple(compile_table(t, i) for i, t in enumerate(raw_tables))
+    pages = tuple(sorted({f.page for f in fields} | {t.page for t in tables}))
+    by_page = tuple(
+        PageTemplate(page=page,
+                     fields=tuple(f for f in fields if f.page == page),
+                     tables=tuple(t for t in tables if t.page == page))
+        for page in pages
+    )
+    return CompiledTemplate(fields=fields, tables=tables, pages=pages, by_page=by_page)
@@ -0,0 +1,138 @@
+"""
+Huellas de plantilla para reconocer a qué proveedor pertenece una factura.
+
+La huella se calcula con el texto nativo de la primera página, en milisegundos y sin OCR:
+  - page_size: ancho y alto de la página, en puntos
+  - anchors: palabras fijas del documento (razón social, títulos, etiquetas), sin cifras y fuera
+    de las áreas de los campos y tablas de la plantilla, que contienen los datos variables
+  - layout: mapa de ocupación del texto en una rejilla de LAYOUT_GRID x LAYOUT_GRID celdas,
+    codificado como un entero de bits (se compara por distancia de Hamming)
+
+Las huellas se guardan en la propia plantilla, bajo la clave "fingerprint", al guardarla desde el
+diseñador con el PDF de ejemplo (ver TemplateManager.save_template).
+"""
+import re
+from collections import namedtuple
+
+import fitz
+
+from templates.compiled import TemplateError
+
+# Palabras fijas que se guardan como máximo por plantilla (las primeras en orden de lectura)
+MAX_ANCHORS = 40
+# Celdas por lado de la rejilla del mapa de ocupación
+LAYOUT_GRID = 8
+# Longitud mínima de una palabra fija
+MIN_ANCHOR_LENGTH = 3
+
+Fingerprint = namedtuple("Fingerprint", ["page_size", "anchors", "layout"])
+
+_TOKEN_STRIP = re.compile(r"^\W+|\W+$")
+
+
+def normalize_word(word):
+    """Palabra en minúsculas y sin signos al principio ni al final ("S.A.," -> "s.a")."""
+    return _TOKEN_STRIP.sub("", word.lower())
+
+
+def is_anchor(word):
+    """Una palabra puede ser fija si tiene letras suficientes y ninguna cifra (importes, fechas, números)."""
+    return len(word) >= MIN_ANCHOR_LENGTH and not any(ch.isdigit() for ch in word)
+
+
+def _inside(x, y, rects):
+    return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, y0, x1, y1 in rects)
+
+
+def layout_bits(words, width, height, grid=LAYOUT_GRID):
+    """Mapa de ocupación: un bit por celda de la rejilla que contiene el centro de alguna palabra."""
+    bits = 0
+    if width <= 0 or height <= 0:
+        return bits
+    for x0, y0, x1, y1, *_ in words:
+        col = min(grid - 1, max(0, int((x0 + x1) / 2 / width * grid)))
+        row = min(grid - 1, max(0, int((y0 + y1) / 2 / height * grid)))
+        bits |= 1 << (row * grid + col)
+    return bits
+
+
+def layout_similarity(a, b, grid=LAYOUT_GRID):
+    """Fracción de celdas de la rejilla en las que coinciden los dos mapas de ocupación."""
+    return 1.0 - bin(a ^ b).count("1") / (grid * grid)
+
+
+def page_fingerprint(page, exclude=(), limit=MAX_ANCHORS):
+    """
+    Huella de una página (fitz.Page). 'exclude' son las áreas (x0, y0, x1, y1) cuyas palabras no
+    pueden ser fijas, normalmente las de los campos y tablas de la plantilla en esa página. Con
+    limit=None se conservan todas las palabras candidatas (para la huella del documento a reconocer).
+    """
+    rect = page.rect
+    words = page.get_text("words")
+    anchors = []
+    seen = set()
+    for x0, y0, x1, y1, text, *_ in words:
+        word = normalize_word(text)
+        if word in seen or not is_anchor(word) or _inside((x0 + x1) / 2, (y0 + y1) / 2, exclude):
+            continue
+        seen.add(word)
+        anchors.append(word)
+        if limit is not None and len(anchors) >= limit:
+            break
+    return Fingerprint((round(rect.width, 1), round(rect.height, 1)), tuple(anchors),
+                       layout_bits(words, rect.width, rect.height))
+
+
+def template_areas(compiled, page_num=0):
+    """Áreas de los campos y tablas de la plantilla compilada en la página indicada (coordenadas PyMuPDF)."""
+    areas = []
+    for page_template in compiled.by_page:
+        if page_template.page != page_num:
+            continue
+        for field in page_template.fields:
+            if field.multiple:
+                # Las filas de un campo repetido ocupan la franja de la columna desde start_y
+                end_y = field.end_y if field.end_y is not None else float("inf")
+                areas.append((field.rect.x0, field.start_y, field.rect.x1, end_y))
+            else:
+                areas.append(tuple(field.rect))
+        # Las áreas definidas como diccionario están en el espacio de pdfminer y no se excluyen
+        areas.extend(tuple(table.rect) for table in page_template.tables if not table.y_up)
+    return areas
+
+
+def pdf_fingerprint(source, compiled=None, limit=MAX_ANCHORS):
+    """
+    Huella de la primera página del PDF 'source' (ruta o fitz.Document). Con la plantilla
+    compilada, las palabras de sus áreas no se consideran fijas.
+    """
+    exclude = template_areas(compiled) if compiled is not None else ()
+    if isinstance(source, fitz.Document):
+        return page_fingerprint(source.load_page(0), exclude, limit)
+    with fitz.open(source) as doc:
+        return page_fingerprint(doc.load_page(0), exclude, limit)
+
+
+def to_dict(fingerprint):
+    """Huella serializable a JSON, para guardarla en la plantilla."""
+    return {
+        "page_size": list(fingerprint.page_size),
+        "anchors": list(fingerprint.anchors),
+        "layout": format(fingerprint.layout, "x"),
+    }
+
+
+def from_dict(data):
+    """
+    Huella a partir de la clave "fingerprint" de una plantilla. Las palabras fijas pueden escribirse
+    a mano; 'page_size' y 'layout' son opcionales.
+    """
+    if not isinstance(data, dict):
+        raise TemplateError("'fingerprint' debe ser un objeto JSON")
+    size = data.get("page_size")
+    # Una palabra fija escrita a mano puede tener varias palabras ("Distribuidora Norte S.A.")
+    words = (normalize_word(w) for a in data.get("anchors", ()) or () for w in str(a).split())
+    anchors = tuple(dict.fromkeys(w for w in words if w))
+    layout = data.get("layout")
+    return Fingerprint(tuple(float(v) for v in size) if size else None, anchors,
+                       int(layout, 16) if layout else None)
@@ -1,8 +1,47 @@
 import json
+import os
+from collections import namedtuple
+
+from templates.compiled import compile_template
+from templates.fingerprint import from_dict, layout_similarity, pdf_fingerprint, to_dict
+
+# Puntuación mínima para aceptar una plantilla de la biblioteca (ver TemplateManager.match)
+MIN_MATCH_SCORE = 0.6
+# Diferencia máxima de tamaño de página, en puntos, para considerar que dos páginas son iguales
+PAGE_SIZE_TOLERANCE = 3.0
+# Peso de cada señal en la puntuación: palabras fijas, mapa de ocupación y tamaño de página
+ANCHOR_WEIGHT, LAYOUT_WEIGHT, SIZE_WEIGHT = 0.7, 0.2, 0.1
+
+# Plantilla de la biblioteca: ruta del JSON, nombre (archivo sin extensión), plantilla y su huella
+LibraryEntry = namedtuple("LibraryEntry", ["path", "name", "template", "fingerprint"])
+# Resultado de TemplateManager.match
+TemplateMatch = namedtuple("TemplateMatch", ["path", "name", "score"])
+
 
 class TemplateManager:
-    def save_template(self, template, path):
-        """Guarda la plantilla en formato JSON en la ruta especificada."""
+    """
+    Carga y guarda plantillas y, con 'directory', gestiona una biblioteca de plantillas (una por
+    proveedor) con un índice de huellas (ver templates.fingerprint) para elegir la plantilla de
+    cada PDF de forma automática.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = None
+        self.entries = []
+        # Errores de las plantillas de la biblioteca que no se pudieron indexar: [(ruta, mensaje)]
+        self.errors = []
+        self._by_anchor = {}
+        if directory is not None:
+            self.load_library(directory)
+
+    def save_template(self, template, path, pdf_path=None):
+        """
+        Guarda la plantilla en formato JSON en la ruta especificada. Con 'pdf_path' (el PDF de
+        ejemplo sobre el que se diseñó) se guarda también su huella, para la biblioteca.
+        """
+        if pdf_path:
+            fingerprint = pdf_fingerprint(pdf_path, compile_template(template))
+            template = dict(template, fingerprint=to_dict(fingerprint))
         try:
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(template, f, indent=4)
@@ -15,4 +54,107 @@ class TemplateManager:
             with open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception as e:
-            raise IOError(f"Error al cargar la plantilla: {e}")
\ No newline at end of file
+            raise IOError(f"Error al cargar la plantilla: {e}")
+
+    def compile_template(self, template):
+        """Valida la plantilla y la compila (ver templates.compiled). Lanza TemplateError si no es válida."""
+        return compile_template(template)
+
+    def load_compiled(self, path):
+        """Carga la plantilla desde el archivo JSON y la devuelve compilada."""
+        return compile_template(self.load_template(path))
+
+    # --- Biblioteca de plantillas ---
+    def load_library(self, directory):
+        """
+        Indexa las plantillas JSON de la carpeta. La huella de cada una se toma de su clave
+        "fingerprint" o, si no la tiene, de un PDF de ejemplo con el mismo nombre junto a ella
+        ('proveedor.json' y 'proveedor.pdf'). Las plantillas inválidas o sin huella se registran
+        en 'errors' y no participan en la selección. Devuelve el número de plantillas indexadas.
+        """
+        if not os.path.isdir(directory):
+            raise ValueError(f"La carpeta de plantillas no existe: {directory}")
+        self.directory = directory
+        self.entries = []
+        self.errors = []
+        self._by_anchor = {}
+        for file_name in sorted(os.listdir(directory)):
+            base, ext = os.path.splitext(file_name)
+            if ext.lower() != ".json":
+                continue
+            path = os.path.join(directory, file_name)
+            try:
+                template = self.load_template(path)
+                compiled = compile_template(template)
+                if template.get("fingerprint"):
+                    fingerprint = from_dict(template["fingerprint"])
+                elif os.path.exists(os.path.join(directory, base + ".pdf")):
+                    fingerprint = pdf_fingerprint(os.path.join(directory, base + ".pdf"), compiled)
+                else:
+                    raise ValueError("no tiene huella ('fingerprint') ni PDF de ejemplo")
+                if not fingerprint.anchors:
+                    raise ValueError("la huella no tiene palabras fijas")
+            except Exception as e:
+                self.errors.append((path, str(e)))
+                continue
+            self._add_entry(LibraryEntry(path, base, template, fingerprint))
+        return len(self.entries)
+
+    def check_library(self):
+        """
+        Lanza ValueError si la biblioteca no tiene ninguna plantilla utilizable, indicando el
+        motivo por el que se descartó cada plantilla de la carpeta.
+        """
+        if self.entries:
+            return
+        message = f"La carpeta {self.directory} no contiene plantillas con huella utilizables"
+        if self.errors:
+            message += ":\n" + "\n".join(f"  - {os.path.basename(path)}: {error}" for path, error in self.errors)
+        raise ValueError(message)
+
+    def _add_entry(self, entry):
+        index = len(self.entries)
+        self.entries.append(entry)
+        for word in entry.fingerprint.anchors:
+            self._by_anchor.setdefault(word, []).append(index)
+
+    def match(self, source):
+        """
+        Elige la plantilla de la biblioteca que corresponde al PDF 'source' (ruta o fitz.Document)
+        y devuelve un TemplateMatch, o None si ninguna alcanza MIN_MATCH_SCORE.
+
+        Solo se lee el texto nativo de la primera página. Las palabras del documento se buscan en
+        el índice invertido de palabras fijas, por lo que el coste no depende del número de
+        plantillas sino de las que comparten palabras con el documento. La puntuación combina la
+        fracción de palabras fijas de la plantilla presentes en el documento, la similitud del
+        mapa de ocupación y la coincidencia del tamaño de página.
+        """
+        if not self.entries:
+            return None
+        document = pdf_fingerprint(source, limit=None)
+        hits = {}
+        for word in document.anchors:
+            for index in self._by_anchor.get(word, ()):
+                hits[index] = hits.get(index, 0) + 1
+        best = None
+        for index, count in hits.items():
+            entry = self.entries[index]
+            score = self._score(entry.fingerprint, document, count)
+            if best is None or score > best[0]:
+                best = (score, entry)
+        if best is None or best[0] < MIN_MATCH_SCORE:
+            return None
+        return TemplateMatch(best[1].path, best[1].name, best[0])
+
+    @staticmethod
+    def _score(fingerprint, document, anchor_hits):
+        score = ANCHOR_WEIGHT * anchor_hits / len(fingerprint.anchors)
+        if fingerprint.layout is not None:
+            score += LAYOUT_WEIGHT * layout_similarity(fingerprint.layout, document.layout)
+        else:
+            # Sin mapa de ocupación, las palabras fijas deciden solas
+            score += LAYOUT_WEIGHT * anchor_hits / len(fingerprint.anchors)
+        if fingerprint.page_size is None or all(
+                abs(a - b) <= PAGE_SIZE_TOLERANCE for a, b in zip(fingerprint.page_size, document.page_size)):
+            score += SIZE_WEIGHT
+        return score
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.corpus import generate_corpus
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """Factura sintética pequeña del corpus de rendimiento, en sus variantes nativa y escaneada."""
+    cases = generate_corpus(str(tmp_path_factory.mktemp("corpus")), ["pequena"])
+    return {case.variant: case for case in cases}
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+from processing.batch import BatchProcessor
+from processing.result_store import ResultStore
+
+OPTIONS = {"ocr_backend": "fake"}
+
+
+@pytest.fixture
+def pdf_paths(corpus, tmp_path):
+    """Seis PDFs (nativos y escaneados alternados) y un archivo que no existe en medio del lote."""
+    paths = []
+    for i in range(6):
+        case = corpus["native" if i % 2 == 0 else "scanned"]
+        path = str(tmp_path / f"doc{i}.pdf")
+        shutil.copy(case.pdf_path, path)
+        paths.append(path)
+    paths.insert(3, str(tmp_path / "falta.pdf"))
+    return paths
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_results_keep_input_order(corpus, pdf_paths, max_workers):
+    processor = BatchProcessor(corpus["native"].template_path, max_workers=max_workers, chunksize=1,
+                               extractor_options=OPTIONS)
+    results = processor.process(pdf_paths)
+    assert [r.path for r in results] == pdf_paths
+    assert [r.error is not None for r in results] == [p.endswith("falta.pdf") for p in pdf_paths]
+    native = [r.data for r in results if r.error is None and r.path.endswith(("0.pdf", "2.pdf", "4.pdf"))]
+    assert len(native) == 3 and native[0] == native[1] == native[2]
+
+
+def test_result_store_serves_unchanged_documents(corpus, pdf_paths, tmp_path):
+    store = ResultStore(str(tmp_path / "store" / "results.sqlite"))
+    processor = BatchProcessor(corpus["native"].template_path, max_workers=1, extractor_options=OPTIONS,
+                               result_store=store)
+    first = processor.process(pdf_paths)
+    assert not any(r.cached for r in first)
+    second = processor.process(pdf_paths)
+    assert [r.path for r in second] == pdf_paths
+    assert [r.cached for r in second] == [r.error is None for r in first]
+    assert [r.data for r in second] == [r.data for r in first]
+    # Si el archivo cambia se recalcula su hash: con el contenido de otro documento ya extraído,
+    # se sirve el resultado de ese documento
+    shutil.copy(corpus["scanned"].pdf_path, pdf_paths[0])
+    os.utime(pdf_paths[0], ns=(0, 0))
+    third = processor.process(pdf_paths[:1])
+    assert third[0].file_hash == first[1].file_hash
+    assert third[0].cached and third[0].data == first[1].data
+    store.close()
@@ -0,0 +1,45 @@
+import fitz
+
+from processing.classify import classify_page
+
+STAMP = "Recibido el 12/03/2024 en la oficina central de compras, registro de entrada número 4711"
+
+
+def _classify(path, edit=None):
+    with fitz.open(path) as doc:
+        page = doc[0]
+        if edit is not None:
+            edit(page)
+        return classify_page(page)
+
+
+def test_native_and_scanned_pages(corpus):
+    native = _classify(corpus["native"].pdf_path)
+    assert native.kind == "native" and native.words >= 10 and native.image_coverage == 0
+    scanned = _classify(corpus["scanned"].pdf_path)
+    assert scanned.kind == "scanned" and scanned.words == 0 and scanned.image_coverage > 0.99
+
+
+def test_stamped_scan_keeps_ocr_fallback(corpus):
+    # Un escaneo de página completa con una línea de texto añadida no es una página nativa
+    stamped = _classify(corpus["scanned"].pdf_path, lambda page: page.insert_text((40, 30), STAMP, fontsize=7))
+    assert stamped.words >= 10 and stamped.fonts
+    assert stamped.text_on_images == 1.0
+    assert stamped.kind == "mixed"
+
+
+def test_native_page_with_logo(corpus):
+    def add_logo(page):
+        pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 20, 20), False)
+        page.insert_image(fitz.Rect(480, 5, 580, 40), pixmap=pix)
+
+    assert _classify(corpus["native"].pdf_path, add_logo).kind == "native"
+
+
+def test_sparse_page_keeps_ocr_fallback():
+    doc = fitz.open()
+    doc.new_page()
+    blank = classify_page(doc[0])
+    assert blank.kind == "mixed"
+    doc[0].insert_text((50, 50), "Total 12,50", fontsize=8)
+    assert classify_page(doc[0]).kind == "mixed"
@@ -0,0 +1,55 @@
+import json
+import sqlite3
+
+from processing.export import SqliteSink, open_sink
+
+
+def _data(total, rows):
+    return {"fields": {"Numero": "F-1", "Total": total},
+            "tables": {"Detalle": [{"Descripcion": f"Linea {i}", "Importe": str(i)} for i in range(rows)]}}
+
+
+def _query(path, sql, args=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+
+def test_reprocessed_document_replaces_previous_result(tmp_path):
+    path = str(tmp_path / "historial.sqlite")
+    with open_sink(path) as sink:
+        assert isinstance(sink, SqliteSink)
+        sink.write("a.pdf", _data("10", 3), file_hash="h1", template="proveedor")
+        sink.write("b.pdf", _data("20", 1), file_hash="h2", template="proveedor")
+    # Segunda ejecución: el mismo PDF se reprocesa dos veces en el mismo bloque y una vez con otra plantilla
+    with SqliteSink(path, batch_size=10) as sink:
+        sink.write("a.pdf", _data("11", 2), file_hash="h1", template="proveedor")
+        sink.write("copia_a.pdf", _data("12", 1), file_hash="h1", template="proveedor")
+        sink.write("a.pdf", _data("99", 1), file_hash="h1", template="otro")
+
+    documents = _query(path, "SELECT file_name, file_hash, template, run_id FROM documents ORDER BY id")
+    assert documents == [("copia_a.pdf", "h1", "proveedor", 2), ("b.pdf", "h2", "proveedor", 1),
+                         ("a.pdf", "h1", "otro", 2)]
+    totals = _query(path, "SELECT d.template, f.value FROM documents d JOIN fields f ON f.document_id = d.id"
+                          " WHERE d.file_hash = 'h1' AND f.name = 'Total' ORDER BY d.id")
+    assert totals == [("proveedor", "12"), ("otro", "99")]
+    rows = _query(path, "SELECT r.row_index, r.data FROM documents d JOIN table_rows r ON r.document_id = d.id"
+                        " WHERE d.file_name = 'copia_a.pdf'")
+    assert [(index, json.loads(data)["Descripcion"]) for index, data in rows] == [(0, "Linea 0")]
+    assert _query(path, "SELECT id, documents FROM runs ORDER BY id") == [(1, 2), (2, 3)]
+
+
+def test_add_row_groups_table_rows_by_file(tmp_path):
+    path = str(tmp_path / "filas.sqlite")
+    with SqliteSink(path) as sink:
+        sink.add_row("Campos", {"Archivo": "a.pdf", "Total": "10"})
+        sink.add_row("Campos", {"Archivo": "b.pdf", "Total": "20"})
+        for i in range(2):
+            sink.add_row("Tablas", {"Archivo": "a.pdf", "Tabla": "Detalle", "Importe": str(i)})
+        sink.add_row("Tablas", {"Archivo": "b.pdf", "Tabla": "Detalle", "Importe": "5"})
+    rows = _query(path, "SELECT d.file_name, r.row_index, json_extract(r.data, '$.Importe') FROM documents d"
+                        " JOIN table_rows r ON r.document_id = d.id ORDER BY d.id, r.row_index")
+    assert rows == [("a.pdf", 0, "0"), ("a.pdf", 1, "1"), ("b.pdf", 0, "5")]
+    assert _query(path, "SELECT COUNT(*) FROM fields") == [(2,)]
@@ -0,0 +1,43 @@
+import re
+
+from processing.ocr_backends import FakeOCRBackend
+from processing.pdf_parser import PDFExtractor
+
+
+def test_native_page_does_not_use_ocr(corpus):
+    case = corpus["native"]
+    backend = FakeOCRBackend()
+    data = PDFExtractor(case.template_path, ocr_backend=backend).extract_from_pdf(case.pdf_path)
+    assert len(data["fields"]) == case.fields
+    assert all(re.fullmatch(r"V\d{6}|\d+,\d{2}", value) for value in data["fields"].values())
+    rows = data["tables"]["Detalle001"]
+    assert rows and rows[0]["Descripcion"].startswith("Artículo")
+    assert backend.calls == {"image_to_string": 0, "image_to_data": 0}
+
+
+def test_scanned_page_uses_ocr_once_per_page(corpus):
+    case = corpus["scanned"]
+    backend = FakeOCRBackend(text="fijo")
+    extractor = PDFExtractor(case.template_path, ocr_backend=backend, ocr_mode="page")
+    data = extractor.extract_from_pdf(case.pdf_path)
+    assert list(data["fields"]) == [f"Campo{i + 1:03d}" for i in range(case.fields)]
+    assert backend.calls == {"image_to_string": 0, "image_to_data": case.pages}
+
+
+def test_scanned_page_region_mode(corpus):
+    case = corpus["scanned"]
+    backend = FakeOCRBackend(text="fijo")
+    extractor = PDFExtractor(case.template_path, ocr_backend=backend, ocr_mode="region")
+    data = extractor.extract_from_pdf(case.pdf_path)
+    assert set(data["fields"].values()) == {"fijo"}
+    # Un OCR por campo y otro por la tabla
+    assert backend.calls["image_to_string"] == case.fields + 1
+
+
+def test_extract_from_document_matches_extract_from_pdf(corpus):
+    import fitz
+
+    case = corpus["native"]
+    extractor = PDFExtractor(case.template_path, ocr_backend=FakeOCRBackend())
+    with fitz.open(case.pdf_path) as doc:
+        assert extractor.extract_from_document(doc) == extractor.extract_from_pdf(case.pdf_path)
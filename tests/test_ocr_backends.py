@@ -0,0 +1,78 @@
+import sys
+import threading
+import types
+
+import pytest
+from PIL import Image
+
+from processing import ocr_backends
+from processing.ocr_backends import FakeOCRBackend, OCRTimeoutError, TesserocrPoolBackend
+
+
+def _image(level):
+    return Image.new("L", (40, 20), level)
+
+
+def test_fake_backend_is_deterministic():
+    backend = FakeOCRBackend()
+    first = backend.image_to_string(_image(200))
+    assert backend.image_to_string(_image(200)) == first
+    assert backend.image_to_string(_image(100)) != first
+    data = backend.image_to_data(_image(200))
+    assert data["text"] == [first]
+    assert (data["width"], data["height"]) == ([40], [20])
+    assert backend.calls == {"image_to_string": 3, "image_to_data": 1}
+
+
+def test_fake_backend_text_and_timeout():
+    assert FakeOCRBackend(text="fijo").image_to_string(_image(0)) == "fijo"
+    with pytest.raises(OCRTimeoutError):
+        FakeOCRBackend(delay=1.0).image_to_string(_image(0), timeout=0.01)
+
+
+class _FakeApi:
+    def __init__(self, lang, **kwargs):
+        if lang == "falta":
+            raise RuntimeError("Failed to init API, possibly an invalid tessdata path")
+        self.lang = lang
+
+    def End(self):
+        pass
+
+
+@pytest.fixture
+def tesserocr_stub(monkeypatch):
+    """Sustituye el paquete opcional 'tesserocr' por un módulo mínimo."""
+    module = types.SimpleNamespace(PyTessBaseAPI=_FakeApi, tesseract_version=lambda: "tesseract 5.3.0\n leptonica")
+    monkeypatch.setitem(sys.modules, "tesserocr", module)
+    return module
+
+
+def test_tesserocr_pool_releases_slot_when_creation_fails(tesserocr_stub):
+    backend = TesserocrPoolBackend(size=1)
+    for _ in range(2):
+        # Sin liberar la plaza, la segunda llamada esperaría para siempre una instancia que no existe
+        with pytest.raises(RuntimeError):
+            backend._acquire("falta", timeout=1)
+    lang, api = backend._acquire("spa")
+    assert (lang, api.lang) == ("spa", "spa")
+
+
+def test_tesserocr_pool_waits_with_timeout(tesserocr_stub):
+    backend = TesserocrPoolBackend(size=1)
+    _, api = backend._acquire("spa")
+    with pytest.raises(OCRTimeoutError):
+        backend._acquire("spa", timeout=0.05)
+    threading.Timer(0.05, backend._release, ("spa", api)).start()
+    assert backend._acquire("spa", timeout=5)[1] is api
+
+
+def test_tesserocr_pool_size(tesserocr_stub, monkeypatch):
+    monkeypatch.delenv("OCR_POOL_SIZE", raising=False)
+    assert TesserocrPoolBackend().size >= 1
+    monkeypatch.setenv("OCR_POOL_SIZE", "3")
+    assert TesserocrPoolBackend().size == 3
+    assert TesserocrPoolBackend(size=5).size == 5
+    monkeypatch.delenv("OCR_CACHE_PATH", raising=False)
+    monkeypatch.setattr(ocr_backends, "_backends", {})
+    assert ocr_backends.get_backend("tesserocr", pool_size=2).size == 2
@@ -0,0 +1,53 @@
+from PIL import Image
+
+from processing.ocr_backends import FakeOCRBackend, OCRBackend
+from processing.ocr_cache import CachedOCRBackend, OCRCache
+
+
+def _image(level):
+    return Image.new("L", (30, 30), level)
+
+
+class _OtherEngine(FakeOCRBackend):
+    name = "otro"
+
+
+def test_cache_hits_and_misses(tmp_path):
+    engine = FakeOCRBackend()
+    backend = CachedOCRBackend(engine, OCRCache(str(tmp_path / "ocr.sqlite")))
+    first = backend.image_to_string(_image(10))
+    assert backend.image_to_string(_image(10)) == first
+    assert backend.image_to_data(_image(10))["text"] == [first]
+    assert engine.calls == {"image_to_string": 1, "image_to_data": 1}
+    stats = backend.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_cache_key_depends_on_engine(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"))
+    CachedOCRBackend(FakeOCRBackend(text="uno"), cache).image_to_string(_image(10))
+    # El mismo motor con otra salida (otra "versión") y otro motor no reutilizan el resultado
+    assert CachedOCRBackend(FakeOCRBackend(text="dos"), cache).image_to_string(_image(10)) == "dos"
+    assert CachedOCRBackend(_OtherEngine(text="tres"), cache).image_to_string(_image(10)) == "tres"
+    assert cache.stats()["entries"] == 3
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"), max_bytes=100)
+    keys = [cache.make_key(_image(level), "string", engine="fake 1") for level in range(6)]
+    for key in keys[:4]:
+        cache.put(key, "x" * 20)
+    # Se usa la primera entrada: la expulsada pasa a ser la segunda
+    assert cache.get(keys[0]) == "x" * 20
+    for key in keys[4:]:
+        cache.put(key, "x" * 20)
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[5]) is not None
+
+
+def test_base_backend_identity():
+    assert OCRBackend().identity() == "base"
+    assert FakeOCRBackend().identity() == "fake 1"
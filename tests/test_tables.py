@@ -0,0 +1,46 @@
+import pytest
+
+from processing.tables import ColumnIndex, cluster_rows
+from templates.compiled import CompiledColumn
+
+
+def _elem(text, x0, y0, width=10):
+    return {"text": text, "x0": x0, "y0": y0, "x1": x0 + width, "y1": y0 + 8}
+
+
+def test_cluster_rows_top_to_bottom():
+    elements = [_elem("c", 0, 680), _elem("a", 0, 700), _elem("b", 50, 701.5), _elem("d", 50, 679)]
+    rows = cluster_rows(elements, tolerance=2.0)
+    assert [sorted(e["text"] for e in row) for row in rows] == [["a", "b"], ["c", "d"]]
+
+
+def test_cluster_rows_compares_with_first_element_of_row():
+    # Cada paso es menor que la tolerancia, pero la fila no puede crecer sin límite
+    elements = [_elem(str(i), 0, 700 - 1.5 * i) for i in range(4)]
+    rows = cluster_rows(elements, tolerance=2.0)
+    assert [[e["text"] for e in row] for row in rows] == [["0", "1"], ["2", "3"]]
+    assert cluster_rows([]) == []
+
+
+def test_column_index_assigns_contained_elements():
+    columns = [CompiledColumn("B", 100, 200, None), CompiledColumn("A", 0, 100, None), CompiledColumn("C", 250, 300, None)]
+    index = ColumnIndex(columns)
+    assert index.columns_for(_elem("x", 10, 0)) == [1]
+    assert index.columns_for(_elem("x", 120, 0)) == [0]
+    # Entre columnas, cruzando un borde o antes de la primera: sin columna
+    assert index.columns_for(_elem("x", 210, 0)) == []
+    assert index.columns_for(_elem("x", 95, 0)) == []
+    assert index.columns_for(_elem("x", -20, 0)) == []
+
+
+def test_column_index_overlapping_columns():
+    columns = [CompiledColumn("A", 0, 150, None), CompiledColumn("B", 100, 200, None)]
+    index = ColumnIndex(columns)
+    assert index.overlapping
+    assert index.columns_for(_elem("x", 110, 0)) == [0, 1]
+    assert index.columns_for(_elem("x", 160, 0)) == [1]
+
+
+def test_column_index_requires_bounds():
+    with pytest.raises(ValueError):
+        ColumnIndex([CompiledColumn("A", 0, None, None)])